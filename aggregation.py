@@ -0,0 +1,171 @@
+import argparse, time
+
+import numpy as np
+from scipy.cluster.vq import kmeans2
+
+import arcs, data, lp_fixing, matrix_models, models, synthetic
+from matrix_models import arc_arrays, positions
+
+"""
+Solves the location model on clusters of suppliers, then the flows of the full network with the chosen sites.
+
+Suppliers are clustered by their cost per Mg to every hub (task2, task3) or plant (task1), which is linear in the
+distance columns of roads_s_h.csv and roads_s_p.csv, so suppliers end up together when they are close to the
+same sites. Every cluster becomes one supplier with the summed supply and the supply weighted mean cost of its
+members on every arc. The location model of that network is much smaller, and the plants and hubs it opens are
+then fixed in the model of the full network, which only has the flows and trips left to decide.
+
+    python aggregation.py task2 --clusters 40 --compare      #also solve the full model, for the loss
+    python aggregation.py task3 --size 500x20x60 --clusters 50
+
+The cost of the disaggregated solution is an upper bound of the optimum. It loses where members of a cluster
+are far apart, and where the trips of a cluster are shared between members that can't share a truck.
+"""
+
+
+#the cost of every supplier to every site, in the order of the supplier IDs and sites. Missing arcs cost as much
+#as the most expensive arc, so that the suppliers without them are kept apart
+def cost_profiles(supplier_ids, sites, cost):
+    src, dst, unit_cost = arc_arrays(cost)
+    profiles = np.full((len(supplier_ids), len(sites)), unit_cost.max() if len(unit_cost) else 0.0)
+    profiles[positions(supplier_ids, src), positions(sites, dst)] = unit_cost
+    return profiles
+
+
+#the cost table of the suppliers towards the sites of the task
+def supplier_table(network, task):
+    return "road_cost" if task == "task1" else "truck_cost"
+
+
+#cluster of every supplier (in the order of network.suppliers), numbered from 0 without gaps
+def cluster(network, task, n_clusters, seed=0):
+    supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    sites = np.asarray(network.plants if task == "task1" else network.hubs, dtype=np.int64)
+    if n_clusters >= len(supplier_ids):
+        return np.arange(len(supplier_ids))
+    profiles = cost_profiles(supplier_ids, sites, getattr(network, supplier_table(network, task)))
+    _, labels = kmeans2(profiles, n_clusters, minit="++", seed=seed)
+    #kmeans2 can leave clusters empty
+    return np.unique(labels, return_inverse=True)[1]
+
+
+#the network with one supplier per cluster, named after its largest member
+def aggregate(network, task, labels):
+    supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+    n = labels.max() + 1
+    total = np.bincount(labels, supply, n)
+    #the largest member of every cluster, the last one in a stable sort by cluster then supply
+    order = np.lexsort((supply, labels))
+    last = np.r_[np.flatnonzero(np.diff(labels[order])), len(order) - 1]
+    names = supplier_ids[order[last]]
+
+    table = supplier_table(network, task)
+    src, dst, unit_cost = arc_arrays(getattr(network, table))
+    group = labels[positions(supplier_ids, src)]
+    weight = supply[positions(supplier_ids, src)]
+    #sums per (cluster, site), with the sites numbered in the order they come up
+    sites, site = np.unique(dst, return_inverse=True)
+    pair = group * len(sites) + site
+    pairs, at = np.unique(pair, return_inverse=True)
+    weights = np.bincount(at, weight, len(pairs))
+    costs = np.bincount(at, weight * unit_cost, len(pairs)) / np.where(weights > 0, weights, 1)
+    #a cluster without supply still gets the plain mean
+    plain = np.bincount(at, unit_cost, len(pairs)) / np.bincount(at, minlength=len(pairs))
+    costs = np.where(weights > 0, costs, plain)
+
+    cost = {(int(names[p // len(sites)]), int(sites[p % len(sites)])): c
+            for p, c in zip(pairs.tolist(), costs.tolist())}
+    return network.replace(suppliers=dict(zip(names.tolist(), total.tolist())), **{table: cost})
+
+
+#the open plants and hubs of a solved built model, as masks in the order of built.plants and built.hubs
+def open_sites(built):
+    plants = np.round(built.plant_select.X) > 0
+    hubs = np.round(built.hub_select.X) > 0 if built.hub_select is not None else np.zeros(0, dtype=bool)
+    return plants, hubs
+
+
+#the Gurobi parameters of every solve, quiet unless verbose
+def solver_parameters(time_limit=None, verbose=False):
+    params = {} if verbose else {"OutputFlag": 0}
+    if time_limit is not None:
+        params["TimeLimit"] = time_limit
+    return params
+
+
+#solve the location model of the clustered network, then the full network with its sites fixed
+def solve(network, task, n_clusters, seed=0, env=None, time_limit=None, verbose=False, **params):
+    builder = matrix_models.BUILDERS[task]
+    solver_params = solver_parameters(time_limit, verbose)
+    report = {"suppliers": len(network.suppliers)}
+
+    start = time.perf_counter()
+    labels = cluster(network, task, n_clusters, seed)
+    small = aggregate(network, task, labels)
+    report["clusters"] = len(small.suppliers)
+    report["cluster_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    built = builder(small, mode=arcs.TRIP_COUNT, env=env, **params)
+    report["aggregated_cost"] = models.solve(built, **solver_params)
+    report["aggregated_vars"] = built.model.NumVars
+    report["aggregated_s"] = time.perf_counter() - start
+    if report["aggregated_cost"] is None:
+        raise ValueError(f"the aggregated model has no solution (status {built.model.Status})")
+    plants_open, hubs_open = open_sites(built)
+    report["plants"] = built.plants[plants_open].tolist()
+    report["hubs"] = built.hubs[hubs_open].tolist()
+
+    start = time.perf_counter()
+    full = builder(network, mode=arcs.TRIP_COUNT, env=env, **params)
+    lp_fixing.fix(full, ~plants_open, plants_open, ~hubs_open, hubs_open)
+    report["cost"] = models.solve(full, **solver_params)
+    report["vars"] = full.model.NumVars
+    report["disaggregated_s"] = time.perf_counter() - start
+    if report["cost"] is None:
+        raise ValueError(f"the full model with the sites of the aggregated one has no solution "
+                         f"(status {full.model.Status})")
+    report["seconds"] = report["cluster_s"] + report["aggregated_s"] + report["disaggregated_s"]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve the location model on clusters of suppliers")
+    parser.add_argument("task", choices=list(matrix_models.BUILDERS))
+    parser.add_argument("--clusters", type=int, default=50, help="number of supplier clusters")
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the instance and the clustering")
+    parser.add_argument("--time-limit", type=float, help="time limit of every MIP, in seconds")
+    parser.add_argument("--compare", action="store_true", help="also solve the full model, for the optimality loss")
+    parser.add_argument("--verbose", action="store_true", help="show the Gurobi logs")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+    else:
+        network = data.load_network(args.data)
+    builder = matrix_models.BUILDERS[args.task]
+    try:
+        report = solve(network, args.task, args.clusters, args.seed, time_limit=args.time_limit,
+                       verbose=args.verbose, **params)
+    except ValueError as error:
+        parser.exit(1, f"{error}\n")
+    print(f"{report['suppliers']} suppliers in {report['clusters']} clusters ({report['cluster_s']:.2f} s)")
+    print(f"aggregated:    ${report['aggregated_cost']:.0f}, {report['aggregated_vars']} variables, "
+          f"{report['aggregated_s']:.2f} s")
+    print(f"disaggregated: ${report['cost']:.0f}, {report['vars']} variables, {report['disaggregated_s']:.2f} s, "
+          f"{len(report['plants'])} plants and {len(report['hubs'])} hubs open")
+
+    if args.compare:
+        start = time.perf_counter()
+        full = builder(network, mode=arcs.TRIP_COUNT, **params)
+        optimum = models.solve(full, **solver_parameters(args.time_limit, args.verbose))
+        seconds = time.perf_counter() - start
+        if optimum is None:
+            parser.exit(1, f"full model:    no solution (status {full.model.Status}), {seconds:.2f} s\n")
+        print(f"full model:    ${optimum:.0f}, gap {full.model.MIPGap:.2%}, {seconds:.2f} s")
+        print(f"loss: {report['cost'] / optimum - 1:.2%} in {report['seconds'] / seconds:.0%} of the time")
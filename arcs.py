@@ -0,0 +1,89 @@
+import gurobipy as gp
+from gurobipy import GRB
+
+import instrumentation
+
+"""
+Arc formulations
+
+PER_TRIP is the expansion the task scripts started out with: every potential trip on an arc gets its own
+continuous variable with the vehicle capacity as upper bound, so an arc that can carry N trips costs N+1
+variables. Since nothing tells a used trip from an unused one, the fixed cost is charged for every
+potential trip, exactly like the task scripts did.
+
+TRIP_COUNT uses one continuous flow variable and one integer trip counter per arc, with
+flow <= capacity * trips, and charges the fixed cost per trip that is actually driven.
+"""
+PER_TRIP = "per_trip"
+TRIP_COUNT = "trip_count"
+MODES = (PER_TRIP, TRIP_COUNT)
+
+
+#the flow over a set of arcs, such that flow[(i,j)] = the amount sent between i and j
+class Arcs:
+    def __init__(self, mode):
+        self.mode = mode
+        self.flow = {}      #flow[(i,j)] = variable (or sum of trip variables) for the amount sent
+        self.trips = {}     #trips[(i,j)] = trip counter (TRIP_COUNT) or list of trip variables (PER_TRIP)
+        self.leaving = {}   #leaving[i] = list of destinations j with an arc (i,j)
+        self.entering = {}  #entering[j] = list of sources i with an arc (i,j)
+        self.transport = 0  #cost per Mg times the flow, over all arcs
+        self.loading = 0    #fixed cost of the trips
+
+    def out_of(self, i):
+        return gp.quicksum(self.flow[i, j] for j in self.leaving.get(i, []))
+
+    def into(self, j):
+        return gp.quicksum(self.flow[i, j] for i in self.entering.get(j, []))
+
+    def total(self):
+        return gp.quicksum(self.flow.values())
+
+
+#add the variables for all arcs in cost, such that cost[(i,j)] = cost between i,j per Mg
+#max_flow(i,j) is the most that could ever be sent over (i,j), which limits the number of trips.
+#with capacity=None the arc is not driven by any vehicle (no trips, no fixed cost), only a plain flow
+def add_arcs(model, cost, capacity, trip_cost, max_flow, mode=TRIP_COUNT, name="flow"):
+    if mode not in MODES:
+        raise ValueError(f"unknown arc formulation '{mode}', expected one of {MODES}")
+
+    arcs = Arcs(mode)
+    transport = []
+    loading = []
+    with instrumentation.phase("variables", model):
+        for (i, j), c in cost.items():
+            arcs.leaving.setdefault(i, []).append(j)
+            arcs.entering.setdefault(j, []).append(i)
+            upper = max_flow(i, j)
+
+            if capacity is None:
+                var = model.addVar(vtype=GRB.CONTINUOUS, lb=0.00, ub=upper, name=f'{name}[{i},{j}]')
+                arcs.flow[i, j] = var
+                transport.append(c * var)
+                continue
+
+            #The maximum supplied between i,j would normally be emptying the supply, so that is what limits the trips
+            max_trips = int(upper / capacity)
+
+            if mode == PER_TRIP:
+                trips = []
+                for m in range(max_trips+1):
+                    #each trip is limited by the vehicle's capacity
+                    trips.append(model.addVar(vtype=GRB.CONTINUOUS, lb=0.00, ub=capacity, name=f'{name}[{i},{j}]({m})'))
+                arcs.trips[i, j] = trips
+                arcs.flow[i, j] = gp.quicksum(trips)
+                transport.append(c * arcs.flow[i, j])
+                loading.append(trip_cost * len(trips))
+            else:
+                var = model.addVar(vtype=GRB.CONTINUOUS, lb=0.00, ub=upper, name=f'{name}[{i},{j}]')
+                trips = model.addVar(vtype=GRB.INTEGER, lb=0, ub=max_trips+1, name=f'{name}_trips[{i},{j}]')
+                model.addConstr(var <= capacity * trips, name=f'{name}_cap[{i},{j}]')
+                arcs.flow[i, j] = var
+                arcs.trips[i, j] = trips
+                transport.append(c * var)
+                loading.append(trip_cost * trips)
+
+    with instrumentation.phase("objective"):
+        arcs.transport = gp.quicksum(transport)
+        arcs.loading = gp.quicksum(loading)
+    return arcs
@@ -0,0 +1,264 @@
+import numpy as np
+import scipy.sparse as sp
+
+from data import (TRUCK_CAPACITY, TRAIN_CAPACITY, TRUCK_TRIP_COST, TRAIN_TRIP_COST, HUB_COST, HUB_CAPACITY,
+                  PLANT_COST, PLANT_CAPACITY, PRODUCTION_GOAL, THIRD_PARTY_GOAL, THIRD_PARTY_PRICE)
+
+"""
+The task models as plain arrays (costs, bounds, integrality and one sparse constraint matrix). This is the one
+place the formulation is written down: matrix_models.py turns these models into gurobipy models, backends.py
+hands them to Gurobi, HiGHS or SciPy. Nothing here needs gurobipy, so it also runs where Gurobi isn't installed.
+
+Every arc set adds its block of columns (and trip counters with the trip-count formulation), and the
+constraints are blocks of rows made of incidence matrices over them.
+
+    model = array_models.build_task2(network)
+    result = backends.solve(model, "highs", time_limit=600)
+    print(result.objective, model.open_sites(result.x))
+"""
+
+#the arc formulations of arcs.py, which can't be imported without gurobipy
+PER_TRIP = "per_trip"
+TRIP_COUNT = "trip_count"
+MODES = (PER_TRIP, TRIP_COUNT)
+
+
+#the arcs of one cost table as arrays, such that cost[k] = cost per Mg between src[k] and dst[k]
+def arc_arrays(cost):
+    n = len(cost)
+    ends = np.fromiter((node for arc in cost for node in arc), dtype=np.int64, count=2*n).reshape(n, 2)
+    return ends[:, 0], ends[:, 1], np.fromiter(cost.values(), dtype=np.float64, count=n)
+
+
+#position of every key in ids, such that ids[positions(ids, keys)] == keys
+def positions(ids, keys):
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids):
+        if len(keys):
+            raise ValueError(f"arcs refer to unknown nodes, for example {np.asarray(keys)[0]}")
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(ids, kind="stable")
+    found = np.searchsorted(ids, keys, sorter=order)
+    found = np.minimum(found, len(ids)-1)
+    pos = order[found]
+    if len(keys) and not np.array_equal(ids[pos], keys):
+        missing = np.asarray(keys)[ids[pos] != keys]
+        raise ValueError(f"arcs refer to unknown nodes, for example {missing[0]}")
+    return pos
+
+
+#incidence matrix with a single 1 per column, such that (matrix @ x)[rows[k]] contains x[k]
+def incidence(rows, n_rows):
+    n = len(rows)
+    return sp.csr_matrix((np.ones(n), (rows, np.arange(n))), shape=(n_rows, n))
+
+
+#the most that could be sent over each arc set of the two-echelon models, for a given hub capacity
+def two_echelon_max_flow(supplier_ids, supply, hub_capacity):
+    return {
+        "truck_flow": lambda s, h: np.minimum(supply[positions(supplier_ids, s)], hub_capacity),
+        "train_flow": lambda h, p: np.full(len(h), min(hub_capacity, PLANT_CAPACITY)),
+        "third_party_flow": lambda s, h: np.full(len(h), float(hub_capacity)),
+    }
+
+
+#a minimization model lower <= A @ x <= upper, lb <= x <= ub, made of named blocks of columns and rows
+class ArrayModel:
+    def __init__(self, name):
+        self.name = name
+        self.blocks = {}     #blocks[name] = slice of the columns
+        self.rows = {}       #rows[name] = slice of the rows
+        self.flows = {}      #flows[name] = ArrayArcs
+        self.supplier_ids = np.zeros(0, dtype=np.int64)
+        self.supply = np.zeros(0)
+        self.plants = np.zeros(0, dtype=np.int64)
+        self.hubs = np.zeros(0, dtype=np.int64)
+        self.third_party = None
+        self.constant = 0.0  #part of the cost that does not depend on any variable
+        self.n_vars = self.n_rows = 0
+        self.columns = {}    #columns[block] = (cost, lb, ub, integer)
+        self.row_terms = {}  #row_terms[name] = ({block: matrix over its columns}, lower, upper)
+
+    def add_vars(self, name, n, lb=0.0, ub=np.inf, cost=0.0, integer=False):
+        block = slice(self.n_vars, self.n_vars + n)
+        self.blocks[name] = block
+        self.columns[name] = (*(np.broadcast_to(np.asarray(v, dtype=np.float64), n) for v in (cost, lb, ub)),
+                              integer)
+        self.n_vars += n
+        return block
+
+    #rows lower <= the sum of matrix @ (the columns of block) over terms[block] = matrix <= upper
+    def add_rows(self, name, terms, lower=-np.inf, upper=np.inf):
+        n = next(iter(terms.values())).shape[0]
+        terms = {block: sp.csr_matrix(matrix) for block, matrix in terms.items()}
+        self.row_terms[name] = (terms, np.broadcast_to(np.asarray(lower, dtype=np.float64), n),
+                                np.broadcast_to(np.asarray(upper, dtype=np.float64), n))
+        self.rows[name] = slice(self.n_rows, self.n_rows + n)
+        self.n_rows += n
+
+    #everything a solver needs: cost, lb, ub, integer (bool), A (csr), lower, upper and the constant
+    def arrays(self):
+        cost, lb, ub, integer = ([] for _ in range(4))
+        for c, low, up, is_integer in self.columns.values():
+            cost.append(c)
+            lb.append(low)
+            ub.append(up)
+            integer.append(np.full(len(c), is_integer))
+        rows, columns, values, lower, upper = [], [], [], [], []
+        for name, (terms, low, up) in self.row_terms.items():
+            for block, matrix in terms.items():
+                matrix = matrix.tocoo()
+                rows.append(matrix.row + self.rows[name].start)
+                columns.append(matrix.col + self.blocks[block].start)
+                values.append(matrix.data)
+            lower.append(low)
+            upper.append(up)
+        rows, columns, values, lower, upper = (np.concatenate(part) for part in (rows, columns, values, lower, upper))
+        return {
+            "cost": np.concatenate(cost), "lb": np.concatenate(lb), "ub": np.concatenate(ub),
+            "integer": np.concatenate(integer),
+            "A": sp.csr_matrix((values, (rows, columns)), shape=(self.n_rows, self.n_vars)),
+            "lower": lower, "upper": upper, "constant": self.constant,
+        }
+
+    #the columns of a block in a solution
+    def values(self, x, block):
+        return x[self.blocks[block]]
+
+    #the IDs of the open plants and hubs in a solution
+    def open_sites(self, x):
+        plants = self.plants[np.round(self.values(x, "plant_selection")) > 0].tolist()
+        if "hub_selection" not in self.blocks:
+            return plants, []
+        return plants, self.hubs[np.round(self.values(x, "hub_selection")) > 0].tolist()
+
+
+#the arcs of one arc set, the columns are the block called name (and the trip counters the block trips)
+class ArrayArcs:
+    def __init__(self, name, mode, src, dst, cost, to_arc, trips=None, constant=0.0, capacity=None):
+        self.name = name
+        self.mode = mode
+        self.capacity = capacity
+        self.src, self.dst, self.cost = src, dst, cost
+        self.to_arc = to_arc      #to_arc @ columns = flow on every arc
+        self.trips = trips        #name of the block of trip counters (TRIP_COUNT)
+        self.constant = constant  #part of the cost that does not depend on any variable
+
+    def __len__(self):
+        return len(self.src)
+
+    #matrix such that matrix @ columns = the flow leaving (or entering) each of the given nodes
+    def out_of(self, nodes):
+        return incidence(positions(nodes, self.src), len(nodes)) @ self.to_arc
+
+    def into(self, nodes):
+        return incidence(positions(nodes, self.dst), len(nodes)) @ self.to_arc
+
+
+#the most trips an arc needs to carry a flow of upper with vehicles of capacity, none on a closed arc
+def trips_needed(upper, capacity):
+    return np.where(upper > 0, np.floor(upper / capacity) + 1, 0.0)
+
+
+#the columns of an arc set and the trip constraints that come with them. Without a capacity the arcs have no
+#trips, just a cost per Mg. With PER_TRIP every potential trip is a column of its own (and charged), with
+#TRIP_COUNT every arc has a flow column and an integer trip counter with flow <= capacity * trips
+def add_arcs(model, cost, capacity, trip_cost, max_flow, mode=TRIP_COUNT, name="flow"):
+    if mode not in MODES:
+        raise ValueError(f"unknown arc formulation '{mode}', expected one of {MODES}")
+    src, dst, unit_cost = arc_arrays(cost) if isinstance(cost, dict) else cost
+    n = len(src)
+    upper = np.asarray(max_flow(src, dst), dtype=np.float64)
+
+    if capacity is None:
+        model.add_vars(name, n, ub=upper, cost=unit_cost)
+        flow = ArrayArcs(name, mode, src, dst, unit_cost, sp.identity(n, format="csr"))
+    elif mode == PER_TRIP:
+        #one column per potential trip, so arc k owns max_trips[k]+1 consecutive columns
+        arc_of = np.repeat(np.arange(n), np.floor(upper / capacity).astype(np.int64) + 1)
+        model.add_vars(name, len(arc_of), ub=capacity, cost=unit_cost[arc_of])
+        flow = ArrayArcs(name, mode, src, dst, unit_cost, incidence(arc_of, n), constant=trip_cost * len(arc_of),
+                         capacity=capacity)
+    else:
+        identity = sp.identity(n, format="csr")
+        model.add_vars(name, n, ub=upper, cost=unit_cost)
+        model.add_vars(f"{name}_trips", n, ub=trips_needed(upper, capacity), cost=trip_cost, integer=True)
+        model.add_rows(f"{name}_cap", {name: identity, f"{name}_trips": -capacity * identity}, upper=0.0)
+        flow = ArrayArcs(name, mode, src, dst, unit_cost, identity, f"{name}_trips", capacity=capacity)
+    model.constant += flow.constant
+    model.flows[name] = flow
+    return flow
+
+
+#a row that sums all flow of an arc set
+def _total(flow):
+    return sp.csr_matrix(np.asarray(flow.to_arc.sum(axis=0)))
+
+
+#task1: suppliers ship directly to plants by truck
+def build_task1(network, mode=TRIP_COUNT, goal=PRODUCTION_GOAL, plant_cost=PLANT_COST):
+    model = ArrayModel("task1")
+    supplier_ids = model.supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    supply = model.supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+    model.plants = np.asarray(network.plants, dtype=np.int64)
+
+    flow = add_arcs(model, network.road_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST,
+                    lambda s, p: np.minimum(supply[positions(supplier_ids, s)], PLANT_CAPACITY), mode, "flow")
+    model.add_vars("plant_selection", len(model.plants), ub=1.0, cost=plant_cost, integer=True)
+
+    model.add_rows("production_goal", {"flow": _total(flow)}, lower=goal)
+    model.add_rows("supply_cap", {"flow": flow.out_of(supplier_ids)}, upper=supply)
+    model.add_rows("plant_cap", {"flow": flow.into(model.plants),
+                                 "plant_selection": -PLANT_CAPACITY * sp.identity(len(model.plants))}, upper=0.0)
+    return model
+
+
+#the shared part of task2 and task3: suppliers -> hubs by truck, hubs -> plants by train
+def _two_echelon(model, network, mode, goal, plant_cost, hub_cost, hub_capacity, third_party=None,
+                 third_party_price=THIRD_PARTY_PRICE):
+    supplier_ids = model.supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    supply = model.supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+    model.third_party = third_party
+    hubs = model.hubs = np.asarray(network.hubs, dtype=np.int64)
+    plants = model.plants = np.asarray(network.plants, dtype=np.int64)
+
+    max_flow = two_echelon_max_flow(supplier_ids, supply, hub_capacity)
+    truck = add_arcs(model, network.truck_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST, max_flow["truck_flow"], mode,
+                     "truck_flow")
+    train = add_arcs(model, network.train_cost, TRAIN_CAPACITY, TRAIN_TRIP_COST, max_flow["train_flow"], mode,
+                     "train_flow")
+    #the third party delivers to the hubs itself, so there is no truck capacity or trip cost on these arcs
+    if third_party is not None:
+        third_party_arcs = (np.full(len(hubs), third_party, dtype=np.int64), hubs.copy(),
+                            np.full(len(hubs), float(third_party_price)))
+        add_arcs(model, third_party_arcs, None, 0, max_flow["third_party_flow"], mode, "third_party_flow")
+    model.add_vars("plant_selection", len(plants), ub=1.0, cost=plant_cost, integer=True)
+    model.add_vars("hub_selection", len(hubs), ub=1.0, cost=hub_cost, integer=True)
+
+    model.add_rows("production_goal", {"train_flow": _total(train)}, lower=goal)
+    model.add_rows("supply_cap", {"truck_flow": truck.out_of(supplier_ids)}, upper=supply)
+    model.add_rows("plant_cap", {"train_flow": train.into(plants),
+                                 "plant_selection": -PLANT_CAPACITY * sp.identity(len(plants))}, upper=0.0)
+    hub_in = {"truck_flow": truck.into(hubs)}
+    if third_party is not None:
+        hub_in["third_party_flow"] = model.flows["third_party_flow"].into(hubs)
+    model.add_rows("hub_cap", {**hub_in, "hub_selection": -hub_capacity * sp.identity(len(hubs))}, upper=0.0)
+    model.add_rows("hub_balance", {**hub_in, "train_flow": -train.out_of(hubs)}, lower=0.0, upper=0.0)
+    return model
+
+
+#task2: suppliers -> hubs -> plants
+def build_task2(network, mode=TRIP_COUNT, goal=PRODUCTION_GOAL, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                hub_capacity=HUB_CAPACITY):
+    return _two_echelon(ArrayModel("task2"), network, mode, goal, plant_cost, hub_cost, hub_capacity)
+
+
+#task3: like task2, but biomass can also be bought from a third party without a supply limit
+def build_task3(network, mode=TRIP_COUNT, goal=THIRD_PARTY_GOAL, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                hub_capacity=HUB_CAPACITY, third_party_price=THIRD_PARTY_PRICE):
+    third_party = max(network.suppliers)+1
+    return _two_echelon(ArrayModel("task3"), network, mode, goal, plant_cost, hub_cost, hub_capacity, third_party,
+                        third_party_price)
+
+
+BUILDERS = {"task1": build_task1, "task2": build_task2, "task3": build_task3}
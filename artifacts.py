@@ -0,0 +1,115 @@
+import hashlib, json, os, shutil, time
+
+import gurobipy as gp
+
+import data
+
+"""
+Built models and their solutions kept on disk, so that a run on the same CSVs and parameters doesn't start from
+nothing again.
+
+Every run is stored under a key made of the hashes of the input CSVs, the task, the builder, the arc formulation
+and the model parameters (not the solver parameters, they don't change the model). The directory gets the model
+as MPS, the best solution (and the basis, for an LP) and meta.json with how long the first build and solve took.
+A later run with the same key can
+
+    - start from the stored solution (a MIP start, and the basis for an LP), after building the model as usual
+    - read the stored model instead of building it, which skips all the Python side construction
+
+    python cli.py task2 --artifacts .artifacts             #stores the first time, warm starts after that
+    python cli.py task2 --artifacts .artifacts --reload    #reads model.mps instead of building
+
+A model read back from MPS is a plain gurobipy Model, without the variables of the builders behind it, so
+whatever needs those (the heuristic start, the solution export) needs the model built.
+"""
+
+#bump when the stored files change, so that old artifacts are not picked up
+ARTIFACT_VERSION = 1
+ARTIFACT_DIR = ".artifacts"
+INPUTS = ("suppliers", "plants", "hubs", "roads_s_p", "roads_s_h", "railroads_h_p")
+
+
+#the key of a model: the input CSVs and everything the model was built with
+def artifact_key(data_dir, task, builder, mode, params):
+    digest = hashlib.sha256()
+    digest.update(json.dumps([ARTIFACT_VERSION, task, builder, mode, sorted(params.items())]).encode())
+    for name in INPUTS:
+        digest.update(data.file_hash(os.path.join(data_dir, f"{name}.csv")).encode())
+    return digest.hexdigest()[:16]
+
+
+#a started Env with OutputFlag=0, for reading a model without any output. Use it in a with block (or dispose it)
+#once the models read into it are done
+def quiet_env():
+    env = gp.Env(empty=True)
+    env.setParam("OutputFlag", 0)
+    env.start()
+    return env
+
+
+#the model built as models.Built/matrix_models.MatrixBuilt, read back from a file, so that models.solve takes it
+class Loaded:
+    def __init__(self, model):
+        self.model = model
+
+
+class Store:
+    def __init__(self, data_dir, task, builder, mode, params, root=ARTIFACT_DIR):
+        self.key = artifact_key(data_dir, task, builder, mode, params)
+        self.path = os.path.join(root, f"{task}-{self.key}")
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.exists(self._file("meta.json"))
+
+    def meta(self):
+        with open(self._file("meta.json")) as f:
+            return json.load(f)
+
+    #the stored model with the stored solution as its start. params are Gurobi parameters, set before the
+    #solution is read. Reading the model itself only stays quiet in a quiet env, see quiet_env
+    def load_model(self, env=None, **params):
+        model = gp.read(self._file("model.mps"), env=env)
+        self.apply_start(model, **params)
+        return model
+
+    #start the model from the stored solution (and basis), after setting the Gurobi parameters params. Returns
+    #whether there was a solution
+    def apply_start(self, model, **params):
+        for name, value in params.items():
+            model.setParam(name, value)
+        if not os.path.exists(self._file("solution.sol")):
+            return False
+        model.update()
+        model.read(self._file("solution.sol"))
+        if os.path.exists(self._file("model.bas")):
+            model.read(self._file("model.bas"))
+        return True
+
+    #store a solved model. The model file is only written the first time, and the times of the first run are
+    #kept, as what a run without artifacts costs
+    def save(self, model, build_s, solve_s, write_model=True):
+        if model.SolCount == 0:
+            return
+        first = self.meta() if self.exists() else {"build_s": build_s, "solve_s": solve_s}
+        meta = {"version": ARTIFACT_VERSION, "key": self.key, "build_s": first["build_s"],
+                "solve_s": first["solve_s"], "objective": model.ObjVal, "status": model.Status,
+                "saved_at": time.time()}
+
+        #everything goes into a temporary directory first, which then replaces the old one
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        os.makedirs(temporary, exist_ok=True)
+        if os.path.exists(self._file("model.mps")):
+            shutil.copy2(self._file("model.mps"), os.path.join(temporary, "model.mps"))
+        elif write_model:
+            model.write(os.path.join(temporary, "model.mps"))
+        model.write(os.path.join(temporary, "solution.sol"))
+        if not model.IsMIP:
+            model.write(os.path.join(temporary, "model.bas"))
+        with open(os.path.join(temporary, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=1)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(temporary, self.path)
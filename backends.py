@@ -0,0 +1,190 @@
+import argparse, importlib, time
+
+import numpy as np
+
+import array_models, data, synthetic
+
+"""
+Solves the array models of array_models.py with Gurobi, HiGHS or SciPy, so that the task models also solve on
+machines without Gurobi (or without a free license), and the solvers can be compared on the same model.
+
+    model = array_models.build_task3(network)
+    for backend in available():
+        result = solve(model, backend, time_limit=600, threads=4)
+        print(backend, result.status, result.objective, result.seconds)
+
+    python backends.py task2 --backend gurobi highs scipy --time-limit 600     #side by side
+
+gurobi needs gurobipy, highs needs highspy (pip install highspy), scipy uses scipy.optimize.milp, which comes
+with HiGHS built in. The solvers are imported when they are first used, so any of them can be missing.
+"""
+
+STATUSES = ("optimal", "time_limit", "infeasible", "other")
+
+
+class Result:
+    def __init__(self, backend, status, objective=None, bound=None, x=None, seconds=0.0):
+        self.backend = backend
+        self.status = status        #one of STATUSES
+        self.objective = objective  #cost of the best solution found, None without any
+        self.bound = bound
+        self.x = x                  #values of all columns, None without a solution
+        self.seconds = seconds
+
+    @property
+    def gap(self):
+        if self.objective is None or self.bound is None:
+            return None
+        return abs(self.objective - self.bound) / max(abs(self.objective), 1e-10)
+
+
+def _gurobi(arrays, time_limit=None, mip_gap=None, threads=None, verbose=False):
+    import gurobipy as gp
+    from gurobipy import GRB
+
+    model = gp.Model("arrays")
+    model.Params.OutputFlag = int(verbose)
+    for name, value in (("TimeLimit", time_limit), ("MIPGap", mip_gap), ("Threads", threads)):
+        if value is not None:
+            model.setParam(name, value)
+    vtype = np.where(arrays["integer"], GRB.INTEGER, GRB.CONTINUOUS)
+    x = model.addMVar(len(arrays["cost"]), lb=arrays["lb"], ub=arrays["ub"], obj=arrays["cost"], vtype=vtype)
+    A, lower, upper = arrays["A"], arrays["lower"], arrays["upper"]
+    equal = lower == upper
+    for rows, sense, rhs in ((equal, GRB.EQUAL, lower), (~equal & np.isfinite(upper), GRB.LESS_EQUAL, upper),
+                             (~equal & np.isfinite(lower), GRB.GREATER_EQUAL, lower)):
+        if rows.any():
+            model.addMConstr(A[rows], x, sense, rhs[rows])
+    model.ObjCon = arrays["constant"]
+    model.ModelSense = GRB.MINIMIZE
+
+    start = time.perf_counter()
+    model.optimize()
+    seconds = time.perf_counter() - start
+    status = {GRB.OPTIMAL: "optimal", GRB.TIME_LIMIT: "time_limit", GRB.INFEASIBLE: "infeasible"}
+    if model.SolCount == 0:
+        return Result("gurobi", status.get(model.Status, "other"), seconds=seconds)
+    bound = model.ObjBound if model.IsMIP else model.ObjVal
+    return Result("gurobi", status.get(model.Status, "other"), model.ObjVal, bound, x.X, seconds)
+
+
+def _highs(arrays, time_limit=None, mip_gap=None, threads=None, verbose=False):
+    import highspy
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", bool(verbose))
+    for name, value in (("time_limit", time_limit), ("mip_rel_gap", mip_gap), ("threads", threads)):
+        if value is not None:
+            h.setOptionValue(name, value)
+    infinity = h.getInfinity()
+    clip = lambda values: np.clip(values, -infinity, infinity)
+
+    lp = highspy.HighsLp()
+    A = arrays["A"].tocsc()
+    lp.num_col_, lp.num_row_ = A.shape[1], A.shape[0]
+    lp.col_cost_, lp.col_lower_, lp.col_upper_ = arrays["cost"], clip(arrays["lb"]), clip(arrays["ub"])
+    lp.row_lower_, lp.row_upper_ = clip(arrays["lower"]), clip(arrays["upper"])
+    lp.offset_ = arrays["constant"]
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_, lp.a_matrix_.index_, lp.a_matrix_.value_ = A.indptr, A.indices, A.data
+    if arrays["integer"].any():
+        lp.integrality_ = [highspy.HighsVarType.kInteger if is_integer else highspy.HighsVarType.kContinuous
+                           for is_integer in arrays["integer"].tolist()]
+    h.passModel(lp)
+
+    start = time.perf_counter()
+    h.run()
+    seconds = time.perf_counter() - start
+    model_status = h.getModelStatus()
+    status = {highspy.HighsModelStatus.kOptimal: "optimal", highspy.HighsModelStatus.kTimeLimit: "time_limit",
+              highspy.HighsModelStatus.kInfeasible: "infeasible"}.get(model_status, "other")
+    info = h.getInfo()
+    if info.primal_solution_status != highspy.SolutionStatus.kSolutionStatusFeasible:
+        return Result("highs", status, seconds=seconds)
+    bound = info.mip_dual_bound if arrays["integer"].any() else info.objective_function_value
+    return Result("highs", status, info.objective_function_value, bound, np.asarray(h.getSolution().col_value),
+                  seconds)
+
+
+def _scipy(arrays, time_limit=None, mip_gap=None, threads=None, verbose=False):
+    from scipy.optimize import Bounds, LinearConstraint, milp
+
+    options = {"disp": verbose}
+    if time_limit is not None:
+        options["time_limit"] = time_limit
+    if mip_gap is not None:
+        options["mip_rel_gap"] = mip_gap
+    start = time.perf_counter()
+    result = milp(arrays["cost"], integrality=arrays["integer"].astype(np.int8),
+                  bounds=Bounds(arrays["lb"], arrays["ub"]),
+                  constraints=LinearConstraint(arrays["A"], arrays["lower"], arrays["upper"]), options=options)
+    seconds = time.perf_counter() - start
+    status = {0: "optimal", 1: "time_limit", 2: "infeasible"}.get(result.status, "other")
+    if result.x is None:
+        return Result("scipy", status, seconds=seconds)
+    objective = result.fun + arrays["constant"]
+    bound = getattr(result, "mip_dual_bound", None)
+    bound = objective if bound is None or not arrays["integer"].any() else bound + arrays["constant"]
+    return Result("scipy", status, objective, bound, result.x, seconds)
+
+
+BACKENDS = {"gurobi": ("gurobipy", _gurobi), "highs": ("highspy", _highs), "scipy": ("scipy.optimize", _scipy)}
+
+
+#the backends whose solver can be imported here
+def available():
+    found = []
+    for name, (module, _) in BACKENDS.items():
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+        found.append(name)
+    return found
+
+
+#solve an array_models.ArrayModel (or the dict of its arrays()) with one of the BACKENDS
+def solve(model, backend="highs", time_limit=None, mip_gap=None, threads=None, verbose=False):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend '{backend}', expected one of {list(BACKENDS)}")
+    arrays = model.arrays() if isinstance(model, array_models.ArrayModel) else model
+    return BACKENDS[backend][1](arrays, time_limit, mip_gap, threads, verbose)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a task model with several solvers, side by side")
+    parser.add_argument("task", choices=list(array_models.BUILDERS))
+    parser.add_argument("--backend", nargs="+", default=None, choices=list(BACKENDS),
+                        help="solvers to use, all that are installed by default")
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mode", default=array_models.TRIP_COUNT, choices=array_models.MODES)
+    parser.add_argument("--time-limit", type=float, help="time limit of every solve, in seconds")
+    parser.add_argument("--mip-gap", type=float)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--verbose", action="store_true", help="show the solver logs")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+    else:
+        network = data.load_network(args.data)
+    builder = array_models.BUILDERS[args.task]
+
+    start = time.perf_counter()
+    model = builder(network, mode=args.mode, **params)
+    arrays = model.arrays()
+    print(f"{model.n_vars} variables, {model.n_rows} constraints, {arrays['A'].nnz} nonzeros, "
+          f"built in {time.perf_counter() - start:.2f} s")
+
+    print(f"{'backend':<8} {'status':<11} {'objective':>16} {'bound':>16} {'gap':>7} {'seconds':>8}  sites")
+    for backend in args.backend or available():
+        result = solve(arrays, backend, args.time_limit, args.mip_gap, args.threads, args.verbose)
+        objective = "-" if result.objective is None else f"{result.objective:.0f}"
+        bound = "-" if result.bound is None else f"{result.bound:.0f}"
+        gap = "-" if result.gap is None else f"{result.gap:.2%}"
+        sites = "" if result.x is None else " ".join(" ".join(map(str, ids)) for ids in model.open_sites(result.x))
+        print(f"{backend:<8} {result.status:<11} {objective:>16} {bound:>16} {gap:>7} {result.seconds:>8.2f}  {sites}")
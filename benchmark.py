@@ -0,0 +1,215 @@
+import argparse, datetime, json, multiprocessing, os, platform, queue, subprocess, sys, time
+
+import gurobipy as gp
+
+import arcs, cli, data, synthetic
+from instrumentation import peak_rss_mb
+
+"""
+Benchmark of building and solving every formulation on synthetic networks of different sizes.
+
+    python benchmark.py --sizes 60x8x40 254x32x166 500x64x300 --time-limit 300
+    python benchmark.py --compare benchmarks/<older commit>.json
+
+Every case runs in a fresh process (so the memory numbers are per case), and the results are written as JSON
+to benchmarks/<commit>.json, together with the settings, so that runs on different commits can be compared.
+Sizes are SUPPLIERSxHUBSxPLANTS, "shipped" means the CSV files in --data.
+"""
+
+FORMULATIONS = [(builder, mode) for builder in cli.BUILDER_SETS for mode in arcs.MODES]
+
+#a case is worse than before if it takes this much more time or memory
+TOLERANCE = 0.2
+#times below this many seconds are too noisy to call a regression
+MIN_SECONDS = 0.1
+COMPARED = ("build_s", "solve_s", "peak_rss_mb")
+
+
+#synthetic.parse_size, or None for "shipped"
+def parse_size(text):
+    if text == "shipped":
+        return None
+    return synthetic.parse_size(text)
+
+
+def _run_case(instance, task, builder, mode, solve_params, results):
+    network = data.load_network(instance["data"]) if instance.get("data") else synthetic.network(**instance["options"])
+    goal = synthetic.GOAL_SHARE[task] * sum(network.suppliers.values())
+
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    built = cli.builder_set(builder)[task](network, mode=mode, goal=goal)
+    model = built.model
+    model.update()
+    row = {
+        "instance": instance["name"],
+        "task": task,
+        "builder": builder,
+        "mode": mode,
+        "suppliers": len(network.suppliers),
+        "hubs": len(network.hubs),
+        "plants": len(network.plants),
+        "build_s": time.perf_counter() - start,
+        "vars": model.NumVars,
+        "int_vars": model.NumIntVars,
+        "constrs": model.NumConstrs,
+        "nonzeros": model.NumNZs,
+        "solve_s": None,
+        "status": None,
+        "objective": None,
+        "bound": None,
+        "gap": None,
+    }
+    if solve_params is not None:
+        for name, value in solve_params.items():
+            model.setParam(name, value)
+        try:
+            model.optimize()
+            row["solve_s"] = model.Runtime
+            row["status"] = model.Status
+            if model.SolCount > 0:
+                row["objective"] = model.ObjVal
+                row["bound"] = model.ObjBound
+                row["gap"] = model.MIPGap
+        except gp.GurobiError as error:
+            row["status"] = f"error: {error}"
+    row["peak_rss_mb"] = peak_rss_mb()
+    row["build_rss_mb"] = row["peak_rss_mb"] - before
+    results.put(row)
+
+
+#what a child process put on results, or None when it died without (a GurobiError, out of memory, a crash in the
+#solver), instead of waiting for it forever
+def child_result(process, results, poll=1.0):
+    while True:
+        try:
+            return results.get(timeout=poll)
+        except queue.Empty:
+            if process.exitcode is None:
+                continue
+        #it exited, but what it put last can still be on the way
+        try:
+            return results.get(timeout=poll)
+        except queue.Empty:
+            return None
+
+
+def run_case(instance, task, builder, mode, solve_params=None):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_case, args=(instance, task, builder, mode, solve_params, results))
+    process.start()
+    row = child_result(process, results)
+    process.join()
+    if row is None:
+        row = {"instance": instance["name"], "task": task, "builder": builder, "mode": mode,
+               "status": f"failed: exit code {process.exitcode}"}
+        for name in ("build_s", "vars", "int_vars", "constrs", "nonzeros", "solve_s", "objective", "bound", "gap",
+                     "peak_rss_mb", "build_rss_mb"):
+            row[name] = None
+    return row
+
+
+#the current commit, and whether there are uncommitted changes (None outside of a git checkout)
+def commit():
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                text=True, check=True)
+        return head.stdout.strip(), bool(status.stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(old, new, tolerance=TOLERANCE):
+    key = lambda row: (row["instance"], row["task"], row["builder"], row["mode"])
+    before = {key(row): row for row in old["results"]}
+    regressions = 0
+    print(f"comparing against {old.get('commit')} ({old.get('date')})")
+    print(f"{'instance':<12} {'task':<6} {'builder':<7} {'mode':<11} " + " ".join(f"{name:>12}" for name in COMPARED))
+    for row in new["results"]:
+        previous = before.get(key(row))
+        if previous is None:
+            continue
+        cells = []
+        for name in COMPARED:
+            if not previous.get(name) or row.get(name) is None:
+                cells.append(f"{'-':>12}")
+                continue
+            ratio = row[name] / previous[name]
+            worse = ratio > 1 + tolerance and (name == "peak_rss_mb" or row[name] >= MIN_SECONDS)
+            regressions += worse
+            cells.append(f"{ratio:>11.2f}x" if not worse else f"{ratio:>10.2f}x!")
+        print(f"{row['instance']:<12} {row['task']:<6} {row['builder']:<7} {row['mode']:<11} " + " ".join(cells))
+    print(f"{regressions} regressions (more than {tolerance:.0%} slower or larger)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark model build and solve on synthetic networks")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[parse_size("60x8x40"), parse_size("shipped")],
+                        help="SUPPLIERSxHUBSxPLANTS or shipped")
+    parser.add_argument("--tasks", nargs="+", default=list(cli.TASKS), choices=list(cli.TASKS))
+    parser.add_argument("--formulations", nargs="+", default=[f"{b}:{m}" for b, m in FORMULATIONS],
+                        choices=[f"{b}:{m}" for b, m in FORMULATIONS])
+    parser.add_argument("--data", default=".", help="directory with the shipped CSV files")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--supply", default="lognormal", choices=synthetic.SUPPLY_DISTRIBUTIONS)
+    parser.add_argument("--no-solve", action="store_true", help="only build the models")
+    parser.add_argument("--time-limit", type=float, default=300, help="time limit per solve, in seconds")
+    parser.add_argument("--threads", type=int, default=None, help="Gurobi Threads")
+    parser.add_argument("--output", help="where to write the results, default benchmarks/<commit>.json")
+    parser.add_argument("--compare", help="results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    solve_params = None
+    if not args.no_solve:
+        solve_params = {"OutputFlag": 0, "TimeLimit": args.time_limit}
+        if args.threads is not None:
+            solve_params["Threads"] = args.threads
+
+    instances = []
+    for size in args.sizes:
+        if size is None:
+            instances.append({"name": "shipped", "data": args.data})
+        else:
+            options = dict(size, seed=args.seed, supply=args.supply)
+            instances.append({"name": f"{size['suppliers']}x{size['hubs']}x{size['plants']}", "options": options})
+
+    head, dirty = commit()
+    results = {
+        "commit": head,
+        "dirty": dirty,
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "gurobi": ".".join(map(str, gp.gurobi.version())),
+        "cpus": os.cpu_count(),
+        "settings": {"instances": instances, "solve": solve_params, "goal_share": synthetic.GOAL_SHARE},
+        "results": [],
+    }
+
+    print(f"{'instance':<12} {'task':<6} {'builder':<7} {'mode':<11} {'vars':>9} {'constrs':>8} {'build s':>8} "
+          f"{'peak MB':>8} {'solve s':>8} {'gap':>7}")
+    for instance in instances:
+        for task in args.tasks:
+            for formulation in args.formulations:
+                builder, mode = formulation.split(":")
+                row = run_case(instance, task, builder, mode, solve_params)
+                results["results"].append(row)
+                shown = {name: "-" if row[name] is None else format(row[name], spec) for name, spec in
+                         (("vars", "d"), ("constrs", "d"), ("build_s", ".2f"), ("peak_rss_mb", ".0f"),
+                          ("solve_s", ".2f"), ("gap", ".2%"))}
+                failed = f"  {row['status']}" if str(row["status"]).startswith("failed") else ""
+                print(f"{row['instance']:<12} {task:<6} {builder:<7} {mode:<11} {shown['vars']:>9} "
+                      f"{shown['constrs']:>8} {shown['build_s']:>8} {shown['peak_rss_mb']:>8} {shown['solve_s']:>8} "
+                      f"{shown['gap']:>7}{failed}")
+                sys.stdout.flush()
+
+    output = args.output or os.path.join("benchmarks", f"{head or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
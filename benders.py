@@ -0,0 +1,296 @@
+import argparse, time
+
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+
+import arcs, data, matrix_models, synthetic
+from evaluation_cache import EvaluationCache, fingerprint
+from data import (TRUCK_CAPACITY, TRAIN_CAPACITY, TRUCK_TRIP_COST, TRAIN_TRIP_COST, HUB_COST, HUB_CAPACITY,
+                  PLANT_COST, PLANT_CAPACITY, PRODUCTION_GOAL, THIRD_PARTY_GOAL, THIRD_PARTY_PRICE)
+
+"""
+Benders decomposition of the two-echelon models (task2 and task3).
+
+The master problem only has the binary plant_select/hub_select variables and an estimate of the transport
+cost. Every time Gurobi finds an integer master solution, the callback solves the transportation LP for
+those open sites and adds a lazy cut: an optimality cut if the transport cost was underestimated, a
+feasibility cut (from the Farkas dual) if the open sites can't meet the goal.
+
+The subproblem has to be an LP, so the trip counters are relaxed there: a trip costs trip_cost / capacity per
+Mg. That makes the Benders optimum a lower bound of the real model. The open sites are then evaluated with the
+full trip-count model (sites fixed), which gives a real solution and so an upper bound.
+
+    python benders.py task2 --compare              #against the monolithic model
+    python benders.py task3 --size 500x64x300 --compare --time-limit 600
+"""
+
+#the master estimates the transport cost in millions, Gurobi drops lazy cuts with coefficients as large as the
+#transport cost in $ (around 1e10)
+COST_SCALE = 1e6
+
+
+#the transportation LP for a given set of open sites, see the module docstring. Also used for task1, where the
+#suppliers ship straight to the plants and there are no hubs
+class TransportLP:
+    def __init__(self, network, task, goal, hub_capacity=HUB_CAPACITY, third_party=None,
+                 third_party_price=THIRD_PARTY_PRICE, env=None):
+        model = gp.Model("transport", env=env)
+        model.Params.OutputFlag = 0
+        model.Params.InfUnbdInfo = 1
+        self.model = model
+
+        supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+        supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+        self.hubs = np.asarray(network.hubs if task != "task1" else [], dtype=np.int64)
+        self.plants = np.asarray(network.plants, dtype=np.int64)
+
+        if task == "task1":
+            tables = [("flow", network.road_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST)]
+        else:
+            tables = [("truck_flow", network.truck_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST),
+                      ("train_flow", network.train_cost, TRAIN_CAPACITY, TRAIN_TRIP_COST)]
+
+        #no upper bounds on the flows: they are implied by the constraints, and without them the duals of the
+        #constraints are all there is to the cuts
+        unbounded = lambda src, dst: np.full(len(src), np.inf)
+        flows = {}
+        self.trips = {}  #trips[name] = (capacity, trip cost) of the vehicles on the arc set
+        for name, cost, capacity, trip_cost in tables:
+            src, dst, unit_cost = matrix_models.arc_arrays(cost)
+            flows[name] = matrix_models.add_arcs(model, (src, dst, unit_cost + trip_cost / capacity), None, 0,
+                                                 unbounded, name=name)
+            flows[name].cost = unit_cost
+            self.trips[name] = (capacity, trip_cost)
+        if third_party is not None:
+            third_party_arcs = (np.full(len(self.hubs), third_party, dtype=np.int64), self.hubs.copy(),
+                                np.full(len(self.hubs), float(third_party_price)))
+            flows["third_party_flow"] = matrix_models.add_arcs(model, third_party_arcs, None, 0, unbounded,
+                                                               name="third_party_flow")
+        self.flows = flows
+        first, last = flows[tables[0][0]], flows[tables[-1][0]]
+
+        #the right hand sides are rhs = constant + coefficient * (the site is open), see cut()
+        self.constrs = {
+            "production_goal": model.addConstr(last.columns.sum() >= goal),
+            "supply_cap": model.addConstr(first.out_of(supplier_ids) @ first.columns <= supply),
+            "plant_cap": model.addConstr(last.into(self.plants) @ last.columns <= PLANT_CAPACITY),
+        }
+        self.fixed_rhs = {"production_goal": np.array([goal]), "supply_cap": supply}
+        self.site_rhs = {"plant_cap": PLANT_CAPACITY}
+
+        if task != "task1":
+            hub_in = first.into(self.hubs) @ first.columns
+            if third_party is not None:
+                hub_in = hub_in + flows["third_party_flow"].into(self.hubs) @ flows["third_party_flow"].columns
+            self.constrs["hub_cap"] = model.addConstr(hub_in <= hub_capacity)
+            self.constrs["hub_balance"] = model.addConstr(hub_in - last.out_of(self.hubs) @ last.columns == 0)
+            self.fixed_rhs["hub_balance"] = np.zeros(len(self.hubs))
+            self.site_rhs["hub_cap"] = float(hub_capacity)
+        model.ModelSense = GRB.MINIMIZE
+
+    #solve for the open sites (0/1 arrays in the order of plants and hubs), returns the transport cost with
+    #relaxed trips, or None if the open sites can't meet the goal
+    def solve(self, plants_open, hubs_open=None):
+        self.constrs["plant_cap"].RHS = self.site_rhs["plant_cap"] * np.asarray(plants_open, dtype=np.float64)
+        if "hub_cap" in self.constrs:
+            self.constrs["hub_cap"].RHS = self.site_rhs["hub_cap"] * np.asarray(hubs_open, dtype=np.float64)
+        self.model.optimize()
+
+        if self.model.Status == GRB.OPTIMAL:
+            return self.model.ObjVal
+        if self.model.Status == GRB.INFEASIBLE:
+            return None
+        raise RuntimeError(f"the transportation LP ended with status {self.model.Status}")
+
+    #the flow on every arc of the last solve, such that flows[name][k] = flow over arc k of self.flows[name]
+    def flow_values(self):
+        return {name: np.maximum(flow.columns.X, 0.0) for name, flow in self.flows.items()}
+
+    #solve for the open sites and return (kind, constant, plant coefficients, hub coefficients) of the cut
+    #constant + plants @ y_p + hubs @ y_h, such that kind "optimality": transport cost >= cut,
+    #and kind "feasibility": cut >= 0
+    def cut(self, plants_open, hubs_open):
+        if self.solve(plants_open, hubs_open) is not None:
+            kind, attr = "optimality", "Pi"
+        else:
+            kind, attr = "feasibility", "FarkasDual"
+
+        duals = {name: np.atleast_1d(getattr(constr, attr)) for name, constr in self.constrs.items()}
+        constant = sum(float(duals[name] @ rhs) for name, rhs in self.fixed_rhs.items())
+        return (kind, constant, duals["plant_cap"] * self.site_rhs["plant_cap"],
+                duals["hub_cap"] * self.site_rhs["hub_cap"])
+
+
+class Benders:
+    def __init__(self, network, task="task2", goal=None, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                 hub_capacity=HUB_CAPACITY, third_party_price=THIRD_PARTY_PRICE, env=None, cache=None):
+        if task not in ("task2", "task3"):
+            raise ValueError(f"Benders is only implemented for the two-echelon models, not {task}")
+        if goal is None:
+            goal = PRODUCTION_GOAL if task == "task2" else THIRD_PARTY_GOAL
+        third_party = max(network.suppliers)+1 if task == "task3" else None
+
+        self.network, self.task, self.env, self.cache = network, task, env, cache
+        self.params = {"goal": goal, "plant_cost": plant_cost, "hub_cost": hub_cost, "hub_capacity": hub_capacity}
+        if task == "task3":
+            self.params["third_party_price"] = third_party_price
+        self.sub = TransportLP(network, task, goal, hub_capacity, third_party, third_party_price, env)
+
+        master = gp.Model("master", env=env)
+        self.plant_select = master.addMVar(len(self.sub.plants), vtype=GRB.BINARY, obj=plant_cost,
+                                           name="plant_selection")
+        self.hub_select = master.addMVar(len(self.sub.hubs), vtype=GRB.BINARY, obj=hub_cost, name="hub_selection")
+        self.transport = master.addVar(lb=0.0, obj=COST_SCALE, name="transport")
+
+        #the open plants and hubs have to be able to take the goal at all, which saves a lot of feasibility cuts
+        master.addConstr(PLANT_CAPACITY * self.plant_select.sum() >= goal, name="plant_cover")
+        master.addConstr(hub_capacity * self.hub_select.sum() >= goal, name="hub_cover")
+        master.ModelSense = GRB.MINIMIZE
+        self.master = master
+        self.cuts = {"optimality": 0, "feasibility": 0}
+
+    def _callback(self, model, where):
+        if where != GRB.Callback.MIPSOL:
+            return
+        plants = np.round(model.cbGetSolution(self.plant_vars))
+        hubs = np.round(model.cbGetSolution(self.hub_vars))
+        transport = model.cbGetSolution(self.transport)
+
+        kind, constant, plant_coefs, hub_coefs = self.sub.cut(plants, hubs)
+        cut = gp.LinExpr(constant / COST_SCALE)
+        cut.addTerms((plant_coefs / COST_SCALE).tolist(), self.plant_vars)
+        cut.addTerms((hub_coefs / COST_SCALE).tolist(), self.hub_vars)
+        if kind == "feasibility":
+            model.cbLazy(cut >= 0)
+            self.cuts[kind] += 1
+        elif transport * COST_SCALE < self.sub.model.ObjVal * (1 - 1e-6) - 1e-6:
+            model.cbLazy(self.transport >= cut)
+            self.cuts[kind] += 1
+
+    #solve the master with the Benders cuts, then evaluate the chosen sites with the trip-count model.
+    #returns a dict with the bound, the cost of the chosen sites, the open sites and the times
+    def solve(self, time_limit=None, **params):
+        master = self.master
+        for name, value in params.items():
+            master.setParam(name, value)
+        if time_limit is not None:
+            master.Params.TimeLimit = time_limit
+        master.Params.LazyConstraints = 1
+        master.update()
+        self.plant_vars, self.hub_vars = self.plant_select.tolist(), self.hub_select.tolist()
+
+        start = time.perf_counter()
+        master.optimize(self._callback)
+        master_seconds = time.perf_counter() - start
+        result = {"status": master.Status, "bound": master.ObjBound, "cuts": dict(self.cuts),
+                  "master_s": master_seconds, "objective": None, "evaluate_s": None, "plants": [], "hubs": []}
+        if master.SolCount == 0:
+            return result
+
+        plants = np.round(self.plant_select.X) > 0
+        hubs = np.round(self.hub_select.X) > 0
+        result["plants"] = self.sub.plants[plants].tolist()
+        result["hubs"] = self.sub.hubs[hubs].tolist()
+
+        #the real cost of the chosen sites, with integer trips
+        start = time.perf_counter()
+        objective, _ = evaluate(self.network, self.task, plants, hubs, self.env, time_limit, self.cache,
+                                **self.params)
+        result["evaluate_s"] = time.perf_counter() - start
+        result["objective"] = objective
+        return result
+
+
+#the cost of the trip-count model with the open sites fixed, returns (objective, model status).
+#with an evaluation_cache.EvaluationCache, sites that were solved to optimality (or infeasibility) before are
+#not solved again
+def evaluate(network, task, plants_open, hubs_open, env=None, time_limit=None, cache=None, **params):
+    if cache is not None:
+        plants = np.asarray(network.plants)[np.asarray(plants_open, dtype=bool)].tolist()
+        hubs = np.asarray(network.hubs)[np.asarray(hubs_open, dtype=bool)].tolist()
+        key = cache.key("mip", fingerprint(network), task, plants, hubs, **params)
+        known = cache.get(key)
+        if known is not None:
+            return known
+
+    built = matrix_models.BUILDERS[task](network, mode=arcs.TRIP_COUNT, env=env, **params)
+    model = built.model
+    model.Params.OutputFlag = 0
+    if time_limit is not None:
+        model.Params.TimeLimit = time_limit
+    built.plant_select.LB = built.plant_select.UB = np.asarray(plants_open, dtype=np.float64)
+    built.hub_select.LB = built.hub_select.UB = np.asarray(hubs_open, dtype=np.float64)
+    model.optimize()
+    objective = model.ObjVal if model.SolCount > 0 else None
+    status = model.Status
+    model.dispose()
+    if cache is not None and status in (GRB.OPTIMAL, GRB.INFEASIBLE):
+        cache.put(key, (objective, status))
+    return objective, status
+
+
+#the monolithic trip-count model, for comparison
+def monolithic(network, task, time_limit=None, env=None, **params):
+    built = matrix_models.BUILDERS[task](network, mode=arcs.TRIP_COUNT, env=env, **params)
+    model = built.model
+    model.Params.OutputFlag = 0
+    if time_limit is not None:
+        model.Params.TimeLimit = time_limit
+    start = time.perf_counter()
+    model.optimize()
+    result = {"seconds": time.perf_counter() - start, "status": model.Status, "bound": model.ObjBound,
+              "objective": model.ObjVal if model.SolCount > 0 else None}
+    model.dispose()
+    return result
+
+
+def gap(objective, bound):
+    if objective is None or bound is None or objective == 0:
+        return None
+    return abs(objective - bound) / abs(objective)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benders decomposition of the two-echelon models")
+    parser.add_argument("task", choices=["task2", "task3"])
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--goal", type=float, help="production goal in liters, by default the goal of the task "
+                        "(70%%/110%% of the supply for synthetic instances)")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit per solve, in seconds")
+    parser.add_argument("--compare", action="store_true", help="also solve the monolithic model")
+    parser.add_argument("--cache", help="file to keep the evaluations of the chosen sites in between runs")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+    else:
+        network = data.load_network(args.data)
+    if args.goal is not None:
+        params["goal"] = data.ethanol_to_biomass(args.goal)
+
+    cache = EvaluationCache(path=args.cache) if args.cache else None
+    benders = Benders(network, args.task, cache=cache, **params)
+    benders.master.Params.OutputFlag = 0
+    result = benders.solve(args.time_limit)
+    if cache is not None:
+        cache.save()
+    total = result["master_s"] + (result["evaluate_s"] or 0)
+    rows = [("benders", total, result["objective"], result["bound"])]
+    print(f"benders: {result['cuts']['optimality']} optimality and {result['cuts']['feasibility']} feasibility cuts, "
+          f"master {result['master_s']:.2f} s, evaluation {result['evaluate_s'] or 0:.2f} s, "
+          f"{len(result['plants'])} plants and {len(result['hubs'])} hubs open")
+
+    if args.compare:
+        full = monolithic(network, args.task, args.time_limit, **params)
+        rows.append(("monolithic", full["seconds"], full["objective"], full["bound"]))
+
+    print(f"{'solver':<11} {'seconds':>8} {'objective':>16} {'bound':>16} {'gap':>7}")
+    for label, seconds, objective, bound in rows:
+        g = gap(objective, bound)
+        print(f"{label:<11} {seconds:>8.2f} {'-' if objective is None else f'{objective:.0f}':>16} "
+              f"{bound:>16.0f} {'-' if g is None else f'{g:.2%}':>7}")
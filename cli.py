@@ -0,0 +1,216 @@
+import argparse, contextlib, importlib, inspect, sys, time
+
+import array_models, backends, data, solution_export
+
+"""
+Command line entry point for the three task models.
+
+    python cli.py task2                                  #same as python task2.py
+    python cli.py task3 --data other_region --time-limit 600 --mip-gap 0.005 --threads 4
+    python cli.py task1 --goal 400000000 --param MIPFocus=1 --param Seed=3
+    python cli.py task2 --warm-start                     #MIP start from heuristic.py
+    python cli.py task2 --profile profile.json           #where the time goes, see instrumentation.py
+    python cli.py task2 --export solution                #flows and sites as CSV, see solution_export.py
+    python cli.py task2 --artifacts .artifacts           #store the model and solution, warm start next time
+    python cli.py task2 --artifacts .artifacts --reload  #read the stored model instead of building it
+    python cli.py task2 --backend highs                  #solve the array model with HiGHS, see backends.py
+
+Any --backend other than gurobi (the default) works without gurobipy installed.
+
+For use inside a long running process, build once with models.BUILDERS (or matrix_models.BUILDERS) and call
+models.solve as often as needed, or use sweep.Sweep to change the parameters between solves.
+"""
+
+TASKS = {
+    "task1": "suppliers -> plants by truck",
+    "task2": "suppliers -> hubs by truck -> plants by train",
+    "task3": "like task2, with unlimited third party supply delivered to the hubs",
+}
+#the modules with the gurobipy builders, imported when used so that the other backends don't need gurobipy
+BUILDER_SETS = {"loop": "models", "matrix": "matrix_models"}
+
+#model parameters that can be set from the command line, the goal is given in liters of ethanol
+MODEL_PARAMS = ("goal", "plant_cost", "hub_cost", "hub_capacity", "third_party_price")
+
+
+#"Name=Value" -> (Name, Value), with the value turned into a number where possible
+def parse_param(text):
+    name, sep, value = text.partition("=")
+    if not sep or not name:
+        raise argparse.ArgumentTypeError(f"expected Name=Value, got '{text}'")
+    for convert in (int, float):
+        try:
+            return name, convert(value)
+        except ValueError:
+            pass
+    return name, value
+
+
+#the gurobipy builders of a BUILDER_SETS entry, by task
+def builder_set(name):
+    return importlib.import_module(BUILDER_SETS[name]).BUILDERS
+
+
+def parser():
+    p = argparse.ArgumentParser(description="Build and solve one of the task models",
+                                formatter_class=argparse.RawDescriptionHelpFormatter,
+                                epilog="\n".join(f"  {task}: {text}" for task, text in TASKS.items()))
+    p.add_argument("task", choices=list(TASKS))
+    p.add_argument("--data", default=".", help="directory with the CSV files")
+    p.add_argument("--builder", default="matrix", choices=list(BUILDER_SETS))
+    p.add_argument("--mode", default=array_models.TRIP_COUNT, choices=array_models.MODES,
+                   help="arc formulation, see arcs.py")
+    p.add_argument("--goal", type=float, help="production goal, in liters of ethanol")
+    p.add_argument("--plant-cost", type=float)
+    p.add_argument("--hub-cost", type=float)
+    p.add_argument("--hub-capacity", type=float)
+    p.add_argument("--third-party-price", type=float)
+    p.add_argument("--time-limit", type=float, help="Gurobi TimeLimit, in seconds")
+    p.add_argument("--mip-gap", type=float, help="Gurobi MIPGap")
+    p.add_argument("--threads", type=int, help="Gurobi Threads")
+    p.add_argument("--param", type=parse_param, action="append", default=[], metavar="NAME=VALUE",
+                   help="any other Gurobi parameter, can be repeated")
+    p.add_argument("--warm-start", action="store_true", help="start from the greedy/local search solution of "
+                   "heuristic.py")
+    p.add_argument("--profile", metavar="FILE", help="write phase times, model sizes and the solve progress as JSON")
+    p.add_argument("--export", metavar="DIR", help="write the arcs with flow and the site utilization to DIR")
+    p.add_argument("--export-format", default="csv", choices=solution_export.FORMATS)
+    p.add_argument("--artifacts", metavar="DIR", help="store the model and its solution in DIR, and start from "
+                   "the stored solution when the inputs and model parameters are the same, see artifacts.py")
+    p.add_argument("--reload", action="store_true", help="with --artifacts, read the stored model instead of "
+                   "building it")
+    p.add_argument("--backend", default="gurobi", choices=list(backends.BACKENDS),
+                   help="solver, anything but gurobi solves the array model of array_models.py, see backends.py")
+    p.add_argument("--quiet", action="store_true", help="hide the solver log")
+    return p
+
+
+#--backend highs/scipy: build the array model and solve it without gurobipy. Only the options that are not
+#Gurobi specific can be used
+def solve_backend(p, args, model_params):
+    gurobi_only = [option for option, used in (("--builder loop", args.builder == "loop"), ("--param", args.param),
+                                               ("--warm-start", args.warm_start), ("--profile", args.profile),
+                                               ("--export", args.export), ("--artifacts", args.artifacts))
+                   if used]
+    if gurobi_only:
+        p.error(f"{', '.join(gurobi_only)} needs --backend gurobi")
+
+    network = data.load_network(args.data)
+    model = array_models.BUILDERS[args.task](network, mode=args.mode, **model_params)
+    result = backends.solve(model, args.backend, args.time_limit, args.mip_gap, args.threads, not args.quiet)
+    if result.status == "optimal":
+        print(f"Minimal Total Cost: ${round(result.objective)}")
+    elif result.objective is not None:
+        print(f"Best Total Cost found: ${round(result.objective)} (gap {result.gap:.2%})")
+    else:
+        print("No solution found.")
+        return 1
+    return 0
+
+
+#--backend gurobi: build (or reload) the model with the builders of --builder and solve it with models.solve.
+#envs is a contextlib.ExitStack for any Env that has to outlive the model
+def solve_gurobi(p, args, model_params, envs):
+    from gurobipy import GRB
+    import artifacts, heuristic, instrumentation, models
+
+    builder = builder_set(args.builder)[args.task]
+
+    solver_params = dict(args.param)
+    for name, option in (("TimeLimit", args.time_limit), ("MIPGap", args.mip_gap), ("Threads", args.threads)):
+        if option is not None:
+            solver_params[name] = option
+    if args.quiet:
+        solver_params["OutputFlag"] = 0
+
+    if args.reload and not args.artifacts:
+        p.error("--reload needs --artifacts")
+    if args.reload and (args.warm_start or args.export):
+        p.error("--reload gives the model without the builder's variables, it can't be used with --warm-start "
+                "or --export")
+    store = artifacts.Store(args.data, args.task, args.builder, args.mode, model_params, args.artifacts) \
+        if args.artifacts else None
+    reloaded = args.reload and store.exists()
+
+    profile = instrumentation.Profile() if args.profile else None
+    with profile or contextlib.nullcontext():
+        start = time.perf_counter()
+        if reloaded:
+            with instrumentation.phase("reload"):
+                env = envs.enter_context(artifacts.quiet_env()) if args.quiet else None
+                built = artifacts.Loaded(store.load_model(env, **solver_params))
+        else:
+            with instrumentation.phase("load"):
+                network = data.load_network(args.data)
+            built = builder(network, mode=args.mode, **model_params)
+            built.model.update()
+            if store and store.exists():
+                store.apply_start(built.model, **solver_params)
+        build_s = time.perf_counter() - start
+        if args.warm_start:
+            with instrumentation.phase("heuristic", built.model):
+                estimate = heuristic.Heuristic(network, args.task, **model_params)
+                try:
+                    solution = estimate.run()
+                except ValueError as error:
+                    print(f"No heuristic solution: {error}")
+                else:
+                    print(f"Heuristic Total Cost: ${round(solution.cost)}")
+                    heuristic.apply_start(built, solution, estimate)
+        start = time.perf_counter()
+        objective = models.solve(built, profile.callback if profile else None, **solver_params)
+        solve_s = time.perf_counter() - start
+
+    if profile:
+        profile.record_result(built.model)
+        profile.write(args.profile)
+        profile.print_phases()
+
+    # Check the optimization status and retrieve the solution
+    if built.model.Status == GRB.OPTIMAL:
+        print(f"Minimal Total Cost: ${round(objective)}")
+    elif objective is not None:
+        print(f"Best Total Cost found: ${round(objective)} (gap {built.model.MIPGap:.2%})")
+    else:
+        print("No solution found.")
+        return 1
+
+    if store:
+        stored = store.exists()
+        if stored:
+            first = store.meta()
+            saved = first["build_s"] + first["solve_s"] - build_s - solve_s
+            print(f"Artifacts {store.path}: {'load' if reloaded else 'build'} {build_s:.2f} s "
+                  f"(first build {first['build_s']:.2f} s), solve {solve_s:.2f} s (first solve "
+                  f"{first['solve_s']:.2f} s), {saved:.2f} s saved")
+        store.save(built.model, build_s, solve_s)
+        if not stored:
+            print(f"Artifacts stored in {store.path}")
+
+    if args.export:
+        hub_capacity = model_params.get("hub_capacity", data.HUB_CAPACITY)
+        summary = solution_export.export(built, network, args.export, hub_capacity, args.export_format)
+        solution_export.print_summary(summary)
+    return 0
+
+
+
+def main(argv=None):
+    p = parser()
+    args = p.parse_args(argv)
+
+    model_params = {name: getattr(args, name) for name in MODEL_PARAMS if getattr(args, name) is not None}
+    unknown = set(model_params) - set(inspect.signature(array_models.BUILDERS[args.task]).parameters)
+    if unknown:
+        p.error(f"{args.task} has no {', '.join(sorted(unknown))}")
+    if "goal" in model_params:
+        model_params["goal"] = data.ethanol_to_biomass(model_params["goal"])
+    if args.backend != "gurobi":
+        return solve_backend(p, args, model_params)
+    #the Envs opened for the run are closed after solve_gurobi returns, and with it the model read into them
+    with contextlib.ExitStack() as envs:
+        return solve_gurobi(p, args, model_params, envs)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import argparse, time
+
+import arcs, data, models
+
+"""
+Compares the per-trip expansion with the trip-count formulation (see arcs.py) on the shipped CSVs.
+
+    python compare_formulations.py                     #build all three tasks in both modes
+    python compare_formulations.py task2 --solve       #also optimize, with a time limit per model
+
+Note that the per-trip objective includes the fixed cost of every potential trip (like the task scripts),
+so the objective values of the two modes are not directly comparable, the sizes and times are.
+"""
+
+
+def measure(task, network, mode, solve=False, time_limit=None):
+    start = time.perf_counter()
+    built = models.BUILDERS[task](network, mode=mode)
+    model = built.model
+    model.update()
+    row = {
+        "task": task,
+        "mode": mode,
+        "vars": model.NumVars,
+        "int_vars": model.NumIntVars,
+        "constrs": model.NumConstrs,
+        "nonzeros": model.NumNZs,
+        "build_s": time.perf_counter() - start,
+        "solve_s": None,
+        "objective": None,
+        "gap": None,
+    }
+    if solve:
+        if time_limit is not None:
+            model.Params.TimeLimit = time_limit
+        model.optimize()
+        row["solve_s"] = model.Runtime
+        if model.SolCount > 0:
+            row["objective"] = model.ObjVal
+            row["gap"] = model.MIPGap
+    model.dispose()
+    return row
+
+
+def print_table(rows):
+    fmt = lambda v, f: "-" if v is None else format(v, f)
+    print(f"{'task':<6} {'mode':<11} {'vars':>10} {'ints':>8} {'constrs':>9} {'nonzeros':>10} "
+          f"{'build s':>8} {'solve s':>8} {'objective':>16} {'gap':>7}")
+    for r in rows:
+        print(f"{r['task']:<6} {r['mode']:<11} {r['vars']:>10} {r['int_vars']:>8} {r['constrs']:>9} {r['nonzeros']:>10} "
+              f"{r['build_s']:>8.2f} {fmt(r['solve_s'], '8.2f'):>8} {fmt(r['objective'], '16.0f'):>16} "
+              f"{fmt(r['gap'], '7.2%'):>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the per-trip and trip-count arc formulations")
+    parser.add_argument("tasks", nargs="*", default=list(models.BUILDERS), help="any of task1, task2, task3")
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--solve", action="store_true", help="also optimize each model")
+    parser.add_argument("--time-limit", type=float, default=600, help="time limit per solve, in seconds")
+    args = parser.parse_args()
+    for task in args.tasks:
+        if task not in models.BUILDERS:
+            parser.error(f"unknown task '{task}'")
+
+    network = data.load_network(args.data)
+    rows = [measure(task, network, mode, args.solve, args.time_limit) for task in args.tasks for mode in arcs.MODES]
+    print_table(rows)
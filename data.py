@@ -0,0 +1,137 @@
+import csv, hashlib, os
+
+import numpy as np
+
+#note that
+TRUCK_CAPACITY = 500
+TRAIN_CAPACITY = 20000
+
+#fixed cost of a single truck or train trip, regardless of how much it carries
+TRUCK_TRIP_COST = 10000
+TRAIN_TRIP_COST = 60000
+#the trip cost of every arc set of the task models, by name
+TRIP_COST = {"flow": TRUCK_TRIP_COST, "truck_flow": TRUCK_TRIP_COST, "train_flow": TRAIN_TRIP_COST}
+
+#and that for the trains
+HUB_COST = 3476219
+HUB_CAPACITY = 300000
+
+#note that
+PLANT_YIELD = 232 #liters, per Mg
+PLANT_COST = 130956797
+
+#price per Mg (delivered to a hub) of biomass bought from the third party in task3
+THIRD_PARTY_PRICE = 2000
+
+#biomass conversion, to keep everything in the same unit
+biomass_to_ethanol = lambda N : N*PLANT_YIELD
+ethanol_to_biomass = lambda N : N/PLANT_YIELD
+
+#more useful constants
+PLANT_CAPACITY = ethanol_to_biomass(152063705)   #152063705 liters -> 655,447 Mg
+PRODUCTION_GOAL = ethanol_to_biomass(500000000)  #500,000,000 liters -> 2,155,172 Mg
+THIRD_PARTY_GOAL = ethanol_to_biomass(800000000) #800,000,000 liters -> 3,448,275 Mg (task3)
+
+
+#simplifying loading of files such that a csv can be loaded into a nested list
+#for example the line "4801,20,9,2" would be [4801,20,9,2], and this would be done for each line
+def csv_loader(filename, data_dir="."):
+    l = []
+    with open(os.path.join(data_dir, f"{filename}.csv")) as f:
+        read = csv.reader(f)
+        next(read)
+        for line in read:
+            l.append(line)
+        return l
+
+
+#everything the task models need to know about the network, in the same shapes the task scripts used
+class Network:
+    def __init__(self, suppliers, plants, hubs, road_cost, truck_cost, train_cost):
+        self.suppliers = suppliers    #suppliers[ID] = total supply
+        self.plants = plants          #list of plant IDs
+        self.hubs = hubs              #list of hub IDs
+        self.road_cost = road_cost    #road_cost[(s,p)] = cost between supplier and plant per Mg
+        self.truck_cost = truck_cost  #truck_cost[(s,h)] = cost between supplier and hub per Mg
+        self.train_cost = train_cost  #train_cost[(h,p)] = cost between hub and plant per Mg
+
+    #a copy with some of the fields swapped out, for example replace(road_cost=fewer_arcs)
+    def replace(self, **changes):
+        fields = dict(vars(self))
+        fields.update(changes)
+        return Network(**fields)
+
+
+#the arc CSVs as typed columns, one record per line: source ID, destination ID, distance, cost per Mg per
+#distance unit, fixed cost per trip and vehicle capacity (the columns of roads_s_p, roads_s_h and railroads_h_p)
+ARC_DTYPE = np.dtype([
+    ("src", np.int64),
+    ("dst", np.int64),
+    ("distance", np.float64),
+    ("unit_cost", np.float64),
+    ("trip_cost", np.float64),
+    ("capacity", np.float64),
+])
+
+#bump when ARC_DTYPE or the parsing changes, so that old cache files are not picked up
+CACHE_VERSION = 1
+CACHE_DIR = ".arc_cache"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+#load an arc CSV as a (read-only, memory-mapped) record array with ARC_DTYPE.
+#the parsed arrays are cached as .npy files in cache_dir, keyed by the hash of the CSV, so the CSV is only
+#parsed again when its contents change. cache_dir=None turns the cache off
+def load_arcs(filename, data_dir=".", cache_dir=CACHE_DIR):
+    path = os.path.join(data_dir, f"{filename}.csv")
+    if cache_dir is None:
+        return _parse_arcs(path)
+
+    cache_dir = os.path.join(data_dir, cache_dir)
+    cached = os.path.join(cache_dir, f"{filename}-v{CACHE_VERSION}-{file_hash(path)[:16]}.npy")
+    if not os.path.exists(cached):
+        os.makedirs(cache_dir, exist_ok=True)
+        #drop caches of older versions of the same file, then write through a temporary file so that a
+        #concurrent run never maps a half-written cache
+        for old in os.listdir(cache_dir):
+            if old.startswith(f"{filename}-") and old.endswith(".npy"):
+                os.remove(os.path.join(cache_dir, old))
+        temporary = f"{cached}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, _parse_arcs(path))
+        os.replace(temporary, cached)
+    return np.load(cached, mmap_mode="r")
+
+
+def _parse_arcs(path):
+    columns = np.loadtxt(path, delimiter=",", skiprows=1, dtype=np.float64, ndmin=2)
+    arcs = np.empty(len(columns), dtype=ARC_DTYPE)
+    for k, field in enumerate(ARC_DTYPE.names):
+        arcs[field] = columns[:, k]
+    return arcs
+
+
+#cost of travel in arcs for the full distance, such that cost[(i,j)] = distance * cost per unit
+def arc_costs(filename, data_dir=".", cache_dir=CACHE_DIR):
+    arcs = load_arcs(filename, data_dir, cache_dir)
+    ends = zip(arcs["src"].tolist(), arcs["dst"].tolist())
+    return dict(zip(ends, (arcs["distance"] * arcs["unit_cost"]).tolist()))
+
+
+def load_network(data_dir=".", cache_dir=CACHE_DIR):
+    suppliers = {int(sup[0]) : float(sup[1]) for sup in csv_loader("suppliers", data_dir)}
+    plants = [int(plant[0]) for plant in csv_loader("plants", data_dir)] #reminder that capacity is constant
+    hubs = [int(hub[0]) for hub in csv_loader("hubs", data_dir)] #reminder that capacity is constant
+    return Network(
+        suppliers, plants, hubs,
+        arc_costs("roads_s_p", data_dir, cache_dir),
+        arc_costs("roads_s_h", data_dir, cache_dir),
+        arc_costs("railroads_h_p", data_dir, cache_dir),
+    )
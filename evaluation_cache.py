@@ -0,0 +1,119 @@
+import hashlib, os, pickle
+from collections import OrderedDict
+
+import numpy as np
+
+from array_models import arc_arrays
+
+"""
+Cache of evaluations of open site sets, for search loops and what-if runs that keep coming back to the same sets.
+
+Entries are keyed by what was evaluated (the kind of evaluation, the network, the task, the open plants and hubs
+as frozensets of IDs and the scenario parameters), and the least recently used ones are dropped once there are
+more than maxsize. With a path the cache is read from and written back to a pickle file, so that later runs on
+the same network start with the evaluations of the earlier ones.
+
+    cache = EvaluationCache(path="evaluations.pickle")
+    heuristic = Heuristic(network, "task3", cache=cache)
+    ...
+    cache.save()
+    print(cache.stats())
+"""
+
+#bump when the keys or values change, so that old cache files are not picked up
+CACHE_VERSION = 1
+MAXSIZE = 10000
+
+
+#a short hash of everything in a data.Network, so that entries of different networks never mix
+def fingerprint(network):
+    digest = hashlib.sha256()
+    digest.update(np.fromiter(network.suppliers, dtype=np.int64).tobytes())
+    digest.update(np.fromiter(network.suppliers.values(), dtype=np.float64).tobytes())
+    digest.update(np.asarray(network.plants, dtype=np.int64).tobytes())
+    digest.update(np.asarray(network.hubs, dtype=np.int64).tobytes())
+    for table in (network.road_cost, network.truck_cost, network.train_cost):
+        for column in arc_arrays(table):
+            digest.update(column.tobytes())
+    return digest.hexdigest()[:16]
+
+
+class EvaluationCache:
+    def __init__(self, maxsize=MAXSIZE, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    #the key of an evaluation, plants and hubs are the IDs of the open sites
+    @staticmethod
+    def key(kind, network_key, task, plants, hubs, **params):
+        return (kind, network_key, task, frozenset(plants), frozenset(hubs), tuple(sorted(params.items())))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    #the stored value, or None (counted as a miss) if there is none
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else None}
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            stored = pickle.load(f)
+        if stored.get("version") != CACHE_VERSION:
+            return
+        for key, value in stored["entries"]:
+            self.put(key, value)
+
+    #write the entries (least recently used first) through a temporary file, like data.load_arcs
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            raise ValueError("the cache has no path to be saved to")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "entries": list(self.entries.items())}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+
+#the flows of an evaluation as (arc positions, flow) per arc set, only the arcs that carry anything
+def flow_summary(flows):
+    summary = {}
+    for name, flow in flows.items():
+        used = np.flatnonzero(flow > 0)
+        summary[name] = (used.astype(np.int32), flow[used])
+    return summary
+
+
+#the dense flows back from flow_summary, sizes[name] = number of arcs of the arc set
+def expand_flows(summary, sizes):
+    flows = {}
+    for name, (used, values) in summary.items():
+        flows[name] = np.zeros(sizes[name])
+        flows[name][used] = values
+    return flows
@@ -0,0 +1,352 @@
+import argparse, time
+
+import numpy as np
+from gurobipy import GRB
+
+import arcs, data, matrix_models, synthetic
+from benders import TransportLP
+from evaluation_cache import EvaluationCache, fingerprint, flow_summary, expand_flows
+from network_flow import TransportFlow
+from data import (HUB_COST, HUB_CAPACITY, PLANT_COST, PLANT_CAPACITY, PRODUCTION_GOAL, THIRD_PARTY_GOAL,
+                  THIRD_PARTY_PRICE)
+
+"""
+Greedy and local search heuristic for the three tasks, for quick estimates and as a MIP start.
+
+The greedy opens the sites with the lowest estimated cost per Mg (the investment plus filling the site from its
+cheapest sources) until their capacity covers the goal, and then more of them as long as that lowers the cost.
+The flows for the open sites come from a min-cost flow with the trips relaxed to a cost per Mg
+(network_flow.TransportFlow, or the LP benders.TransportLP), and every arc then gets as many trips as its flow
+needs, which gives a feasible solution of the trip-count model. Local search then tries to drop, add and swap
+sites as long as that lowers the cost.
+
+    python heuristic.py task2                          #estimate only
+    python heuristic.py task3 --mip --time-limit 600   #then solve the model with the estimate as MIP start
+
+apply_start() puts a solution into the Start attributes of a built model (loop or matrix builder, any arc
+formulation), python cli.py task2 --warm-start does both.
+"""
+
+#what routes the flow for a set of open sites: network_flow.TransportFlow (no solver needed) or benders.TransportLP
+ENGINES = ("flow", "lp")
+#how many of the best closed sites local search tries to add or swap in for every open site
+CANDIDATES = 10
+
+
+#the open sites (bool arrays in the order of network.plants and network.hubs) with the flows and the cost
+class Solution:
+    def __init__(self, plants_open, hubs_open, flows, cost, transport):
+        self.plants_open = plants_open
+        self.hubs_open = hubs_open
+        self.flows = flows          #flows[name][k] = flow over arc k of the engine's flows[name]
+        self.cost = cost            #total cost with integer trips, as the trip-count model counts it
+        self.transport = transport  #transport cost with relaxed trips
+
+
+#cost per Mg of filling every destination with dst_capacity from its cheapest sources, where a source can give at
+#most src_capacity. Sources with no limit (inf) work too. Destinations without arcs get inf
+def fill_cost(n_dst, dst_pos, cost, src_capacity, dst_capacity):
+    capacity = np.minimum(src_capacity, dst_capacity)
+    order = np.lexsort((cost, dst_pos))
+    dst_pos, cost, capacity = dst_pos[order], cost[order], capacity[order]
+
+    #what came before every arc from cheaper arcs into the same destination
+    cumulative = np.cumsum(capacity)
+    first = np.searchsorted(dst_pos, dst_pos)
+    before = cumulative - capacity - (cumulative[first] - capacity[first])
+    taken = np.clip(dst_capacity - before, 0, capacity)
+
+    filled = np.bincount(dst_pos, taken, minlength=n_dst)
+    total = np.bincount(dst_pos, taken * cost, minlength=n_dst)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(filled > 0, total / filled, np.inf)
+
+
+class Heuristic:
+    def __init__(self, network, task="task2", goal=None, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                 hub_capacity=HUB_CAPACITY, third_party_price=THIRD_PARTY_PRICE, engine="flow", cache=None,
+                 env=None):
+        if goal is None:
+            goal = THIRD_PARTY_GOAL if task == "task3" else PRODUCTION_GOAL
+        third_party = max(network.suppliers)+1 if task == "task3" else None
+        self.task, self.goal = task, goal
+        self.plant_cost, self.hub_cost, self.hub_capacity = plant_cost, hub_cost, hub_capacity
+        if engine == "flow":
+            self.engine = TransportFlow(network, task, goal, hub_capacity, third_party, third_party_price)
+        elif engine == "lp":
+            self.engine = TransportLP(network, task, goal, hub_capacity, third_party, third_party_price, env)
+        else:
+            raise ValueError(f"unknown engine '{engine}', expected one of {ENGINES}")
+        self.plants, self.hubs = self.engine.plants, self.engine.hubs
+        self.evaluations = 0
+
+        #an evaluation_cache.EvaluationCache to share evaluations between searches and runs, or None
+        self.cache = cache
+        self.network_key = fingerprint(network) if cache is not None else None
+        self.flow_params = {"goal": goal, "hub_capacity": hub_capacity}
+        if task == "task3":
+            self.flow_params["third_party_price"] = third_party_price
+
+        #estimated cost per Mg through every site, lower is better
+        supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+        supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+        per_mg = {name: flow.cost + self.engine.trips[name][1] / self.engine.trips[name][0]
+                  for name, flow in self.engine.flows.items() if name in self.engine.trips}
+        first, last = list(per_mg)[0], list(per_mg)[-1]
+
+        self.hub_score = np.zeros(0)
+        source_score = 0
+        if task != "task1":
+            truck = self.engine.flows[first]
+            dst_pos = matrix_models.positions(self.hubs, truck.dst)
+            src_capacity = supply[matrix_models.positions(supplier_ids, truck.src)]
+            cost = per_mg[first]
+            if third_party is not None:
+                dst_pos = np.concatenate([dst_pos, np.arange(len(self.hubs))])
+                src_capacity = np.concatenate([src_capacity, np.full(len(self.hubs), np.inf)])
+                cost = np.concatenate([cost, np.full(len(self.hubs), float(third_party_price))])
+            self.hub_score = hub_cost / hub_capacity + fill_cost(len(self.hubs), dst_pos, cost, src_capacity,
+                                                                 hub_capacity)
+            #a plant is only as good as the hubs it would get its biomass from
+            source_score = self.hub_score[matrix_models.positions(self.hubs, self.engine.flows[last].src)]
+
+        into_plants = self.engine.flows[last]
+        if task == "task1":
+            src_capacity = supply[matrix_models.positions(supplier_ids, into_plants.src)]
+        else:
+            src_capacity = np.full(len(into_plants), float(hub_capacity))
+        self.plant_score = plant_cost / PLANT_CAPACITY + fill_cost(
+            len(self.plants), matrix_models.positions(self.plants, into_plants.dst), per_mg[last] + source_score,
+            src_capacity, PLANT_CAPACITY)
+
+    #the solution for the given open sites, or None if they can't meet the goal
+    def evaluate(self, plants_open, hubs_open):
+        self.evaluations += 1
+        routed = self._route(plants_open, hubs_open)
+        if routed["transport"] is None:
+            return None
+        flows = expand_flows(routed["flows"], {name: len(arcs) for name, arcs in self.engine.flows.items()})
+        cost = self.plant_cost * plants_open.sum() + self.hub_cost * hubs_open.sum() + routed["cost"]
+        return Solution(plants_open.copy(), hubs_open.copy(), flows, cost, routed["transport"])
+
+    #the flow for the open sites with its cost (integer trips) and its transport cost (relaxed trips), from the
+    #cache if there is one. The site costs don't change the flow, so they are not part of the key
+    def _route(self, plants_open, hubs_open):
+        if self.cache is not None:
+            key = self.cache.key("route", self.network_key, self.task, self.plants[plants_open].tolist(),
+                                 self.hubs[hubs_open].tolist(), **self.flow_params)
+            routed = self.cache.get(key)
+            if routed is not None:
+                return routed
+
+        transport = self.engine.solve(plants_open, hubs_open)
+        routed = {"transport": transport, "cost": None, "flows": None}
+        if transport is not None:
+            flows = self.engine.flow_values()
+            routed["cost"] = 0.0
+            for name, flow in flows.items():
+                routed["cost"] += float(self.engine.flows[name].cost @ flow)
+                if name in self.engine.trips:
+                    capacity, trip_cost = self.engine.trips[name]
+                    routed["cost"] += trip_cost * trips_needed(flow, capacity).sum()
+            routed["flows"] = flow_summary(flows)
+        if self.cache is not None:
+            self.cache.put(key, routed)
+        return routed
+
+    #whether the open sites have enough capacity for the goal at all, saves routing the flow
+    def covers(self, plants_open, hubs_open):
+        return (PLANT_CAPACITY * plants_open.sum() >= self.goal
+                and (self.task == "task1" or self.hub_capacity * hubs_open.sum() >= self.goal))
+
+    #open the sites with the best scores until their capacity covers the goal, and more as long as the flow is
+    #infeasible (the open sites don't have to be reachable from enough supply) or it lowers the cost
+    def greedy(self):
+        plant_order = np.argsort(self.plant_score, kind="stable")
+        hub_order = np.argsort(self.hub_score, kind="stable")
+        plants_open = np.zeros(len(self.plants), dtype=bool)
+        hubs_open = np.zeros(len(self.hubs), dtype=bool)
+        n_plants = min(len(self.plants), int(np.ceil(self.goal / PLANT_CAPACITY)))
+        n_hubs = min(len(self.hubs), int(np.ceil(self.goal / self.hub_capacity)))
+
+        while True:
+            plants_open[plant_order[:n_plants]] = True
+            hubs_open[hub_order[:n_hubs]] = True
+            solution = self.evaluate(plants_open, hubs_open)
+            if solution is not None:
+                break
+            if n_plants == len(self.plants) and n_hubs == len(self.hubs):
+                raise ValueError("the goal can't be met even with all plants and hubs open")
+            n_plants = min(n_plants+1, len(self.plants))
+            n_hubs = min(n_hubs+1, len(self.hubs))
+
+        #transport is most of the cost, so opening more sites than the goal needs usually pays: keep opening the
+        #next best ones while that lowers the cost, until CANDIDATES in a row didn't
+        for kind, order in (("plants", plant_order), ("hubs", hub_order)):
+            misses = 0
+            for site in order:
+                sites = getattr(solution, f"{kind}_open").copy()
+                if sites[site]:
+                    continue
+                sites[site] = True
+                candidate = (self.evaluate(sites, solution.hubs_open) if kind == "plants"
+                             else self.evaluate(solution.plants_open, sites))
+                if candidate is not None and candidate.cost < solution.cost:
+                    solution, misses = candidate, 0
+                else:
+                    misses += 1
+                    if misses == CANDIDATES:
+                        break
+        return solution
+
+    #the site sets next to the given one: drop an open site, swap an open site for one of the best closed ones,
+    #or open one of the best closed ones. Worst open sites first
+    def _moves(self, solution):
+        for kind, score in (("plants", self.plant_score), ("hubs", self.hub_score)):
+            current = getattr(solution, f"{kind}_open")
+            opened = np.flatnonzero(current)
+            opened = opened[np.argsort(-score[opened], kind="stable")]
+            closed = np.flatnonzero(~current)
+            closed = closed[np.argsort(score[closed], kind="stable")][:CANDIDATES]
+
+            moves = [([site], []) for site in opened]
+            moves += [([site], [other]) for site in opened for other in closed]
+            moves += [([], [other]) for other in closed]
+            for close, open_ in moves:
+                sites = current.copy()
+                sites[close] = False
+                sites[open_] = True
+                if kind == "plants":
+                    yield sites, solution.hubs_open
+                else:
+                    yield solution.plants_open, sites
+
+    #first improvement local search from the given solution, until no move helps or the limits are hit
+    def local_search(self, solution, rounds=100, time_limit=None):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            improved = False
+            for plants_open, hubs_open in self._moves(solution):
+                if time_limit is not None and time.perf_counter() - start > time_limit:
+                    return solution
+                if not self.covers(plants_open, hubs_open):
+                    continue
+                candidate = self.evaluate(plants_open, hubs_open)
+                if candidate is not None and candidate.cost < solution.cost * (1 - 1e-9):
+                    solution, improved = candidate, True
+                    break
+            if not improved:
+                break
+        return solution
+
+    def run(self, rounds=100, time_limit=None):
+        start = time.perf_counter()
+        solution = self.greedy()
+        if time_limit is not None:
+            time_limit = max(0, time_limit - (time.perf_counter() - start))
+        return self.local_search(solution, rounds, time_limit)
+
+
+#trips needed to carry the flows, with a little slack for the tolerances of the engine
+def trips_needed(flow, capacity):
+    return np.ceil(flow / capacity - 1e-6).clip(0)
+
+
+#put the solution into the Start attributes of a model from models.BUILDERS or matrix_models.BUILDERS
+def apply_start(built, solution, heuristic):
+    if isinstance(built, matrix_models.MatrixBuilt):
+        built.plant_select.Start = solution.plants_open.astype(np.float64)
+        if built.hub_select is not None:
+            built.hub_select.Start = solution.hubs_open.astype(np.float64)
+        for name, flow in built.flows.items():
+            _matrix_start(flow, solution.flows[name])
+        return
+
+    for p, is_open in zip(heuristic.plants.tolist(), solution.plants_open.tolist()):
+        built.plant_select[p].Start = float(is_open)
+    for h, is_open in zip(heuristic.hubs.tolist(), solution.hubs_open.tolist()):
+        built.hub_select[h].Start = float(is_open)
+    for name, flow in built.flows.items():
+        lp_flow = heuristic.engine.flows[name]
+        capacity = heuristic.engine.trips[name][0] if name in heuristic.engine.trips else None
+        for i, j, x in zip(lp_flow.src.tolist(), lp_flow.dst.tolist(), solution.flows[name].tolist()):
+            _loop_start(flow, i, j, x, capacity)
+
+
+def _matrix_start(flow, values):
+    if flow.mode == arcs.TRIP_COUNT or flow.capacity is None:
+        flow.columns.Start = values
+        if flow.trips is not None:
+            flow.trips.Start = trips_needed(values, flow.capacity)
+        return
+
+    #PER_TRIP: fill the trip columns of every arc one after the other
+    coo = flow.to_arc.tocoo()
+    arc_of = np.empty(flow.to_arc.shape[1], dtype=np.int64)
+    arc_of[coo.col] = coo.row
+    position = np.arange(len(arc_of)) - np.searchsorted(arc_of, arc_of)
+    flow.columns.Start = np.clip(values[arc_of] - position * flow.capacity, 0, flow.capacity)
+
+
+def _loop_start(flow, i, j, x, capacity):
+    if capacity is None:
+        flow.flow[i, j].Start = x
+    elif flow.mode == arcs.PER_TRIP:
+        for m, trip in enumerate(flow.trips[i, j]):
+            trip.Start = min(max(x - m * capacity, 0.0), capacity)
+    else:
+        flow.flow[i, j].Start = x
+        flow.trips[i, j].Start = float(trips_needed(x, capacity))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Greedy and local search estimate, optionally as a MIP start")
+    parser.add_argument("task", choices=list(matrix_models.BUILDERS))
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", default="flow", choices=ENGINES, help="min-cost flow or Gurobi LP")
+    parser.add_argument("--rounds", type=int, default=100, help="most local search improvements")
+    parser.add_argument("--search-time", type=float, default=None, help="time limit of the heuristic, in seconds")
+    parser.add_argument("--cache", help="file to keep the evaluations in between runs (see evaluation_cache.py)")
+    parser.add_argument("--mip", action="store_true", help="then solve the trip-count model from the estimate")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit of the MIP, in seconds")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+    else:
+        network = data.load_network(args.data)
+
+    start = time.perf_counter()
+    cache = EvaluationCache(path=args.cache) if args.cache else None
+    heuristic = Heuristic(network, args.task, engine=args.engine, cache=cache, **params)
+    greedy = heuristic.greedy()
+    greedy_s = time.perf_counter() - start
+    time_limit = None if args.search_time is None else max(0, args.search_time - greedy_s)
+    solution = heuristic.local_search(greedy, args.rounds, time_limit)
+    seconds = time.perf_counter() - start
+    print(f"greedy:       ${greedy.cost:.0f} in {greedy_s:.2f} s")
+    print(f"local search: ${solution.cost:.0f} in {seconds:.2f} s, {heuristic.evaluations} evaluations, "
+          f"{solution.plants_open.sum()} plants and {solution.hubs_open.sum()} hubs open")
+    if cache is not None:
+        cache.save()
+        stats = cache.stats()
+        print(f"cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries in {args.cache}")
+
+    if args.mip:
+        built = matrix_models.BUILDERS[args.task](network, mode=arcs.TRIP_COUNT, **params)
+        built.model.Params.OutputFlag = 0
+        if args.time_limit is not None:
+            built.model.Params.TimeLimit = args.time_limit
+        built.model.update()
+        apply_start(built, solution, heuristic)
+        built.model.optimize()
+        if built.model.SolCount == 0:
+            print("MIP: no solution found")
+        else:
+            status = "optimal" if built.model.Status == GRB.OPTIMAL else f"gap {built.model.MIPGap:.2%}"
+            print(f"MIP:          ${built.model.ObjVal:.0f} in {built.model.Runtime:.2f} s ({status}), "
+                  f"the estimate was {solution.cost / built.model.ObjVal - 1:.2%} above")
@@ -0,0 +1,241 @@
+import argparse, time
+
+import numpy as np
+import scipy.sparse as sp
+import gurobipy as gp
+from gurobipy import GRB
+
+import arcs, data, matrix_models, sweep
+from matrix_models import positions, trips_needed, two_echelon_max_flow
+from pruning import TABLES
+from data import TRIP_COST, PLANT_CAPACITY
+
+"""
+Changes the built model in place when the supplier or arc CSVs change, instead of building it again.
+
+The new network is compared against the last one, and only the differences go into the model: changed supplies
+become new right hand sides (and new upper bounds of the arcs out of the supplier), changed costs new objective
+coefficients, removed arcs and suppliers get an upper bound (or supply) of 0, and new suppliers and arcs are
+added as new rows and columns. The next solve starts from the previous solution, like sweep.Sweep does.
+
+    python incremental.py task2 --data base --updates monday tuesday    #directories with changed CSVs
+
+Plants and hubs can't change this way, the model has to be built again for that.
+"""
+
+#the changes from old to new, such that changed[key] = new value, added[key] = value and removed = list of keys
+def diff(old, new):
+    changed = {key: value for key, value in new.items() if key in old and old[key] != value}
+    added = {key: value for key, value in new.items() if key not in old}
+    removed = [key for key in old if key not in new]
+    return changed, added, removed
+
+
+class Incremental(sweep.Sweep):
+    def __init__(self, network, task="task2", env=None, time_limit=None, **params):
+        super().__init__(network, task, env, time_limit, **params)
+        self.network = network
+        built = self.built
+        self.supplier_position = dict(zip(built.supplier_ids.tolist(), range(len(built.supplier_ids))))
+        self.plant_position = dict(zip(built.plants.tolist(), range(len(built.plants))))
+        self.hub_position = dict(zip(built.hubs.tolist(), range(len(built.hubs))))
+        #the arc sets read from the cost tables, with the position of every arc and whether it was removed
+        self.arc_sets = [name for name in built.flows if name in TABLES]
+        self.arc_position = {name: dict(zip(zip(built.flows[name].src.tolist(), built.flows[name].dst.tolist()),
+                                            range(len(built.flows[name]))))
+                             for name in self.arc_sets}
+        self.removed = {name: np.zeros(len(built.flows[name]), dtype=bool) for name in self.arc_sets}
+
+    #the most that could be sent over the given arcs of an arc set, 0 for removed arcs
+    def _upper(self, name, arc_positions):
+        built = self.built
+        flow = built.flows[name]
+        src, dst = flow.src[arc_positions], flow.dst[arc_positions]
+        if self.task == "task1":
+            upper = np.minimum(built.supply[positions(built.supplier_ids, src)], PLANT_CAPACITY)
+        else:
+            max_flow = two_echelon_max_flow(built.supplier_ids, built.supply, self.params["hub_capacity"])
+            upper = np.asarray(max_flow[name](src, dst), dtype=np.float64)
+        upper[self.removed[name][arc_positions]] = 0.0
+        return upper
+
+    def _set_upper(self, name, arc_positions):
+        if len(arc_positions) == 0:
+            return
+        flow = self.built.flows[name]
+        upper = self._upper(name, arc_positions)
+        model = self.built.model
+        columns, trips = flow.columns.tolist(), flow.trips.tolist()
+        model.setAttr("UB", [columns[k] for k in arc_positions], upper.tolist())
+        model.setAttr("UB", [trips[k] for k in arc_positions], trips_needed(upper, flow.capacity).tolist())
+
+    #a changed hub capacity resets the upper bounds of all arcs (see sweep), so the removed arcs are closed again
+    def set(self, **params):
+        super().set(**params)
+        for name in self.arc_sets:
+            self._set_upper(name, np.flatnonzero(self.removed[name]))
+
+    def _add_suppliers(self, added):
+        built, model = self.built, self.built.model
+        rows = built.constrs["supply_cap"].tolist()
+        for supplier, supply in added.items():
+            self.supplier_position[supplier] = len(rows)
+            #empty for now, the arcs out of the supplier add themselves to it
+            rows.append(model.addLConstr(gp.LinExpr(), GRB.LESS_EQUAL, supply, name=f"supply_cap[{supplier}]"))
+        built.constrs["supply_cap"] = gp.MConstr.fromlist(rows)
+        built.supplier_ids = np.append(built.supplier_ids, np.fromiter(added, dtype=np.int64, count=len(added)))
+        built.supply = np.append(built.supply, np.fromiter(added.values(), dtype=np.float64, count=len(added)))
+
+    #the rows and coefficients an arc (i,j) of the arc set has in the constraints of the model
+    def _column(self, name, i, j):
+        constrs = self.built.constrs
+        coefficients, rows = [], []
+        if name in ("flow", "truck_flow"):
+            coefficients.append(1.0)
+            rows.append(constrs["supply_cap"][self.supplier_position[i]].item())
+        if name in ("flow", "train_flow"):
+            coefficients += [1.0, 1.0]
+            rows += [constrs["production_goal"].item(), constrs["plant_cap"][self.plant_position[j]].item()]
+        if name == "truck_flow":
+            coefficients += [1.0, 1.0]
+            hub = self.hub_position[j]
+            rows += [constrs["hub_cap"][hub].item(), constrs["hub_balance"][hub].item()]
+        if name == "train_flow":
+            coefficients.append(-1.0)
+            rows.append(constrs["hub_balance"][self.hub_position[i]].item())
+        return gp.Column(coefficients, rows)
+
+    def _add_arcs(self, name, added):
+        model, flow = self.built.model, self.built.flows[name]
+        n = len(flow)
+        src = np.fromiter((i for i, _ in added), dtype=np.int64, count=len(added))
+        dst = np.fromiter((j for _, j in added), dtype=np.int64, count=len(added))
+        cost = np.fromiter(added.values(), dtype=np.float64, count=len(added))
+        flow.src, flow.dst, flow.cost = np.append(flow.src, src), np.append(flow.dst, dst), np.append(flow.cost, cost)
+        self.removed[name] = np.append(self.removed[name], np.zeros(len(added), dtype=bool))
+        upper = self._upper(name, np.arange(n, n + len(added)))
+        trips_upper = trips_needed(upper, flow.capacity)
+
+        columns, trips = flow.columns.tolist(), flow.trips.tolist()
+        for k, (i, j) in enumerate(added):
+            self.arc_position[name][i, j] = n + k
+            x = model.addVar(lb=0.0, ub=upper[k], obj=cost[k], column=self._column(name, i, j),
+                             name=f"{name}[{n + k}]")
+            t = model.addVar(lb=0.0, ub=trips_upper[k], obj=TRIP_COST[name],
+                             vtype=GRB.INTEGER, name=f"{name}_trips[{n + k}]")
+            model.addLConstr(x - flow.capacity * t, GRB.LESS_EQUAL, 0.0, name=f"{name}_cap[{n + k}]")
+            columns.append(x)
+            trips.append(t)
+        flow.columns, flow.trips = gp.MVar.fromlist(columns), gp.MVar.fromlist(trips)
+        flow.to_arc = sp.identity(len(flow), format="csr")
+        return 2 * len(added)
+
+    #apply the differences between the current network and the given one, returns what changed and how long it
+    #took to change the model
+    def update(self, network):
+        if list(network.plants) != list(self.network.plants) or list(network.hubs) != list(self.network.hubs):
+            raise ValueError("the plants or hubs changed, the model has to be built again")
+        start = time.perf_counter()
+        built, model = self.built, self.built.model
+        stats = {}
+
+        changed, added, removed = diff(self.network.suppliers, network.suppliers)
+        #a supplier that comes back is one whose supply was set to 0
+        back = {s: q for s, q in added.items() if s in self.supplier_position}
+        new = {s: q for s, q in added.items() if s not in self.supplier_position}
+        supplies = {**changed, **back, **{s: 0.0 for s in removed}}
+        if supplies:
+            rows = [self.supplier_position[s] for s in supplies]
+            built.supply[rows] = list(supplies.values())
+            supply_cap = built.constrs["supply_cap"].tolist()
+            model.setAttr("RHS", [supply_cap[k] for k in rows], list(supplies.values()))
+        if new:
+            self._add_suppliers(new)
+        stats.update(suppliers_changed=len(changed), suppliers_added=len(added), suppliers_removed=len(removed))
+
+        counts = {"arcs_changed": 0, "arcs_added": 0, "arcs_removed": 0}
+        new_vars = 0
+        for name in self.arc_sets:
+            flow = built.flows[name]
+            changed, added, removed = diff(getattr(self.network, TABLES[name]), getattr(network, TABLES[name]))
+            counts["arcs_changed"] += len(changed)
+            counts["arcs_added"] += len(added)
+            counts["arcs_removed"] += len(removed)
+
+            #arcs that come back (they are still in the model, closed), and cost changes
+            back = {arc: cost for arc, cost in added.items() if arc in self.arc_position[name]}
+            recosted = {**changed, **back}
+            if recosted:
+                k = [self.arc_position[name][arc] for arc in recosted]
+                flow.cost[k] = list(recosted.values())
+                columns = flow.columns.tolist()
+                model.setAttr("Obj", [columns[p] for p in k], list(recosted.values()))
+            reopened = np.fromiter((self.arc_position[name][arc] for arc in back), dtype=np.int64, count=len(back))
+            closed = np.fromiter((self.arc_position[name][arc] for arc in removed), dtype=np.int64,
+                                 count=len(removed))
+            self.removed[name][reopened] = False
+            self.removed[name][closed] = True
+
+            #the upper bounds of the arcs out of suppliers whose supply changed
+            refresh = [reopened, closed]
+            if supplies and name in ("flow", "truck_flow"):
+                refresh.append(np.flatnonzero(np.isin(flow.src, np.fromiter(supplies, dtype=np.int64))))
+            self._set_upper(name, np.unique(np.concatenate(refresh)))
+
+            new_arcs = {arc: cost for arc, cost in added.items() if arc not in self.arc_position[name]}
+            if new_arcs:
+                new_vars += self._add_arcs(name, new_arcs)
+        stats.update(counts)
+
+        #the variables added since the last solve have no start value
+        if self.start is not None and new_vars:
+            self.start = self.start + [GRB.UNDEFINED] * new_vars
+        model.update()
+        self.network = network
+        stats["apply_s"] = time.perf_counter() - start
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply changed supplier and arc CSVs to a built model")
+    parser.add_argument("task", choices=list(matrix_models.BUILDERS))
+    parser.add_argument("--data", default=".", help="directory with the CSV files to start from")
+    parser.add_argument("--updates", nargs="+", required=True, help="directories with the changed CSV files")
+    parser.add_argument("--goal", type=float, help="production goal, in liters of ethanol")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit per solve, in seconds")
+    parser.add_argument("--no-rebuild", action="store_true", help="don't build and solve from scratch to compare")
+    args = parser.parse_args()
+
+    params = {} if args.goal is None else {"goal": data.ethanol_to_biomass(args.goal)}
+    start = time.perf_counter()
+    incremental = Incremental(data.load_network(args.data), args.task, time_limit=args.time_limit, **params)
+    incremental.built.model.Params.OutputFlag = 0
+    row = incremental.solve()
+    print(f"initial build and solve {time.perf_counter() - start:.2f} s, cost {row['cost']}")
+
+    print(f"{'update':<16} {'changes':>8} {'load s':>7} {'apply s':>8} {'build s':>8} {'solve s':>8} "
+          f"{'cold s':>7} {'cost':>16} {'same':>5}")
+    for update in args.updates:
+        start = time.perf_counter()
+        network = data.load_network(update)
+        load_s = time.perf_counter() - start
+        stats = incremental.update(network)
+        row = incremental.solve()
+        changes = sum(value for name, value in stats.items() if name != "apply_s")
+
+        build_s = cold_s = same = "-"
+        if not args.no_rebuild:
+            start = time.perf_counter()
+            fresh = matrix_models.BUILDERS[args.task](network, mode=arcs.TRIP_COUNT, **params)
+            fresh.model.update()
+            build_s = f"{time.perf_counter() - start:.3f}"
+            fresh.model.Params.OutputFlag = 0
+            if args.time_limit is not None:
+                fresh.model.Params.TimeLimit = args.time_limit
+            fresh.model.optimize()
+            cold_s = f"{fresh.model.Runtime:.3f}"
+            if fresh.model.SolCount > 0 and row["cost"] is not None:
+                same = "yes" if abs(fresh.model.ObjVal - row["cost"]) <= 1e-6 * abs(row["cost"]) + 1 else "no"
+        cost = "-" if row["cost"] is None else f"{row['cost']:.0f}"
+        print(f"{update:<16} {changes:>8} {load_s:>7.3f} {stats['apply_s']:>8.3f} {build_s:>8} "
+              f"{row['seconds']:>8.3f} {cold_s:>7} {cost:>16} {same:>5}")
@@ -0,0 +1,124 @@
+import contextlib, json, resource, time
+
+from gurobipy import GRB
+
+"""
+Phase timing and solve progress of a model build and solve.
+
+While a Profile is active, the builders mark their phases (variables, objective, constraints, where variables
+includes the trip constraints that come with every arc), and every phase records its time, the variables,
+constraints and nonzeros it added and the peak memory after it. Phases with the same name add up. The callback
+records the incumbent and the bound as the solve goes on.
+
+    with Profile() as profile:
+        with profile.phase("load"):
+            network = data.load_network()
+        built = models.build_task2(network)
+        with profile.phase("optimize", built.model):
+            built.model.optimize(profile.callback)
+    profile.write("profile.json")
+
+python cli.py task2 --profile profile.json does the same for any task. Without an active Profile, phase() does
+nothing, so the builders don't pay for it.
+"""
+
+#the Profile that phase() reports to, set by Profile.__enter__
+_active = None
+
+
+#peak resident memory of this process so far, in MB (ru_maxrss is in KB on Linux)
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+#the model size counted by the phases: variables, constraints and nonzeros. Pending changes are counted too
+def model_size(model):
+    model.update()
+    return {"vars": model.NumVars, "int_vars": model.NumIntVars, "constrs": model.NumConstrs,
+            "nonzeros": model.NumNZs}
+
+
+#a phase of the active Profile, or nothing if there is none
+def phase(name, model=None):
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name, model)
+
+
+class Profile:
+    def __init__(self):
+        self.phases = {}    #phases[name] = time, calls, what was added to the model and peak memory
+        self.progress = []  #(seconds, incumbent, bound) whenever either changed during the solve
+        self.result = {}
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        global _active
+        self._outer, _active = _active, self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._outer
+
+    @contextlib.contextmanager
+    def phase(self, name, model=None):
+        before = model_size(model) if model is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            #the update is part of what the phase costs, Gurobi defers the work until then
+            after = model_size(model) if model is not None else None
+            seconds = time.perf_counter() - start
+            record = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0, "vars": 0, "int_vars": 0,
+                                                   "constrs": 0, "nonzeros": 0})
+            record["seconds"] += seconds
+            record["calls"] += 1
+            if model is not None:
+                for count in ("vars", "int_vars", "constrs", "nonzeros"):
+                    record[count] += after[count] - before[count]
+            record["peak_rss_mb"] = peak_rss_mb()
+
+    #Gurobi callback that records the incumbent and bound, pass it to model.optimize
+    def callback(self, model, where):
+        if where == GRB.Callback.MIP:
+            incumbent = model.cbGet(GRB.Callback.MIP_OBJBST)
+            bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+        elif where == GRB.Callback.MIPSOL:
+            incumbent = model.cbGet(GRB.Callback.MIPSOL_OBJBST)
+            bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+        else:
+            return
+        #no incumbent (or bound) yet is reported as +-GRB.INFINITY
+        incumbent = None if abs(incumbent) >= GRB.INFINITY else incumbent
+        bound = None if abs(bound) >= GRB.INFINITY else bound
+        if self.progress and self.progress[-1][1:] == (incumbent, bound):
+            return
+        self.progress.append((model.cbGet(GRB.Callback.RUNTIME), incumbent, bound))
+
+    #the outcome of the solve, to go with the phases
+    def record_result(self, model):
+        self.result = {"status": model.Status, "runtime": model.Runtime, "objective": None, "bound": None,
+                       "gap": None, "node_count": model.NodeCount, **model_size(model)}
+        if model.SolCount > 0:
+            self.result.update(objective=model.ObjVal, bound=model.ObjBound, gap=model.MIPGap)
+
+    def to_dict(self):
+        return {
+            "total_seconds": time.perf_counter() - self.start,
+            "peak_rss_mb": peak_rss_mb(),
+            "phases": [{"name": name, **record} for name, record in self.phases.items()],
+            "progress": [{"seconds": s, "incumbent": i, "bound": b} for s, i, b in self.progress],
+            "result": self.result,
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def print_phases(self):
+        print(f"{'phase':<12} {'seconds':>8} {'calls':>6} {'vars':>9} {'constrs':>9} {'nonzeros':>10} {'peak MB':>8}")
+        for name, r in self.phases.items():
+            print(f"{name:<12} {r['seconds']:>8.3f} {r['calls']:>6} {r['vars']:>9} {r['constrs']:>9} "
+                  f"{r['nonzeros']:>10} {r['peak_rss_mb']:>8.0f}")
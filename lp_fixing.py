@@ -0,0 +1,237 @@
+import argparse, time
+
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import GRB
+
+import arcs, data, heuristic, instrumentation, matrix_models, models, synthetic
+from matrix_models import positions
+
+"""
+Fixes plants and hubs from the LP relaxation before the MIP is solved, so that the MIP branches on fewer binaries.
+
+The relaxation is solved on the built model itself (the integer variables are made continuous and back), with
+flow <= upper bound * selection added for every arc of a site while it is solved, which is what makes the bound
+worth anything. The heuristic of heuristic.py gives an upper bound. A site that is closed in the relaxation and
+whose reduced cost alone would push the bound past the upper bound can't be open in any better solution, so it
+is closed for good (and the other way around for sites that are open). These fixings keep the optimum. With a
+threshold, sites that the relaxation (nearly) closes or opens and that agree with the heuristic solution are
+fixed as well, which usually fixes many more but can cut off the optimum.
+
+Every arc of a closed site gets an upper bound of 0, and the heuristic solution is the MIP start.
+
+    built = matrix_models.build_task2(network)
+    report = presolve(built, network, "task2")
+    models.solve(built)
+
+    python lp_fixing.py task2 --compare            #also solve the full MIP, for the time saved
+    python lp_fixing.py task3 --size 40x8x12 --threshold 0.05 --quiet
+
+Only the trip-count formulation, like sweep.Sweep. The trip counters are continuous in the relaxation, which
+makes the trips cost trip_cost/capacity per Mg, so the bound is weak where the trips matter most.
+"""
+
+#relaxation values within this of 0 or 1 count as closed or open
+TOL = 1e-6
+
+
+#the integer variables of a built model, as MVars
+def _integers(built):
+    integers = [built.plant_select]
+    if built.hub_select is not None:
+        integers.append(built.hub_select)
+    integers.extend(flow.trips for flow in built.flows.values() if flow.trips is not None)
+    return integers
+
+
+#the ends of every arc set that are plants or hubs, such that SITE_ENDS[name] = list of (site kind, end). IDs
+#of different kinds of nodes can be the same, so a site only matches on the ends where it can be
+SITE_ENDS = {"flow": [("plant", "dst")], "truck_flow": [("hub", "dst")], "third_party_flow": [("hub", "dst")],
+             "train_flow": [("hub", "src"), ("plant", "dst")]}
+
+
+#flow <= upper bound * selection for every arc into a plant or hub and out of a hub. The capacity constraints
+#only say that for the sum over all arcs of a site, which the relaxation satisfies with tiny selections
+def _linking(built):
+    sites = {"plant": (built.plant_select, built.plants), "hub": (built.hub_select, built.hubs)}
+    constrs = []
+    for name, flow in built.flows.items():
+        for kind, end in SITE_ENDS[name]:
+            select, ids = sites[kind]
+            ends = getattr(flow, end)
+            at_site = np.flatnonzero(np.isin(ends, ids))
+            if not len(at_site):
+                continue
+            upper = flow.columns.UB[at_site]
+            rows = sp.csr_matrix((upper, (np.arange(len(at_site)), positions(ids, ends[at_site]))),
+                                 shape=(len(at_site), len(ids)))
+            constrs.append(built.model.addConstr(flow.columns[at_site] - rows @ select <= 0))
+    return constrs
+
+
+#solve the LP relaxation of a built model in place, and return the bound with the values and reduced costs
+#of the plant and hub selections. The model is a MIP again afterwards. With strong=True the relaxation gets
+#the linking constraints as well, which are left out of the MIP again
+def relaxation(built, strong=True):
+    model = built.model
+    integers = _integers(built)
+    model.update()
+    vtypes = [v.VType for v in integers]
+    start = time.perf_counter()
+    linking = []
+    try:
+        for v in integers:
+            v.VType = GRB.CONTINUOUS
+        with instrumentation.phase("relaxation", model):
+            if strong:
+                linking = _linking(built)
+            model.optimize()
+        if model.Status != GRB.OPTIMAL:
+            raise ValueError(f"the relaxation could not be solved (status {model.Status})")
+        result = {"bound": model.ObjVal, "plant_x": built.plant_select.X, "plant_rc": built.plant_select.RC,
+                  "hub_x": np.zeros(0), "hub_rc": np.zeros(0)}
+        if built.hub_select is not None:
+            result.update(hub_x=built.hub_select.X, hub_rc=built.hub_select.RC)
+    finally:
+        for v, vtype in zip(integers, vtypes):
+            v.VType = vtype
+        for constrs in linking:
+            model.remove(constrs)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+#(closed, opened) masks of the sites whose reduced cost proves them closed or open in every solution better
+#than upper_bound. rc >= 0 for sites at 0, rc <= 0 for sites at 1
+def reduced_cost_fixing(bound, x, rc, upper_bound):
+    gap = upper_bound - bound + TOL * max(1.0, abs(upper_bound))
+    closed = (x <= TOL) & (rc > gap)
+    opened = (x >= 1 - TOL) & (-rc > gap)
+    return closed, opened
+
+
+#(closed, opened) masks of the sites the relaxation leaves within threshold of 0 or 1 and that the heuristic
+#solution agrees with
+def relaxation_fixing(x, incumbent, threshold):
+    return (x <= threshold) & ~incumbent, (x >= 1 - threshold) & incumbent
+
+
+#fix the selections, and close every arc that starts or ends at a closed site
+def fix(built, plants_closed, plants_opened, hubs_closed=None, hubs_opened=None):
+    built.model.update()
+    selections = [(built.plant_select, built.plants, plants_closed, plants_opened)]
+    if built.hub_select is not None:
+        selections.append((built.hub_select, built.hubs, hubs_closed, hubs_opened))
+    closed_ids = {}
+    for kind, (select, ids, closed, opened) in zip(("plant", "hub"), selections):
+        select.UB = np.where(closed, 0.0, select.UB)
+        select.LB = np.where(opened, 1.0, select.LB)
+        closed_ids[kind] = ids[closed]
+
+    closed_arcs = 0
+    for name, flow in built.flows.items():
+        mask = np.zeros(len(flow.src), dtype=bool)
+        for kind, end in SITE_ENDS[name]:
+            mask |= np.isin(getattr(flow, end), closed_ids[kind])
+        if not mask.any():
+            continue
+        flow.columns.UB = np.where(mask, 0.0, flow.columns.UB)
+        if flow.trips is not None:
+            flow.trips.UB = np.where(mask, 0.0, flow.trips.UB)
+        closed_arcs += int(mask.sum())
+    return closed_arcs
+
+
+#run the heuristic and the relaxation, fix what they allow on the built model and give it the heuristic solution
+#as MIP start. params are the model parameters the model was built with
+def presolve(built, network, task, threshold=None, rounds=100, strong=True, **params):
+    if any(flow.mode != arcs.TRIP_COUNT for flow in built.flows.values()):
+        raise ValueError("fixing from the relaxation needs the trip-count formulation")
+    start = time.perf_counter()
+    with instrumentation.phase("heuristic"):
+        estimate = heuristic.Heuristic(network, task, **params)
+        solution = estimate.run(rounds)
+    heuristic_s = time.perf_counter() - start
+    lp = relaxation(built, strong)
+
+    report = {"upper_bound": solution.cost, "lp_bound": lp["bound"], "heuristic_s": heuristic_s,
+              "relaxation_s": lp["seconds"]}
+    masks = []
+    for kind, x, rc, incumbent in (("plants", lp["plant_x"], lp["plant_rc"], solution.plants_open),
+                                   ("hubs", lp["hub_x"], lp["hub_rc"], solution.hubs_open)):
+        closed, opened = reduced_cost_fixing(lp["bound"], x, rc, solution.cost)
+        report[f"{kind}_reduced_cost"] = (int(closed.sum()), int(opened.sum()))
+        if threshold is not None:
+            more_closed, more_opened = relaxation_fixing(x, incumbent, threshold)
+            closed, opened = closed | more_closed, opened | more_opened
+        report[f"{kind}_fixed"] = (int(closed.sum()), int(opened.sum()))
+        report[f"{kind}_total"] = len(x)
+        masks.extend((closed, opened))
+
+    with instrumentation.phase("fixing", built.model):
+        report["arcs_closed"] = fix(built, *masks)
+        heuristic.apply_start(built, solution, estimate)
+    report["presolve_s"] = time.perf_counter() - start
+    return report
+
+
+def print_report(report):
+    print(f"heuristic:  ${report['upper_bound']:.0f} in {report['heuristic_s']:.2f} s")
+    print(f"relaxation: ${report['lp_bound']:.0f} in {report['relaxation_s']:.2f} s")
+    for kind in ("plants", "hubs"):
+        if not report[f"{kind}_total"]:
+            continue
+        closed, opened = report[f"{kind}_fixed"]
+        by_rc = sum(report[f"{kind}_reduced_cost"])
+        print(f"{kind + ':':<11} {closed} closed and {opened} opened of {report[f'{kind}_total']} "
+              f"({by_rc} by reduced cost)")
+    print(f"arcs closed: {report['arcs_closed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fix plants and hubs from the LP relaxation, then solve the MIP")
+    parser.add_argument("task", choices=list(matrix_models.BUILDERS))
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, help="also fix sites within this of 0 or 1 in the relaxation "
+                        "that agree with the heuristic (can lose the optimum)")
+    parser.add_argument("--no-linking", action="store_true", help="solve the relaxation without the linking "
+                        "constraints")
+    parser.add_argument("--rounds", type=int, default=100, help="most local search improvements")
+    parser.add_argument("--time-limit", type=float, help="time limit of every MIP, in seconds")
+    parser.add_argument("--compare", action="store_true", help="also solve the full MIP, for the time saved")
+    parser.add_argument("--quiet", action="store_true", help="hide the Gurobi logs")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+    else:
+        network = data.load_network(args.data)
+    solver_params = {"TimeLimit": args.time_limit} if args.time_limit else {}
+    if args.quiet:
+        solver_params["OutputFlag"] = 0
+    builder = matrix_models.BUILDERS[args.task]
+
+    start = time.perf_counter()
+    built = builder(network, mode=arcs.TRIP_COUNT, **params)
+    #the relaxation is solved on the same model, before models.solve sets the parameters
+    if args.quiet:
+        built.model.Params.OutputFlag = 0
+    report = presolve(built, network, args.task, args.threshold, args.rounds, not args.no_linking, **params)
+    objective = models.solve(built, **solver_params)
+    fixed_s = time.perf_counter() - start
+    print_report(report)
+    print(f"reduced MIP: ${objective:.0f}" if objective is not None else "reduced MIP: no solution", end="")
+    print(f", {built.model.Runtime:.2f} s solving and {fixed_s:.2f} s in all")
+
+    if args.compare:
+        start = time.perf_counter()
+        full = builder(network, mode=arcs.TRIP_COUNT, **params)
+        full_objective = models.solve(full, **solver_params)
+        full_s = time.perf_counter() - start
+        print(f"full MIP:    ${full_objective:.0f}" if full_objective is not None else "full MIP: no solution", end="")
+        print(f", {full.model.Runtime:.2f} s solving and {full_s:.2f} s in all")
+        print(f"saved {full_s - fixed_s:.2f} s ({1 - fixed_s / full_s:.0%})")
@@ -0,0 +1,150 @@
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+
+import arcs, array_models, instrumentation
+from array_models import arc_arrays, positions, incidence, trips_needed, two_echelon_max_flow
+from data import HUB_COST, HUB_CAPACITY, PLANT_COST, PRODUCTION_GOAL, THIRD_PARTY_GOAL, THIRD_PARTY_PRICE
+
+"""
+The models of array_models.py as gurobipy models, built in bulk through the matrix interface (addMVar and
+sparse matrices) instead of one addVar/addConstr and one quicksum per arc and node like models.py.
+
+The formulation itself is only in array_models.py. Every block of columns there becomes an MVar here and every
+block of rows an MConstr, such that the built model can still be changed in place (see sweep.py) and its
+solution read arc set by arc set.
+"""
+
+
+#the matrix version of models.Built, with the node IDs in the order of the selection variables
+class MatrixBuilt:
+    def __init__(self, model, flows, plant_select, plants, hub_select=None, hubs=None, third_party=None):
+        self.model = model
+        self.flows = flows
+        self.constrs = {}  #constrs[name] = MConstr, for changing the model after it is built
+        self.supplier_ids = np.zeros(0, dtype=np.int64)
+        self.supply = np.zeros(0)
+        self.plant_select = plant_select
+        self.plants = plants
+        self.hub_select = hub_select
+        self.hubs = hubs if hubs is not None else np.zeros(0, dtype=np.int64)
+        self.third_party = third_party
+
+
+#the matrix version of arcs.Arcs
+class MatrixArcs:
+    def __init__(self, mode, src, dst, cost, columns, to_arc, trips=None, constant=0, capacity=None):
+        self.mode = mode
+        self.capacity = capacity
+        self.src, self.dst, self.cost = src, dst, cost
+        self.columns = columns  #MVar with the flow (TRIP_COUNT) or the trips (PER_TRIP)
+        self.to_arc = to_arc    #to_arc @ columns = flow on every arc
+        self.trips = trips      #MVar of trip counters (TRIP_COUNT)
+        self.constant = constant  #part of the cost that does not depend on any variable
+
+    def __len__(self):
+        return len(self.src)
+
+    #matrix such that matrix @ columns = the flow leaving (or entering) each of the given nodes
+    def out_of(self, nodes):
+        return incidence(positions(nodes, self.src), len(nodes)) @ self.to_arc
+
+    def into(self, nodes):
+        return incidence(positions(nodes, self.dst), len(nodes)) @ self.to_arc
+
+    #change the upper bounds of a built model, the number of columns of PER_TRIP depends on them so it can't
+    def set_max_flow(self, max_flow):
+        if self.mode == arcs.PER_TRIP and self.capacity is not None:
+            raise ValueError("the bounds of the per-trip formulation can't be changed after it is built")
+        upper = np.asarray(max_flow(self.src, self.dst), dtype=np.float64)
+        self.columns.UB = upper
+        if self.trips is not None:
+            self.trips.UB = trips_needed(upper, self.capacity)
+
+
+#add the blocks of an array_models.ArrayModel to a gurobipy model, returns the MVar of every block of columns
+#and the MConstr of every block of rows
+def add_array_model(model, arrays):
+    variables, constrs = {}, {}
+    with instrumentation.phase("variables", model):
+        for name, (cost, lb, ub, integer) in arrays.columns.items():
+            vtype = GRB.CONTINUOUS
+            if integer:
+                vtype = GRB.BINARY if not lb.any() and (ub == 1).all() else GRB.INTEGER
+            variables[name] = model.addMVar(len(cost), lb=lb, ub=ub, obj=cost, vtype=vtype, name=name)
+
+    with instrumentation.phase("constraints", model):
+        for name, (terms, lower, upper) in arrays.row_terms.items():
+            products = [matrix @ variables[block] for block, matrix in terms.items()]
+            expr = products[0]
+            for product in products[1:]:
+                expr = expr + product
+            if np.array_equal(lower, upper):
+                constrs[name] = model.addConstr(expr == upper, name=name)
+            elif np.isneginf(lower).all():
+                constrs[name] = model.addConstr(expr <= upper, name=name)
+            elif np.isposinf(upper).all():
+                constrs[name] = model.addConstr(expr >= lower, name=name)
+            else:
+                raise ValueError(f"the rows of {name} need a single sense, lower or upper bounds but not both")
+    return variables, constrs
+
+
+#the MatrixArcs of the arc set of an ArrayModel, over the variables added by add_array_model
+def _matrix_arcs(flow, variables):
+    trips = variables[flow.trips] if flow.trips is not None else None
+    return MatrixArcs(flow.mode, flow.src, flow.dst, flow.cost, variables[flow.name], flow.to_arc, trips,
+                      flow.constant, flow.capacity)
+
+
+#an array_models.ArrayModel of a task as a MatrixBuilt
+def from_arrays(arrays, env=None):
+    model = gp.Model(arrays.name, env=env)
+    variables, constrs = add_array_model(model, arrays)
+    #the costs per unit are set with the columns, only the constants are left
+    with instrumentation.phase("objective", model):
+        model.ObjCon = arrays.constant
+        model.ModelSense = GRB.MINIMIZE
+
+    flows = {name: _matrix_arcs(flow, variables) for name, flow in arrays.flows.items()}
+    hub_select = variables.get("hub_selection")
+    built = MatrixBuilt(model, flows, variables["plant_selection"], arrays.plants, hub_select,
+                        arrays.hubs if hub_select is not None else None, arrays.third_party)
+    built.constrs, built.supplier_ids, built.supply = constrs, arrays.supplier_ids, arrays.supply
+    return built
+
+
+#the columns of one arc set (see array_models.add_arcs) added to a gurobipy model, for models that are not
+#one of the tasks
+def add_arcs(model, cost, capacity, trip_cost, max_flow, mode=arcs.TRIP_COUNT, name="flow"):
+    arrays = array_models.ArrayModel(name)
+    flow = array_models.add_arcs(arrays, cost, capacity, trip_cost, max_flow, mode, name)
+    variables, _ = add_array_model(model, arrays)
+    return _matrix_arcs(flow, variables)
+
+
+#task1: suppliers ship directly to plants by truck
+def build_task1(network, mode=arcs.TRIP_COUNT, goal=PRODUCTION_GOAL, plant_cost=PLANT_COST, env=None):
+    with instrumentation.phase("arrays"):
+        arrays = array_models.build_task1(network, mode, goal, plant_cost)
+    return from_arrays(arrays, env)
+
+
+#task2: suppliers -> hubs by truck -> plants by train
+def build_task2(network, mode=arcs.TRIP_COUNT, goal=PRODUCTION_GOAL, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                hub_capacity=HUB_CAPACITY, env=None):
+    with instrumentation.phase("arrays"):
+        arrays = array_models.build_task2(network, mode, goal, plant_cost, hub_cost, hub_capacity)
+    return from_arrays(arrays, env)
+
+
+#task3: like task2, but biomass can also be bought from a third party without a supply limit
+def build_task3(network, mode=arcs.TRIP_COUNT, goal=THIRD_PARTY_GOAL, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                hub_capacity=HUB_CAPACITY, third_party_price=THIRD_PARTY_PRICE, env=None):
+    with instrumentation.phase("arrays"):
+        arrays = array_models.build_task3(network, mode, goal, plant_cost, hub_cost, hub_capacity,
+                                          third_party_price)
+    return from_arrays(arrays, env)
+
+
+BUILDERS = {"task1": build_task1, "task2": build_task2, "task3": build_task3}
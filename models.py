@@ -0,0 +1,135 @@
+import gurobipy as gp
+from gurobipy import GRB
+
+import arcs, instrumentation
+from data import (TRUCK_CAPACITY, TRAIN_CAPACITY, TRUCK_TRIP_COST, TRAIN_TRIP_COST, HUB_COST, HUB_CAPACITY,
+                  PLANT_COST, PLANT_CAPACITY, PRODUCTION_GOAL, THIRD_PARTY_GOAL, THIRD_PARTY_PRICE)
+
+"""
+Builders for the three task models on top of the arc formulations in arcs.py.
+
+Compared to the task scripts, the capacity of a plant or hub is only available when it is selected
+(inflow <= capacity * select), otherwise nothing forces the investment cost into the objective.
+"""
+
+
+#the built model together with the handles needed to read or change it later
+class Built:
+    def __init__(self, model, flows, plant_select, hub_select=None, third_party=None):
+        self.model = model
+        self.flows = flows                #flows[name] = Arcs
+        self.plant_select = plant_select
+        self.hub_select = hub_select if hub_select is not None else {}
+        self.third_party = third_party    #ID of the artificial third party supplier (task3)
+
+
+#task1: suppliers ship directly to plants by truck
+def build_task1(network, mode=arcs.TRIP_COUNT, goal=PRODUCTION_GOAL, plant_cost=PLANT_COST, env=None):
+    model = gp.Model("task1", env=env)
+    suppliers, plants = network.suppliers, network.plants
+
+    flow = arcs.add_arcs(model, network.road_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST,
+                         lambda s, p: min(suppliers[s], PLANT_CAPACITY), mode, "flow")
+    with instrumentation.phase("variables", model):
+        select = model.addVars(plants, vtype=GRB.BINARY, name="select")
+
+    with instrumentation.phase("objective", model):
+        investment = gp.quicksum(select[p] * plant_cost for p in plants)
+        model.setObjective(flow.transport + flow.loading + investment, GRB.MINIMIZE)
+
+    with instrumentation.phase("constraints", model):
+        #Constraint: Total amount delivered meets production goal
+        model.addConstr(flow.total() >= goal, name="production_goal")
+
+        #Constraints: The outgoing flow from each supplier must be less than or equal to the available supply
+        for i in suppliers:
+            model.addConstr(flow.out_of(i) <= suppliers[i], name=f'supply_cap[{i}]')
+
+        #Constraint: The incoming flow to each plant must be less than its capacity, if it is opened at all
+        for j in plants:
+            model.addConstr(flow.into(j) <= PLANT_CAPACITY * select[j], name=f'plant_cap[{j}]')
+
+    return Built(model, {"flow": flow}, select)
+
+
+#the shared part of task2 and task3: suppliers -> hubs by truck, hubs -> plants by train
+def _two_echelon(model, network, mode, goal, plant_cost, hub_cost, hub_capacity,
+                 third_party=None, third_party_price=THIRD_PARTY_PRICE):
+    suppliers, hubs, plants = network.suppliers, network.hubs, network.plants
+
+    truck_flow = arcs.add_arcs(model, network.truck_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST,
+                               lambda s, h: min(suppliers[s], hub_capacity), mode, "truck_flow")
+    train_flow = arcs.add_arcs(model, network.train_cost, TRAIN_CAPACITY, TRAIN_TRIP_COST,
+                               lambda h, p: min(hub_capacity, PLANT_CAPACITY), mode, "train_flow")
+    flows = {"truck_flow": truck_flow, "train_flow": train_flow}
+
+    #the third party delivers to the hubs itself, so there is no truck capacity or trip cost on these arcs
+    if third_party is not None:
+        flows["third_party_flow"] = arcs.add_arcs(model, {(third_party, h): third_party_price for h in hubs},
+                                                  None, 0, lambda s, h: hub_capacity, mode, "third_party_flow")
+
+    with instrumentation.phase("variables", model):
+        plant_select = model.addVars(plants, vtype=GRB.BINARY, name="plant_selection")
+        hub_select = model.addVars(hubs, vtype=GRB.BINARY, name="hub_selection")
+
+    with instrumentation.phase("objective", model):
+        plant_investment = gp.quicksum(plant_select[p] * plant_cost for p in plants)
+        hub_investment = gp.quicksum(hub_select[h] * hub_cost for h in hubs)
+        model.setObjective(gp.quicksum(f.transport + f.loading for f in flows.values())
+                           + plant_investment + hub_investment,
+                           GRB.MINIMIZE)
+
+    with instrumentation.phase("constraints", model):
+        #Constraint: Total amount delivered to plants meets the production goal
+        model.addConstr(train_flow.total() >= goal, name="production_goal")
+
+        #Constraints: The outgoing flow to the hubs from each supplier must be at most the available supply
+        for i in suppliers:
+            model.addConstr(truck_flow.out_of(i) <= suppliers[i], name=f'supply_cap[{i}]')
+
+        #Constraint: The amount delivered to each plant from the hubs must be less than the plant's capacity
+        for j in plants:
+            model.addConstr(train_flow.into(j) <= PLANT_CAPACITY * plant_select[j], name=f'plant_cap[{j}]')
+
+        #Constraint: The amount delivered to each hub must be less than the hub's capacity,
+        #and the hub must send out exactly what it receives
+        for j in hubs:
+            hub_in = gp.quicksum(flows[name].into(j) for name in flows if name != "train_flow")
+            model.addConstr(hub_in <= hub_capacity * hub_select[j], name=f'hub_cap[{j}]')
+            model.addConstr(hub_in == train_flow.out_of(j), name=f'hub_balance[{j}]')
+
+    #the balance of every hub implies that the total leaving the suppliers is the total received by the plants,
+    #so (unlike the task scripts) that constraint is not added separately
+    return Built(model, flows, plant_select, hub_select, third_party)
+
+
+#task2: suppliers -> hubs -> plants
+def build_task2(network, mode=arcs.TRIP_COUNT, goal=PRODUCTION_GOAL, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                hub_capacity=HUB_CAPACITY, env=None):
+    model = gp.Model("task2", env=env)
+    return _two_echelon(model, network, mode, goal, plant_cost, hub_cost, hub_capacity)
+
+
+#task3: like task2, but biomass can also be bought from a third party without a supply limit
+def build_task3(network, mode=arcs.TRIP_COUNT, goal=THIRD_PARTY_GOAL, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+                hub_capacity=HUB_CAPACITY, third_party_price=THIRD_PARTY_PRICE, env=None):
+    model = gp.Model("task3", env=env)
+
+    #an additional supplier with a unique ID, so that it can be treated as any other supplier
+    third_party = max(network.suppliers)+1
+    return _two_echelon(model, network, mode, goal, plant_cost, hub_cost, hub_capacity, third_party, third_party_price)
+
+
+BUILDERS = {"task1": build_task1, "task2": build_task2, "task3": build_task3}
+
+
+#set the given solver parameters (Gurobi names, for example TimeLimit=600) and optimize the built model,
+#returns the objective of the best solution found, or None without any. Can be called again after changes.
+#callback is passed on to model.optimize, for example instrumentation.Profile.callback
+def solve(built, callback=None, **params):
+    model = built.model
+    for name, value in params.items():
+        model.setParam(name, value)
+    with instrumentation.phase("optimize", model):
+        model.optimize(callback)
+    return model.ObjVal if model.SolCount > 0 else None
@@ -0,0 +1,248 @@
+import argparse, csv, time
+
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+
+import arcs, data, instrumentation, models, synthetic
+from data import (TRUCK_CAPACITY, TRAIN_CAPACITY, TRUCK_TRIP_COST, TRAIN_TRIP_COST, HUB_COST, HUB_CAPACITY,
+                  PLANT_COST, PLANT_CAPACITY, PRODUCTION_GOAL)
+from matrix_models import add_arcs, arc_arrays, positions
+
+"""
+The two-echelon model of task2 over several periods, and a rolling horizon solver for long horizons.
+
+Every period has its own supply, production goal, truck and train flows and trips. Hubs can keep biomass from
+one period to the next (up to one period of their capacity, at HOLDING_COST per Mg and period), and plants and
+hubs are opened once: a site that opens in period t stays open for the rest of the horizon and its cost is paid
+once. Capacities are per year like in data.py, and a period is period_share of a year.
+
+The rolling horizon solver builds a model of only window periods at a time. It solves it, keeps the first step
+periods (their flows, the sites opened in them and the inventory at their end), and moves on with these as the
+starting point, so the model never has more than window periods in it, however long the horizon.
+
+    supply = seasonal_supply(network, 36)
+    goal = np.full(36, PRODUCTION_GOAL * PERIOD_SHARE)
+    plan = rolling_horizon(network, supply, goal, window=6, step=2)
+
+    python multi_period.py --periods 36 --window 6 --step 2
+    python multi_period.py --size 10x3x4 --periods 6 --window 3 --compare   #also solve all periods at once
+    python multi_period.py --supply supply.csv                              #supplier,period,supply rows
+"""
+
+#a period is a month
+PERIOD_SHARE = 1 / 12
+#cost of keeping a Mg at a hub from one period to the next
+HOLDING_COST = 1.0
+
+
+#the model of a number of consecutive periods, with the variables in the order of the period
+class PeriodBuilt:
+    def __init__(self, model, flows, plant_opened, hub_opened, inventory, plants, hubs):
+        self.model = model
+        self.flows = flows                #flows[t] = {"truck_flow": MatrixArcs, "train_flow": MatrixArcs}
+        self.plant_opened = plant_opened  #plant_opened[p, t] = plant p opens in period t
+        self.hub_opened = hub_opened
+        self.inventory = inventory        #inventory[h, t] = kept at hub h at the end of period t
+        self.plants = plants
+        self.hubs = hubs
+
+    def __len__(self):
+        return len(self.flows)
+
+    #the cost of period t in the solution, sites opened in it included
+    def period_cost(self, t):
+        cost = 0.0
+        for flow in self.flows[t].values():
+            cost += flow.columns.Obj @ flow.columns.X + flow.trips.Obj @ flow.trips.X
+        for v in (self.inventory, self.plant_opened, self.hub_opened):
+            cost += v[:, t].Obj @ v[:, t].X
+        return cost
+
+
+#supply of every supplier in every period, the yearly supply of network.suppliers spread over the periods with
+#a seasonal peak at peak (a share of the year)
+def seasonal_supply(network, periods, period_share=PERIOD_SHARE, amplitude=0.5, peak=0.0):
+    yearly = np.fromiter(network.suppliers.values(), dtype=np.float64)
+    season = 1 + amplitude * np.cos(2 * np.pi * (np.arange(periods) * period_share - peak))
+    return np.outer(yearly * period_share, season)
+
+
+#supply of every supplier in every period from a CSV with supplier,period,supply rows (periods from 0)
+def load_supply(path, network):
+    with open(path) as f:
+        read = csv.reader(f)
+        next(read)
+        rows = np.array([[float(value) for value in row] for row in read])
+    supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    supply = np.zeros((len(supplier_ids), int(rows[:, 1].max()) + 1))
+    supply[positions(supplier_ids, rows[:, 0].astype(np.int64)), rows[:, 1].astype(np.int64)] = rows[:, 2]
+    return supply
+
+
+#build the model of the periods in the columns of supply (suppliers in the order of network.suppliers). Starts
+#with the given inventory at every hub and the given sites (masks in the order of network.plants/hubs) open
+def build(network, supply, goal, period_share=PERIOD_SHARE, plant_cost=PLANT_COST, hub_cost=HUB_COST,
+          hub_capacity=HUB_CAPACITY, holding_cost=HOLDING_COST, inventory=None, plants_open=None, hubs_open=None,
+          env=None):
+    model = gp.Model("multi_period", env=env)
+    supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    plants = np.asarray(network.plants, dtype=np.int64)
+    hubs = np.asarray(network.hubs, dtype=np.int64)
+    n_periods = supply.shape[1]
+    inventory = np.zeros(len(hubs)) if inventory is None else inventory
+    plants_open = np.zeros(len(plants)) if plants_open is None else plants_open.astype(np.float64)
+    hubs_open = np.zeros(len(hubs)) if hubs_open is None else hubs_open.astype(np.float64)
+    plant_capacity, hub_capacity = PLANT_CAPACITY * period_share, hub_capacity * period_share
+
+    truck_arcs, train_arcs = arc_arrays(network.truck_cost), arc_arrays(network.train_cost)
+    flows = []
+    for t in range(n_periods):
+        at = supply[:, t]
+        truck = add_arcs(model, truck_arcs, TRUCK_CAPACITY, TRUCK_TRIP_COST,
+                         lambda s, h: np.minimum(at[positions(supplier_ids, s)], hub_capacity),
+                         arcs.TRIP_COUNT, f"truck_flow[{t}]")
+        #a hub can send on what it kept from the period before as well
+        train = add_arcs(model, train_arcs, TRAIN_CAPACITY, TRAIN_TRIP_COST,
+                         lambda h, p: np.full(len(h), min(2 * hub_capacity, plant_capacity)),
+                         arcs.TRIP_COUNT, f"train_flow[{t}]")
+        flows.append({"truck_flow": truck, "train_flow": train})
+
+    with instrumentation.phase("variables", model):
+        plant_opened = model.addMVar((len(plants), n_periods), vtype=GRB.BINARY, obj=plant_cost, name="plant_opened")
+        hub_opened = model.addMVar((len(hubs), n_periods), vtype=GRB.BINARY, obj=hub_cost, name="hub_opened")
+        kept = model.addMVar((len(hubs), n_periods), lb=0.0, obj=holding_cost, name="inventory")
+
+    with instrumentation.phase("constraints", model):
+        #the arcs are the same in every period, and so are the incidence matrices
+        supply_out = flows[0]["truck_flow"].out_of(supplier_ids)
+        hub_in = flows[0]["truck_flow"].into(hubs)
+        hub_out = flows[0]["train_flow"].out_of(hubs)
+        plant_in = flows[0]["train_flow"].into(plants)
+
+        model.addConstr(plant_opened.sum(axis=1) <= 1 - plants_open, name="plant_once")
+        model.addConstr(hub_opened.sum(axis=1) <= 1 - hubs_open, name="hub_once")
+        for t, period in enumerate(flows):
+            truck, train = period["truck_flow"].columns, period["train_flow"].columns
+            plant_is_open = plant_opened[:, :t+1].sum(axis=1)
+            hub_is_open = hub_opened[:, :t+1].sum(axis=1)
+            model.addConstr(supply_out @ truck <= supply[:, t], name=f"supply_cap[{t}]")
+            model.addConstr(train.sum() >= goal[t], name=f"production_goal[{t}]")
+            model.addConstr(plant_in @ train - plant_capacity * plant_is_open <= plant_capacity * plants_open,
+                            name=f"plant_cap[{t}]")
+            model.addConstr(hub_in @ truck - hub_capacity * hub_is_open <= hub_capacity * hubs_open,
+                            name=f"hub_cap[{t}]")
+            model.addConstr(kept[:, t] - hub_capacity * hub_is_open <= hub_capacity * hubs_open,
+                            name=f"storage_cap[{t}]")
+            if t == 0:
+                model.addConstr(hub_in @ truck - hub_out @ train - kept[:, t] == -inventory, name=f"hub_balance[{t}]")
+            else:
+                model.addConstr(kept[:, t-1] + hub_in @ truck - hub_out @ train - kept[:, t] == 0,
+                                name=f"hub_balance[{t}]")
+
+    with instrumentation.phase("objective", model):
+        model.ModelSense = GRB.MINIMIZE
+    return PeriodBuilt(model, flows, plant_opened, hub_opened, kept, plants, hubs)
+
+
+#solve the periods window at a time, keeping step periods of every window. Returns the kept periods and windows
+def rolling_horizon(network, supply, goal, window=6, step=1, env=None, time_limit=None, quiet=False, **params):
+    if not 1 <= step <= window:
+        raise ValueError(f"step has to be between 1 and the window ({window}), got {step}")
+    n_periods = supply.shape[1]
+    plants = np.asarray(network.plants, dtype=np.int64)
+    hubs = np.asarray(network.hubs, dtype=np.int64)
+    inventory = np.zeros(len(hubs))
+    plants_open, hubs_open = np.zeros(len(plants), dtype=bool), np.zeros(len(hubs), dtype=bool)
+    solver_params = {"TimeLimit": time_limit} if time_limit is not None else {}
+    if quiet:
+        solver_params["OutputFlag"] = 0
+
+    periods, windows = [], []
+    for first in range(0, n_periods, step):
+        last = min(first + window, n_periods)
+        start = time.perf_counter()
+        built = build(network, supply[:, first:last], goal[first:last], inventory=inventory,
+                      plants_open=plants_open, hubs_open=hubs_open, env=env, **params)
+        objective = models.solve(built, **solver_params)
+        if objective is None:
+            raise ValueError(f"no solution for periods {first} to {last - 1} (status {built.model.Status})")
+        windows.append({"first": first, "last": last - 1, "objective": objective, "vars": built.model.NumVars,
+                        "seconds": time.perf_counter() - start})
+
+        kept = min(step, last - first)
+        plant_opened = np.round(built.plant_opened.X[:, :kept]) > 0
+        hub_opened = np.round(built.hub_opened.X[:, :kept]) > 0
+        for t in range(kept):
+            periods.append({"period": first + t, "cost": built.period_cost(t),
+                            "plants_opened": plants[plant_opened[:, t]].tolist(),
+                            "hubs_opened": hubs[hub_opened[:, t]].tolist(),
+                            "inventory": built.inventory.X[:, t].sum()})
+        plants_open |= plant_opened.any(axis=1)
+        hubs_open |= hub_opened.any(axis=1)
+        inventory = built.inventory.X[:, kept - 1]
+    return periods, windows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan several periods of the task2 network with a rolling horizon")
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--supply", help="CSV with supplier,period,supply rows, instead of a seasonal supply")
+    parser.add_argument("--periods", type=int, default=24, help="periods of the seasonal supply")
+    parser.add_argument("--amplitude", type=float, default=0.5, help="seasonal swing of the supply")
+    parser.add_argument("--window", type=int, default=6, help="periods in every model")
+    parser.add_argument("--step", type=int, default=1, help="periods kept from every model")
+    parser.add_argument("--time-limit", type=float, help="time limit of every window, in seconds")
+    parser.add_argument("--compare", action="store_true", help="also solve all periods in one model")
+    parser.add_argument("--csv", help="write the kept periods to this file")
+    parser.add_argument("--quiet", action="store_true", help="hide the Gurobi logs")
+    args = parser.parse_args()
+
+    if args.size:
+        #the periods are task2 models
+        network, params = synthetic.instance(args.size, "task2", args.seed)
+        yearly_goal = params["goal"]
+    else:
+        network = data.load_network(args.data)
+        yearly_goal = PRODUCTION_GOAL
+    if args.supply:
+        supply = load_supply(args.supply, network)
+    else:
+        supply = seasonal_supply(network, args.periods, amplitude=args.amplitude)
+    goal = np.full(supply.shape[1], yearly_goal * PERIOD_SHARE)
+
+    start = time.perf_counter()
+    periods, windows = rolling_horizon(network, supply, goal, args.window, args.step, time_limit=args.time_limit,
+                                       quiet=args.quiet)
+    seconds = time.perf_counter() - start
+    cost = sum(period["cost"] for period in periods)
+    print(f"{'period':>6} {'cost':>16} {'inventory':>12}  opened")
+    for period in periods:
+        opened = " ".join(map(str, period["plants_opened"] + period["hubs_opened"]))
+        print(f"{period['period']:>6} {period['cost']:>16.0f} {period['inventory']:>12.0f}  {opened}")
+    print(f"rolling horizon: ${cost:.0f} in {seconds:.2f} s, {len(windows)} windows of at most "
+          f"{max(w['vars'] for w in windows)} variables, peak {instrumentation.peak_rss_mb():.0f} MB")
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(periods[0]))
+            writer.writeheader()
+            for period in periods:
+                writer.writerow(dict(period, plants_opened=" ".join(map(str, period["plants_opened"])),
+                                     hubs_opened=" ".join(map(str, period["hubs_opened"]))))
+
+    if args.compare:
+        start = time.perf_counter()
+        built = build(network, supply, goal)
+        params = {"TimeLimit": args.time_limit} if args.time_limit else {}
+        if args.quiet:
+            params["OutputFlag"] = 0
+        optimum = models.solve(built, **params)
+        seconds = time.perf_counter() - start
+        if optimum is None:
+            parser.exit(1, f"all periods: no solution (status {built.model.Status})\n")
+        print(f"all periods:     ${optimum:.0f} in {seconds:.2f} s, {built.model.NumVars} variables, "
+              f"gap {built.model.MIPGap:.2%}")
+        print(f"rolling horizon is {cost / optimum - 1:.2%} above")
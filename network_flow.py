@@ -0,0 +1,270 @@
+import argparse, time
+
+import numpy as np
+
+import data, synthetic
+from array_models import arc_arrays
+from data import (TRUCK_CAPACITY, TRAIN_CAPACITY, TRUCK_TRIP_COST, TRAIN_TRIP_COST, HUB_CAPACITY, PLANT_CAPACITY,
+                  PRODUCTION_GOAL, THIRD_PARTY_GOAL, THIRD_PARTY_PRICE)
+
+"""
+Min-cost flow for a given set of open sites, without a solver.
+
+With the plants and hubs fixed (and the trips relaxed to a cost per Mg, like benders.TransportLP), what is left
+of every task is a min-cost flow from the suppliers to the plants:
+
+    source -> supplier (supply) -> [hub in -> hub out (hub capacity)] -> plant -> sink (plant capacity)
+
+TransportFlow sends the goal through that graph by successive shortest paths (see successive_shortest_paths for
+how it gets by with few shortest path searches). The shortest paths are found by Bellman-Ford over the residual
+graph, one numpy pass over all arcs per round, and only the arcs into open sites are part of the graph. The
+result is the same as the LP (up to ties), with the same interface, so heuristic.py can use either.
+
+    python network_flow.py task2 --plants 541 542 543 --hubs 17201 17202 17203 17204
+    python network_flow.py task3 --size 60x8x40 --check    #compare against the LP on random site sets
+"""
+
+SOURCE, SINK = 0, 1
+#flows and costs below this are treated as zero
+EPS = 1e-9
+
+
+#the arcs of one arc set, in the order of array_models.arc_arrays over the cost table
+class ArcSet:
+    def __init__(self, src, dst, cost):
+        self.src, self.dst, self.cost = src, dst, cost
+
+    def __len__(self):
+        return len(self.src)
+
+
+class TransportFlow:
+    def __init__(self, network, task, goal, hub_capacity=HUB_CAPACITY, third_party=None,
+                 third_party_price=THIRD_PARTY_PRICE):
+        self.goal = goal
+        supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+        supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+        self.hubs = np.asarray(network.hubs if task != "task1" else [], dtype=np.int64)
+        self.plants = np.asarray(network.plants, dtype=np.int64)
+
+        #node numbers: source, sink, suppliers (and the third party), hubs in, hubs out, plants
+        sources = supplier_ids if third_party is None else np.append(supplier_ids, third_party)
+        n_sources, n_hubs = len(sources), len(self.hubs)
+        source_node = dict(zip(sources.tolist(), range(2, 2 + n_sources)))
+        hub_in = dict(zip(self.hubs.tolist(), range(2 + n_sources, 2 + n_sources + n_hubs)))
+        hub_out = {h: node + n_hubs for h, node in hub_in.items()}
+        first_plant = 2 + n_sources + 2 * n_hubs
+        plant_node = dict(zip(self.plants.tolist(), range(first_plant, first_plant + len(self.plants))))
+        self.n_nodes = first_plant + len(self.plants)
+
+        if task == "task1":
+            tables = [("flow", network.road_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST, source_node, plant_node)]
+        else:
+            tables = [("truck_flow", network.truck_cost, TRUCK_CAPACITY, TRUCK_TRIP_COST, source_node, hub_in),
+                      ("train_flow", network.train_cost, TRAIN_CAPACITY, TRAIN_TRIP_COST, hub_out, plant_node)]
+
+        #every arc of the graph as (tail, head, capacity, cost), the arc sets first so that the flow of arc k
+        #of an arc set is at offset[name] + k
+        tails, heads, capacities, costs = [], [], [], []
+        self.flows, self.trips, self.offset = {}, {}, {}
+        unlimited = float(goal)  #no arc ever carries more than the goal
+
+        def add(name, src, dst, cost, tail_of, head_of):
+            self.flows[name] = ArcSet(src, dst, cost)
+            self.offset[name] = sum(len(t) for t in tails)
+            tails.append(np.fromiter((tail_of[i] for i in src.tolist()), dtype=np.int64, count=len(src)))
+            heads.append(np.fromiter((head_of[j] for j in dst.tolist()), dtype=np.int64, count=len(dst)))
+            capacities.append(np.full(len(src), unlimited))
+            costs.append(cost)
+
+        for name, cost_table, capacity, trip_cost, tail_of, head_of in tables:
+            src, dst, unit_cost = arc_arrays(cost_table)
+            add(name, src, dst, unit_cost, tail_of, head_of)
+            #the LP charges the relaxed trips, so the graph has to as well
+            costs[-1] = unit_cost + trip_cost / capacity
+            self.trips[name] = (capacity, trip_cost)
+        if third_party is not None:
+            add("third_party_flow", np.full(n_hubs, third_party, dtype=np.int64), self.hubs.copy(),
+                np.full(n_hubs, float(third_party_price)), source_node, hub_in)
+
+        supply_cap = supply if third_party is None else np.append(supply, unlimited)
+        tails += [np.full(n_sources, SOURCE), np.fromiter(hub_in.values(), dtype=np.int64, count=n_hubs),
+                  np.fromiter(plant_node.values(), dtype=np.int64, count=len(self.plants))]
+        heads += [np.arange(2, 2 + n_sources), np.fromiter(hub_out.values(), dtype=np.int64, count=n_hubs),
+                  np.full(len(self.plants), SINK)]
+        capacities += [supply_cap, np.full(n_hubs, float(hub_capacity)), np.full(len(self.plants), PLANT_CAPACITY)]
+        costs += [np.zeros(n_sources), np.zeros(n_hubs), np.zeros(len(self.plants))]
+
+        self.tail, self.head = np.concatenate(tails), np.concatenate(heads)
+        self.capacity, self.cost = np.concatenate(capacities), np.concatenate(costs)
+        #the hub and plant every arc needs to be open (-1 for none)
+        hub_position = {node: k for nodes in (hub_in, hub_out) for k, node in enumerate(nodes.values())}
+        plant_position = {node: k for k, node in enumerate(plant_node.values())}
+        self.hub_of = _site_of(self.tail, self.head, hub_position)
+        self.plant_of = _site_of(self.tail, self.head, plant_position)
+        self.arc_flow = np.zeros(len(self.tail))
+        self.objective = None
+
+    #send the goal through the arcs to the open sites (0/1 arrays in the order of plants and hubs), returns the
+    #transport cost or None if the open sites can't meet the goal
+    def solve(self, plants_open, hubs_open=None):
+        plants_open = np.asarray(plants_open, dtype=bool)
+        hubs_open = np.asarray(hubs_open if hubs_open is not None else [], dtype=bool)
+        usable = (self.plant_of < 0) | plants_open[self.plant_of]
+        if len(self.hubs):
+            usable &= (self.hub_of < 0) | hubs_open[self.hub_of]
+        arcs = np.flatnonzero(usable)
+
+        flow = successive_shortest_paths(self.n_nodes, self.tail[arcs], self.head[arcs], self.capacity[arcs],
+                                         self.cost[arcs], self.goal)
+        self.arc_flow = np.zeros(len(self.tail))
+        if flow is None:
+            self.objective = None
+            return None
+        self.arc_flow[arcs] = flow
+        self.objective = float(self.arc_flow @ self.cost)
+        return self.objective
+
+    #the flow on every arc of the last solve, such that flows[name][k] = flow over arc k of self.flows[name]
+    def flow_values(self):
+        return {name: self.arc_flow[self.offset[name]:self.offset[name] + len(arcs)].copy()
+                for name, arcs in self.flows.items()}
+
+
+#the position of the site at either end of every arc (-1 for arcs between two other nodes)
+def _site_of(tail, head, position):
+    lookup = np.full(max(tail.max(), head.max()) + 1, -1)
+    for node, k in position.items():
+        lookup[node] = k
+    return np.maximum(lookup[tail], lookup[head])
+
+
+#cheapest distance from every node to the sink over the arcs with residual capacity, with the next arc on the
+#way (-1 where there is none). Bellman-Ford, all arcs at once per round. Arcs back into the source are left out,
+#a path that goes back there is never the one to augment
+def distances_to_sink(n_nodes, tail, head, cost, residual):
+    usable = np.flatnonzero((residual > EPS) & (head != SOURCE))
+    tail, head, cost = tail[usable], head[usable], cost[usable]
+    distance = np.full(n_nodes, np.inf)
+    distance[SINK] = 0.0
+    succ = np.full(n_nodes, -1)
+    for _ in range(n_nodes):
+        reached = np.flatnonzero(np.isfinite(distance[head]))
+        candidate = distance[head[reached]] + cost[reached]
+        better = candidate < distance[tail[reached]] - EPS * (1 + np.abs(candidate))
+        if not better.any():
+            break
+        better = reached[better]
+        candidate = distance[head[better]] + cost[better]
+        #the best candidate for every node that got better
+        order = np.lexsort((candidate, tail[better]))
+        first = np.r_[True, tail[better][order][1:] != tail[better][order][:-1]]
+        best = order[first]
+        distance[tail[better][best]] = candidate[best]
+        succ[tail[better][best]] = usable[better][best]
+    return distance, succ
+
+
+#min-cost flow of the given amount from SOURCE to SINK, returns the flow on every arc or None if the arcs
+#can't carry that much.
+#Successive shortest paths, but instead of one path per shortest path search, the nodes right after the source
+#are augmented in the order of their distance to the sink, each along its own shortest path. That stays a
+#shortest path augmentation until an arc inside the graph runs full (the distances are potentials, and the
+#reverse arcs of tight arcs are tight), and only then are the distances computed again
+def successive_shortest_paths(n_nodes, tail, head, capacity, cost, amount):
+    m = len(tail)
+    #residual graph: arc k forward, arc m+k the way back over the flow on k
+    res_tail, res_head = np.concatenate([tail, head]), np.concatenate([head, tail])
+    res_cost = np.concatenate([cost, -cost])
+    residual = np.concatenate([capacity, np.zeros(m)])
+    entries = np.flatnonzero(tail == SOURCE)
+
+    sent = 0.0
+    while sent < amount * (1 - EPS):
+        distance, succ = distances_to_sink(n_nodes, res_tail, res_head, res_cost, residual)
+        open_entries = entries[(residual[entries] > EPS) & np.isfinite(distance[head[entries]])]
+        if len(open_entries) == 0:
+            return None
+        for entry in open_entries[np.argsort(distance[head[open_entries]], kind="stable")].tolist():
+            path = [entry]
+            node = head[entry]
+            while node != SINK:
+                path.append(succ[node])
+                node = res_head[succ[node]]
+            path = np.asarray(path)
+            inner = residual[path[1:]].min()
+            delta = min(residual[entry], inner, amount - sent)
+            if delta <= EPS:
+                break
+            residual[path] -= delta
+            residual[(path + m) % (2 * m)] += delta
+            sent += delta
+            if sent >= amount * (1 - EPS) or inner <= delta:
+                break
+    return residual[m:]
+
+
+#random open site sets, each with enough capacity for the goal
+def random_sites(rng, engine, count):
+    for _ in range(count):
+        plants = rng.random(len(engine.plants)) < max(0.2, engine.goal / PLANT_CAPACITY / len(engine.plants) * 2)
+        hubs = rng.random(len(engine.hubs)) < 0.5
+        yield plants, hubs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transport cost of a set of open sites, without a solver")
+    parser.add_argument("task", choices=["task1", "task2", "task3"])
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--goal", type=float, help="production goal in liters, by default the goal of the task")
+    parser.add_argument("--hub-capacity", type=float, default=HUB_CAPACITY)
+    parser.add_argument("--third-party-price", type=float, default=THIRD_PARTY_PRICE)
+    parser.add_argument("--plants", type=int, nargs="+", help="IDs of the open plants, by default all")
+    parser.add_argument("--hubs", type=int, nargs="+", help="IDs of the open hubs, by default all")
+    parser.add_argument("--check", type=int, nargs="?", const=20, default=None, metavar="N",
+                        help="compare against the LP (needs Gurobi) on N random site sets")
+    args = parser.parse_args()
+
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+        goal = params["goal"]
+    else:
+        network = data.load_network(args.data)
+        goal = THIRD_PARTY_GOAL if args.task == "task3" else PRODUCTION_GOAL
+    if args.goal is not None:
+        goal = data.ethanol_to_biomass(args.goal)
+    third_party = max(network.suppliers)+1 if args.task == "task3" else None
+
+    engine = TransportFlow(network, args.task, goal, args.hub_capacity, third_party, args.third_party_price)
+    plants_open = np.isin(engine.plants, args.plants) if args.plants else np.ones(len(engine.plants), dtype=bool)
+    hubs_open = np.isin(engine.hubs, args.hubs) if args.hubs else np.ones(len(engine.hubs), dtype=bool)
+    start = time.perf_counter()
+    transport = engine.solve(plants_open, hubs_open)
+    seconds = time.perf_counter() - start
+    if transport is None:
+        print(f"the open sites can't meet the goal ({seconds * 1000:.1f} ms)")
+    else:
+        print(f"Transport Cost: ${round(transport)} ({seconds * 1000:.1f} ms, trips relaxed)")
+
+    if args.check:
+        from benders import TransportLP
+        lp = TransportLP(network, args.task, goal, args.hub_capacity, third_party, args.third_party_price)
+        rng = np.random.default_rng(args.seed)
+        times = {"flow": 0.0, "lp": 0.0}
+        worst = 0.0
+        for plants_open, hubs_open in random_sites(rng, engine, args.check):
+            start = time.perf_counter()
+            flow_cost = engine.solve(plants_open, hubs_open)
+            times["flow"] += time.perf_counter() - start
+            start = time.perf_counter()
+            lp_cost = lp.solve(plants_open, hubs_open)
+            times["lp"] += time.perf_counter() - start
+            if (flow_cost is None) != (lp_cost is None):
+                print(f"feasibility differs: flow {flow_cost}, LP {lp_cost}")
+            elif flow_cost is not None:
+                worst = max(worst, abs(flow_cost - lp_cost) / max(abs(lp_cost), 1))
+        print(f"{args.check} site sets: flow {times['flow'] / args.check * 1000:.1f} ms, "
+              f"LP {times['lp'] / args.check * 1000:.1f} ms per evaluation, largest difference {worst:.2e}")
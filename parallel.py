@@ -0,0 +1,156 @@
+import argparse, os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+import array_models, backends, data, sweep
+
+"""
+Runs scenarios (see sweep.py) on a pool of worker processes.
+
+The network is loaded once by the parent and put into shared memory, the workers map it instead of reading
+the CSVs again. Every worker has its own Gurobi Env limited to a number of threads, so that workers * threads
+does not oversubscribe the machine, and keeps one Sweep that it reuses for all scenarios it gets. With another
+backend (see backends.py) the workers don't need Gurobi, and build the array model of every scenario instead.
+
+    python parallel.py task3 --workers 4 --hub-capacity 200000 300000 400000 --third-party-price 1500 2000
+    python parallel.py task2 --workers 8 --backend highs --goal 400000000 500000000
+"""
+
+#the cost tables of data.Network, stored as one (src, dst, cost) record array each
+TABLES = ("road_cost", "truck_cost", "train_cost")
+ARC_RECORD = np.dtype([("src", np.int64), ("dst", np.int64), ("cost", np.float64)])
+
+
+#a data.Network copied into shared memory blocks, spec describes them for attach() in the workers
+class SharedNetwork:
+    def __init__(self, network):
+        arrays = {
+            "supplier_ids": np.fromiter(network.suppliers, dtype=np.int64),
+            "supply": np.fromiter(network.suppliers.values(), dtype=np.float64),
+            "plants": np.asarray(network.plants, dtype=np.int64),
+            "hubs": np.asarray(network.hubs, dtype=np.int64),
+        }
+        for table in TABLES:
+            src, dst, cost = array_models.arc_arrays(getattr(network, table))
+            records = np.empty(len(src), dtype=ARC_RECORD)
+            records["src"], records["dst"], records["cost"] = src, dst, cost
+            arrays[table] = records
+
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            #blocks of size 0 are not allowed
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+            self.blocks.append(block)
+            self.spec[name] = (block.name, array.shape, array.dtype)
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+#the data.Network behind spec, together with the blocks that have to stay open while it is used
+def attach(spec):
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    tables = {}
+    for table in TABLES:
+        records = arrays[table]
+        ends = zip(records["src"].tolist(), records["dst"].tolist())
+        tables[table] = dict(zip(ends, records["cost"].tolist()))
+    network = data.Network(
+        dict(zip(arrays["supplier_ids"].tolist(), arrays["supply"].tolist())),
+        arrays["plants"].tolist(), arrays["hubs"].tolist(),
+        tables["road_cost"], tables["truck_cost"], tables["train_cost"],
+    )
+    return network, blocks
+
+
+#the state of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(spec, task, threads, time_limit, params, backend="gurobi"):
+    network, blocks = attach(spec)
+    _worker["blocks"] = blocks
+    if backend != "gurobi":
+        _worker["sweep"] = sweep.ArraySweep(network, task, backend, time_limit, threads, **params)
+        return
+    import gurobipy as gp
+
+    env = gp.Env(params={"Threads": threads, "OutputFlag": 0})
+    _worker["env"] = env
+    _worker["sweep"] = sweep.Sweep(network, task, env=env, time_limit=time_limit, **params)
+
+
+def _solve(scenario):
+    start = time.perf_counter()
+    worker = _worker["sweep"]
+    worker.set(**scenario)
+    row = worker.solve()
+    row["worker"] = os.getpid()
+    row["wall_seconds"] = time.perf_counter() - start
+    return row
+
+
+#threads per worker so that workers * threads fits the machine
+def thread_budget(workers, cpus=None):
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, cpus // workers)
+
+
+#solve the scenarios on a pool of workers, yielding the result rows as they finish (not in order)
+def run(network, task, scenarios, workers=None, threads=None, time_limit=None, backend="gurobi", **params):
+    workers = workers or max(1, min(len(scenarios), os.cpu_count() or 1))
+    threads = threads or thread_budget(workers)
+    shared = SharedNetwork(network)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                                 initargs=(shared.spec, task, threads, time_limit, params, backend)) as pool:
+            futures = [pool.submit(_solve, scenario) for scenario in scenarios]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        shared.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a grid of scenarios on a pool of worker processes")
+    parser.add_argument("task", choices=list(array_models.BUILDERS))
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    sweep.add_scenario_arguments(parser)
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--threads", type=int, default=None, help="solver threads per worker")
+    parser.add_argument("--backend", default="gurobi", choices=list(backends.BACKENDS), help="solver, see backends.py")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit per scenario, in seconds")
+    parser.add_argument("--csv", help="also write the results to this file")
+    args = parser.parse_args()
+
+    values = sweep.scenario_values(args)
+    scenarios = sweep.grid(**values)
+    network = data.load_network(args.data)
+
+    start = time.perf_counter()
+    rows = []
+    sweep.print_header(list(values))
+    for row in run(network, args.task, scenarios, args.workers, args.threads, args.time_limit, args.backend):
+        rows.append(row)
+        sweep.print_row(row, list(values))
+    elapsed = time.perf_counter() - start
+
+    solve_seconds = sum(row["wall_seconds"] for row in rows)
+    print(f"{len(rows)} scenarios in {elapsed:.1f} s, {60 * len(rows) / elapsed:.1f} scenarios/minute "
+          f"({solve_seconds:.1f} s of worker time, {solve_seconds / elapsed:.1f}x parallel)")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            sweep.write_csv(rows, f)
@@ -0,0 +1,173 @@
+import argparse, time
+
+import numpy as np
+from gurobipy import GRB
+
+import arcs, data, matrix_models, synthetic
+
+"""
+Arc pruning before model construction.
+
+Two rules, applied to the cost tables of a data.Network:
+
+* cheapest: keep only the k cheapest destinations of every source (a restriction, so it can change the
+  optimum, which is what the report is for)
+* reduced cost: solve the LP relaxation of the full trip-count model and drop every arc whose trip counter has
+  a reduced cost larger than upper_bound - LP bound. Driving a single trip on such an arc already costs more
+  than a known solution, so the arc is not used by any better solution and removing it is safe.
+
+    python pruning.py task2 -k 10
+    python pruning.py task3 --size 60x8x40 -k 3 --goal 300000000
+"""
+
+#the cost table of the network behind every arc set of the task models
+TABLES = {"flow": "road_cost", "truck_flow": "truck_cost", "train_flow": "train_cost"}
+SUPPLIER_TABLES = ("road_cost", "truck_cost")
+
+
+#the arcs of a cost table sorted by source and then by cost, such that the arcs of source src[start[n]]
+#are order[start[n]:start[n+1]], from cheapest to most expensive
+class CostIndex:
+    def __init__(self, cost):
+        self.src, self.dst, self.cost = matrix_models.arc_arrays(cost)
+        self.order = np.lexsort((self.cost, self.src))
+        sorted_src = self.src[self.order]
+        self.start = np.flatnonzero(np.r_[True, sorted_src[1:] != sorted_src[:-1]])
+        #rank[k] = how many arcs of the same source are cheaper than arc order[k]
+        sizes = np.diff(np.r_[self.start, len(sorted_src)])
+        self.rank = np.arange(len(sorted_src)) - np.repeat(self.start, sizes)
+
+    def __len__(self):
+        return len(self.src)
+
+    def cheapest(self, k):
+        return self.subset(self.order[self.rank < k])
+
+    def subset(self, keep):
+        keep = np.sort(keep)
+        ends = zip(self.src[keep].tolist(), self.dst[keep].tolist())
+        return dict(zip(ends, self.cost[keep].tolist()))
+
+
+#keep only the k cheapest destinations of every source in the given tables
+def cheapest_arcs(network, k, tables=SUPPLIER_TABLES):
+    return network.replace(**{table: CostIndex(getattr(network, table)).cheapest(k) for table in tables})
+
+
+#drop the arcs that can't be part of any solution cheaper than upper_bound, returns the pruned network and
+#the bound of the LP relaxation
+def reduced_cost_arcs(network, task, upper_bound, **params):
+    built = matrix_models.BUILDERS[task](network, mode=arcs.TRIP_COUNT, **params)
+    model = built.model
+    model.Params.OutputFlag = 0
+
+    #the LP relaxation, in place
+    model.update()
+    variables = model.getVars()
+    model.setAttr("VType", variables, [GRB.CONTINUOUS]*len(variables))
+    model.optimize()
+    if model.Status != GRB.OPTIMAL:
+        raise RuntimeError(f"the LP relaxation of {task} could not be solved (status {model.Status})")
+    lower_bound = model.ObjVal
+
+    pruned = {}
+    for name, flow in built.flows.items():
+        if name not in TABLES:
+            continue
+        #a trip counter at 0 with reduced cost d means every solution using the arc costs at least bound + d
+        useless = flow.trips.RC > upper_bound - lower_bound
+        keep = np.flatnonzero(~useless)
+        ends = zip(flow.src[keep].tolist(), flow.dst[keep].tolist())
+        pruned[TABLES[name]] = dict(zip(ends, flow.cost[keep].tolist()))
+    model.dispose()
+    return network.replace(**pruned), lower_bound
+
+
+#whether the LP relaxation of the full model has a solution. Without one the model itself has none, whatever
+#is pruned
+def relaxation_feasible(network, task, **params):
+    built = matrix_models.BUILDERS[task](network, mode=arcs.TRIP_COUNT, **params)
+    built.model.update()
+    relaxed = built.model.relax()
+    relaxed.Params.OutputFlag = 0
+    relaxed.optimize()
+    feasible = relaxed.Status not in (GRB.INFEASIBLE, GRB.INF_OR_UNBD)
+    relaxed.dispose()
+    built.model.dispose()
+    return feasible
+
+
+#solve the model of task on network and return (objective, seconds), objective is None without a solution
+def solve(network, task, time_limit=None, **params):
+    built = matrix_models.BUILDERS[task](network, **params)
+    model = built.model
+    if time_limit is not None:
+        model.Params.TimeLimit = time_limit
+    start = time.perf_counter()
+    model.optimize()
+    seconds = time.perf_counter() - start
+    objective = model.ObjVal if model.SolCount > 0 else None
+    model.dispose()
+    return objective, seconds
+
+
+#both rules: the k-cheapest network is solved to get an upper bound for the reduced cost rule,
+#which is then applied to the full network
+def prune(network, task, k, time_limit=None, **params):
+    restricted = cheapest_arcs(network, k)
+    upper_bound, _ = solve(restricted, task, time_limit, **params)
+    if upper_bound is None:
+        if not relaxation_feasible(network, task, **params):
+            raise RuntimeError(f"the full {task} model has no solution either, the goal is too high for this "
+                               "network")
+        raise RuntimeError(f"no solution with the {k} cheapest arcs per supplier, try a larger k")
+    pruned, lower_bound = reduced_cost_arcs(network, task, upper_bound, **params)
+    return pruned, restricted, upper_bound, lower_bound
+
+
+def arc_count(network, task):
+    tables = ["road_cost"] if task == "task1" else ["truck_cost", "train_cost"]
+    return {table: len(getattr(network, table)) for table in tables}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune dominated arcs and compare against the full model")
+    parser.add_argument("task", choices=list(matrix_models.BUILDERS))
+    parser.add_argument("-k", type=int, default=10, help="cheapest destinations kept per supplier")
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--goal", type=float, help="production goal, in liters of ethanol")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit per solve, in seconds")
+    parser.add_argument("--no-full", action="store_true", help="don't solve the full model for comparison")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed)
+    else:
+        network = data.load_network(args.data)
+    if args.goal is not None:
+        params["goal"] = data.ethanol_to_biomass(args.goal)
+    try:
+        pruned, restricted, upper_bound, lower_bound = prune(network, args.task, args.k, args.time_limit, **params)
+    except RuntimeError as error:
+        parser.exit(1, f"{error}\n")
+
+    print(f"LP bound {lower_bound:.0f}, upper bound from the {args.k} cheapest arcs {upper_bound:.0f}")
+    full, cheap, safe = arc_count(network, args.task), arc_count(restricted, args.task), arc_count(pruned, args.task)
+    print(f"{'table':<12} {'arcs':>8} {'k cheapest':>11} {'reduced cost':>13}")
+    for table in full:
+        print(f"{table:<12} {full[table]:>8} {cheap[table]:>11} {safe[table]:>13}")
+
+    rows = [("k cheapest", restricted), ("reduced cost", pruned)]
+    if not args.no_full:
+        rows.insert(0, ("full", network))
+    results = [(label, *solve(net, args.task, args.time_limit, **params)) for label, net in rows]
+    reference = results[0][1]
+    print(f"{'model':<13} {'objective':>16} {'change':>12} {'solve s':>8}")
+    for label, objective, seconds in results:
+        change = "-" if objective is None or reference is None else f"{objective - reference:.0f}"
+        shown = "-" if objective is None else f"{objective:.0f}"
+        print(f"{label:<13} {shown:>16} {change:>12} {seconds:>8.2f}")
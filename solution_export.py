@@ -0,0 +1,253 @@
+import argparse, csv, os, sys, time
+
+import numpy as np
+
+import array_models, data
+from data import HUB_CAPACITY, PLANT_CAPACITY, TRIP_COST
+
+"""
+Writes a solved model to a directory of flat files, without going through one Python object per variable.
+
+The solution values are read in bulk (getAttr on whole chunks of variables, or the .X of a slice of an MVar),
+summed per arc with NumPy and written chunk by chunk, and only the arcs that carry anything end up in the file.
+Memory use is set by the chunk size, not by the size of the model, so the per-trip expansion of a large network
+can be written as well.
+
+    built = matrix_models.build_task2(network)
+    models.solve(built)
+    export(built, network, "solution")
+
+    python cli.py task2 --export solution        #the same from the command line
+
+The directory gets two files:
+    arcs   arc_set, src, dst, flow, trips, transport_cost, trip_cost    (one row per arc with flow)
+    sites  kind, id, open, throughput, capacity, utilization            (every open site and every supplier used)
+
+as CSV, or as Parquet with format="parquet" (needs pyarrow). Trips are the trips that carry anything, so with
+the per-trip formulation trip_cost adds up to less than the model charges, which is every potential trip.
+"""
+
+FORMATS = ("csv", "parquet")
+#arcs read per getAttr call
+CHUNK = 65536
+#less than this is read as no flow, the solver leaves values like 1e-12 around
+EPS = 1e-6
+
+ARC_COLUMNS = {"arc_set": "str", "src": "int64", "dst": "int64", "flow": "float64", "trips": "int64",
+               "transport_cost": "float64", "trip_cost": "float64"}
+SITE_COLUMNS = {"kind": "str", "id": "int64", "open": "int64", "throughput": "float64", "capacity": "float64",
+                "utilization": "float64"}
+
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(f"{path}.csv", "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+        self.columns = list(columns)
+
+    #columns[name] = array (or a single value for the whole chunk)
+    def write(self, columns, n):
+        values = [np.broadcast_to(columns[name], n).tolist() for name in self.columns]
+        self.writer.writerows(zip(*values))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa, pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("format='parquet' needs pyarrow (pip install pyarrow), or use format='csv'")
+        self.pa = pa
+        types = {"str": pa.string(), "int64": pa.int64(), "float64": pa.float64()}
+        self.schema = pa.schema([(name, types[kind]) for name, kind in columns.items()])
+        self.writer = pq.ParquetWriter(f"{path}.parquet", self.schema)
+
+    def write(self, columns, n):
+        arrays = [self.pa.array(np.broadcast_to(columns[f.name], n), type=f.type) for f in self.schema]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter}
+
+
+#the values of a list of variables in one call
+def values(model, attr, variables):
+    return np.asarray(model.getAttr(attr, variables), dtype=np.float64)
+
+
+#sums of values over consecutive groups, lengths[k] = size of group k (all at least 1)
+def group_sums(values, lengths):
+    return np.add.reduceat(values, np.concatenate(([0], np.cumsum(lengths)[:-1])))
+
+
+#(src, dst, flow, trips, cost per Mg) of the arcs of a matrix_models.MatrixArcs, chunk by chunk
+def matrix_chunks(flow, chunk=CHUNK):
+    starts = flow.to_arc.indptr  #arc k owns the columns starts[k]:starts[k+1]
+    for a in range(0, len(flow), chunk):
+        b = min(a + chunk, len(flow))
+        if flow.mode == array_models.PER_TRIP and flow.capacity is not None:
+            x = flow.columns[starts[a]:starts[b]].X
+            lengths = np.diff(starts[a:b+1])
+            amount, trips = group_sums(x, lengths), group_sums((x > EPS).astype(np.int64), lengths)
+        else:
+            amount = flow.columns[a:b].X
+            trips = np.rint(flow.trips[a:b].X).astype(np.int64) if flow.trips is not None else np.zeros(b - a, np.int64)
+        yield flow.src[a:b], flow.dst[a:b], amount, trips, flow.cost[a:b]
+
+
+#the same for an arcs.Arcs of the loop builders
+def loop_chunks(model, flow, chunk=CHUNK):
+    keys = list(flow.flow)
+    for a in range(0, len(keys), chunk):
+        part = keys[a:a+chunk]
+        ends = np.array(part, dtype=np.int64).reshape(len(part), 2)
+        if flow.mode == array_models.PER_TRIP and flow.trips:
+            lists = [flow.trips[key] for key in part]
+            lengths = np.fromiter(map(len, lists), dtype=np.int64, count=len(lists))
+            trip_vars = [var for trips in lists for var in trips]
+            x = values(model, "X", trip_vars)
+            amount, trips = group_sums(x, lengths), group_sums((x > EPS).astype(np.int64), lengths)
+            #every trip of an arc has the arc's cost per Mg, so the first one tells
+            cost = values(model, "Obj", [trips[0] for trips in lists])
+        else:
+            variables = [flow.flow[key] for key in part]
+            amount = values(model, "X", variables)
+            cost = values(model, "Obj", variables)
+            if flow.trips:
+                trips = np.rint(values(model, "X", [flow.trips[key] for key in part])).astype(np.int64)
+            else:
+                trips = np.zeros(len(part), dtype=np.int64)
+        yield ends[:, 0], ends[:, 1], amount, trips, cost
+
+
+#whether built comes from matrix_models, the loop builders keep their variables in dicts keyed by node instead
+#of MVars. Checked this way so that the module can be imported without gurobipy
+def _is_matrix(built):
+    return not isinstance(built.plant_select, dict)
+
+
+#open flags of the plants and hubs, in the order of network.plants and network.hubs
+def selections(built, network):
+    if _is_matrix(built):
+        plants = built.plant_select.X
+        hubs = built.hub_select.X if built.hub_select is not None else np.zeros(0)
+    else:
+        plants = values(built.model, "X", [built.plant_select[p] for p in network.plants])
+        hubs = np.zeros(0)
+        if built.hub_select:
+            hubs = values(built.model, "X", [built.hub_select[h] for h in network.hubs])
+    return plants > 0.5, hubs > 0.5
+
+
+#write the solution of a solved built model (from models or matrix_models) to out_dir, and return the totals
+def export(built, network, out_dir, hub_capacity=HUB_CAPACITY, format="csv", chunk=CHUNK):
+    if format not in FORMATS:
+        raise ValueError(f"unknown format '{format}', expected one of {FORMATS}")
+    if built.model.SolCount == 0:
+        raise ValueError("the model has no solution to export")
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+
+    supplier_ids = np.fromiter(network.suppliers, dtype=np.int64)
+    supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+    plants = np.asarray(network.plants, dtype=np.int64)
+    hubs = np.asarray(network.hubs, dtype=np.int64)
+    #what leaves every supplier and enters every hub and plant, added up over the chunks
+    shipped, hub_in, plant_in = np.zeros(len(supplier_ids)), np.zeros(len(hubs)), np.zeros(len(plants))
+    bought = 0.0
+
+    totals = {}
+    writer = WRITERS[format](os.path.join(out_dir, "arcs"), ARC_COLUMNS)
+    try:
+        for name, flow in built.flows.items():
+            if _is_matrix(built):
+                chunks = matrix_chunks(flow, chunk)
+            else:
+                chunks = loop_chunks(built.model, flow, chunk)
+            total = totals[name] = {"arcs": 0, "flow": 0.0, "trips": 0, "transport_cost": 0.0, "trip_cost": 0.0}
+            for src, dst, amount, trips, cost in chunks:
+                used = amount > EPS
+                src, dst, amount, trips, cost = src[used], dst[used], amount[used], trips[used], cost[used]
+                transport, trip_cost = cost * amount, trips * TRIP_COST.get(name, 0)
+                writer.write({"arc_set": name, "src": src, "dst": dst, "flow": amount, "trips": trips,
+                              "transport_cost": transport, "trip_cost": trip_cost}, len(src))
+
+                total["arcs"] += len(src)
+                total["flow"] += amount.sum()
+                total["trips"] += int(trips.sum())
+                total["transport_cost"] += transport.sum()
+                total["trip_cost"] += float(trip_cost.sum())
+                if name == "third_party_flow":
+                    bought += amount.sum()
+                if name in ("flow", "truck_flow"):
+                    shipped += np.bincount(array_models.positions(supplier_ids, src), amount, len(supplier_ids))
+                if name in ("truck_flow", "third_party_flow"):
+                    hub_in += np.bincount(array_models.positions(hubs, dst), amount, len(hubs))
+                if name in ("flow", "train_flow"):
+                    plant_in += np.bincount(array_models.positions(plants, dst), amount, len(plants))
+    finally:
+        writer.close()
+
+    plant_open, hub_open = selections(built, network)
+    has_hubs = len(hub_open) > 0
+    sites = [("plant", plants, plant_open, plant_in, np.full(len(plants), PLANT_CAPACITY))]
+    if has_hubs:
+        sites.append(("hub", hubs, hub_open, hub_in, np.full(len(hubs), float(hub_capacity))))
+    sites.append(("supplier", supplier_ids, shipped > EPS, shipped, supply))
+    if built.third_party is not None and bought > EPS:
+        sites.append(("third_party", np.array([built.third_party]), np.array([True]), np.array([bought]),
+                      np.array([np.nan])))
+
+    writer = WRITERS[format](os.path.join(out_dir, "sites"), SITE_COLUMNS)
+    try:
+        for kind, ids, is_open, throughput, capacity in sites:
+            keep = is_open | (throughput > EPS)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                utilization = np.where(capacity[keep] > 0, throughput[keep] / capacity[keep], np.nan)
+            writer.write({"kind": kind, "id": ids[keep], "open": is_open[keep].astype(np.int64),
+                          "throughput": throughput[keep], "capacity": capacity[keep],
+                          "utilization": utilization}, int(keep.sum()))
+    finally:
+        writer.close()
+
+    return {"seconds": time.perf_counter() - start, "objective": built.model.ObjVal, "arc_sets": totals,
+            "plants_open": int(plant_open.sum()), "hubs_open": int(hub_open.sum()), "third_party": bought}
+
+
+def print_summary(summary):
+    print(f"{'arc set':<18} {'arcs':>8} {'flow':>14} {'trips':>8} {'transport':>16} {'trip cost':>16}")
+    for name, t in summary["arc_sets"].items():
+        print(f"{name:<18} {t['arcs']:>8} {t['flow']:>14.1f} {t['trips']:>8} {t['transport_cost']:>16.0f} "
+              f"{t['trip_cost']:>16.0f}")
+    print(f"{summary['plants_open']} plants and {summary['hubs_open']} hubs open, "
+          f"written in {summary['seconds']:.3f} s")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Solve a task model and export the solution")
+    p.add_argument("task", choices=["task1", "task2", "task3"])
+    p.add_argument("out_dir")
+    p.add_argument("--data", default=".", help="directory with the CSV files")
+    p.add_argument("--builder", default="matrix", choices=["loop", "matrix"])
+    p.add_argument("--mode", default=array_models.TRIP_COUNT, choices=array_models.MODES)
+    p.add_argument("--format", default="csv", choices=FORMATS)
+    p.add_argument("--time-limit", type=float)
+    args = p.parse_args()
+
+    import matrix_models, models
+
+    network = data.load_network(args.data)
+    builders = matrix_models.BUILDERS if args.builder == "matrix" else models.BUILDERS
+    built = builders[args.task](network, mode=args.mode)
+    params = {"TimeLimit": args.time_limit} if args.time_limit else {}
+    if models.solve(built, **params) is None:
+        print("No solution found.")
+        sys.exit(1)
+    print_summary(export(built, network, args.out_dir, format=args.format))
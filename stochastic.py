@@ -0,0 +1,317 @@
+import argparse, os, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import gurobipy as gp
+from gurobipy import GRB
+
+import data, parallel, synthetic
+from benders import COST_SCALE, TransportLP, evaluate
+from data import (HUB_COST, HUB_CAPACITY, PLANT_COST, PLANT_CAPACITY, PRODUCTION_GOAL, THIRD_PARTY_GOAL,
+                  THIRD_PARTY_PRICE)
+
+"""
+Sites that hold up when the supply varies: a two-stage stochastic version of task2 and task3, solved by sample
+average approximation.
+
+The supply of every supplier is its supply in suppliers.csv times a random yield factor (one factor for the whole
+scenario, like the weather, times one of the supplier's own). The plants and hubs are opened first, and the flows
+are decided per scenario once the supply is known, so the objective is the cost of the sites plus the mean
+transport cost over a sample of scenarios.
+
+The extensive form has a copy of the flows for every scenario, so instead the sample is decomposed like in
+benders.py, with one transport estimate per scenario in the master (multi-cut). Every time the master finds
+open sites, the transportation LPs of all scenarios are solved on a pool of worker processes, which share the
+network through parallel.SharedNetwork, and their cuts go back to the master. Like in benders.py the trips
+are relaxed in the subproblems, so the bound is one of the model with relaxed trips. The best sites are priced
+again with integer trips in every scenario at the end (like benders.evaluate), which is the cost reported.
+
+    python stochastic.py task2 --scenarios 10 20 40 --workers 4       #solve time against the sample size
+    python stochastic.py task3 --size 40x8x12 --scenarios 20 --validate 200
+
+With --validate the chosen sites are evaluated on a new, larger sample, for an estimate of their expected cost
+that is not biased by the sample they were chosen on. A scenario in which they can't meet the goal makes that
+cost infinite.
+"""
+
+#coefficients of variation of the yield factors
+SCENARIO_CV = 0.1
+SUPPLIER_CV = 0.2
+
+
+#lognormal factors with mean 1 and the given coefficient of variation
+def _factors(rng, cv, shape):
+    sigma = np.sqrt(np.log(1 + cv**2))
+    return rng.lognormal(-sigma**2 / 2, sigma, shape)
+
+
+#supply of every supplier (in the order of network.suppliers) in every scenario, as (scenarios, suppliers)
+def sample_supply(network, n_scenarios, seed=0, scenario_cv=SCENARIO_CV, supplier_cv=SUPPLIER_CV):
+    rng = np.random.default_rng(seed)
+    supply = np.fromiter(network.suppliers.values(), dtype=np.float64)
+    factors = _factors(rng, scenario_cv, (n_scenarios, 1)) * _factors(rng, supplier_cv, (n_scenarios, len(supply)))
+    return supply * factors
+
+
+#the state of a worker process (or of this process without workers), set up once by _setup
+_worker = {}
+
+
+#params are the model parameters of the task, like for matrix_models.BUILDERS
+def _setup(network, task, params, samples, env):
+    third_party = max(network.suppliers)+1 if task == "task3" else None
+    _worker["sub"] = TransportLP(network, task, params["goal"], params["hub_capacity"], third_party,
+                                 params.get("third_party_price", THIRD_PARTY_PRICE), env)
+    _worker.update(network=network, task=task, params=params, samples=samples, env=env)
+
+
+def _init_worker(spec, task, params, samples, threads):
+    network, blocks = parallel.attach(spec)
+    _worker["blocks"] = blocks
+    env = gp.Env(params={"Threads": threads, "OutputFlag": 0})
+    _setup(network, task, params, samples, env)
+
+
+#the cuts of the given scenarios of a sample for the open sites, as (scenario, kind, constant, plant coefficients,
+#hub coefficients, transport cost or None) like TransportLP.cut, and the seconds it took
+def _cuts(sample, scenarios, plants_open, hubs_open):
+    start = time.perf_counter()
+    sub = _worker["sub"]
+    cuts = []
+    for scenario in scenarios:
+        supply = _worker["samples"][sample][scenario]
+        sub.constrs["supply_cap"].RHS = supply
+        sub.fixed_rhs["supply_cap"] = supply
+        kind, constant, plant_coefs, hub_coefs = sub.cut(plants_open, hubs_open)
+        objective = sub.model.ObjVal if kind == "optimality" else None
+        cuts.append((scenario, kind, constant, plant_coefs, hub_coefs, objective))
+    return cuts, time.perf_counter() - start
+
+
+#the costs of the trip-count model (so with integer trips) with the open sites fixed in the given scenarios of a
+#sample, None where they can't meet the goal, and the seconds it took
+def _evaluations(sample, scenarios, plants_open, hubs_open, time_limit):
+    start = time.perf_counter()
+    network = _worker["network"]
+    costs = []
+    for scenario in scenarios:
+        supply = dict(zip(network.suppliers, _worker["samples"][sample][scenario].tolist()))
+        objective, _ = evaluate(network.replace(suppliers=supply), _worker["task"], plants_open, hubs_open,
+                                _worker["env"], time_limit, **_worker["params"])
+        costs.append(objective)
+    return costs, time.perf_counter() - start
+
+
+#(mean, standard error, scenarios that can't meet the goal) of the costs of the scenarios. The mean is inf if
+#any scenario can't meet the goal, leaving them out would make the sites that fail under low supply look cheap
+def expected_cost(costs):
+    feasible = np.array([cost for cost in costs if cost is not None])
+    if not len(feasible):
+        raise ValueError("the open sites can't meet the goal in any scenario")
+    infeasible = len(costs) - len(feasible)
+    error = feasible.std(ddof=1) / np.sqrt(len(feasible)) if len(feasible) > 1 else np.nan
+    return (np.inf if infeasible else feasible.mean()), error, infeasible
+
+
+class StochasticBenders:
+    def __init__(self, network, task="task2", scenarios=20, seed=0, validation=0, workers=None, threads=None,
+                 goal=None, plant_cost=PLANT_COST, hub_cost=HUB_COST, hub_capacity=HUB_CAPACITY,
+                 third_party_price=THIRD_PARTY_PRICE, scenario_cv=SCENARIO_CV, supplier_cv=SUPPLIER_CV, env=None):
+        if task not in ("task2", "task3"):
+            raise ValueError(f"the stochastic model is only implemented for the two-echelon models, not {task}")
+        if goal is None:
+            goal = PRODUCTION_GOAL if task == "task2" else THIRD_PARTY_GOAL
+        self.samples = {"sample": sample_supply(network, scenarios, seed, scenario_cv, supplier_cv)}
+        if validation:
+            self.samples["validation"] = sample_supply(network, validation, seed + 1, scenario_cv, supplier_cv)
+        self.plants = np.asarray(network.plants, dtype=np.int64)
+        self.hubs = np.asarray(network.hubs, dtype=np.int64)
+        self.plant_cost, self.hub_cost = plant_cost, hub_cost
+        params = {"goal": goal, "plant_cost": plant_cost, "hub_cost": hub_cost, "hub_capacity": hub_capacity}
+        if task == "task3":
+            params["third_party_price"] = third_party_price
+
+        #without workers the subproblems are solved in this process
+        self.workers = workers if workers is not None else min(scenarios, os.cpu_count() or 1)
+        self.pool = self.shared = None
+        setup = (task, params, self.samples)
+        if self.workers > 1:
+            self.shared = parallel.SharedNetwork(network)
+            threads = threads or parallel.thread_budget(self.workers)
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context("spawn"),
+                                            initializer=_init_worker, initargs=(self.shared.spec, *setup, threads))
+        else:
+            _setup(network, *setup, env)
+
+        master = gp.Model("stochastic_master", env=env)
+        self.plant_select = master.addMVar(len(self.plants), vtype=GRB.BINARY, obj=plant_cost, name="plant_selection")
+        self.hub_select = master.addMVar(len(self.hubs), vtype=GRB.BINARY, obj=hub_cost, name="hub_selection")
+        #the transport cost of every scenario, weighted by its probability
+        self.transport = master.addMVar(scenarios, lb=0.0, obj=COST_SCALE / scenarios, name="transport")
+        master.addConstr(PLANT_CAPACITY * self.plant_select.sum() >= goal, name="plant_cover")
+        master.addConstr(hub_capacity * self.hub_select.sum() >= goal, name="hub_cover")
+        master.ModelSense = GRB.MINIMIZE
+        self.master = master
+        self.cuts = {"optimality": 0, "feasibility": 0}
+        self.rounds = 0
+        self.sub_seconds = self.sub_wall = 0.0
+        #(cost, plants, hubs) of the best sites evaluated on the sample, with the trips relaxed
+        self.incumbent = (np.inf, None, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #the master and the subproblems of this process are disposed, the env passed in is left to the caller
+    def close(self):
+        if self.master is not None:
+            self.master.dispose()
+            self.master = None
+        if "sub" in _worker and self.pool is None:
+            _worker.pop("sub").model.dispose()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+    #the cuts of every scenario of a sample for the open sites, spread over the workers
+    def cuts_for(self, plants_open, hubs_open, sample="sample"):
+        start = time.perf_counter()
+        scenarios = np.arange(len(self.samples[sample]))
+        if self.pool is None:
+            cuts, seconds = _cuts(sample, scenarios, plants_open, hubs_open)
+        else:
+            chunks = [chunk for chunk in np.array_split(scenarios, self.workers) if len(chunk)]
+            futures = [self.pool.submit(_cuts, sample, chunk, plants_open, hubs_open) for chunk in chunks]
+            results = [future.result() for future in futures]
+            cuts = [cut for chunk_cuts, _ in results for cut in chunk_cuts]
+            seconds = sum(chunk_seconds for _, chunk_seconds in results)
+        self.sub_seconds += seconds
+        self.sub_wall += time.perf_counter() - start
+        return cuts
+
+    #the costs of the open sites with integer trips in every scenario of a sample, see _evaluations
+    def evaluations(self, plants_open, hubs_open, sample="sample", time_limit=None):
+        scenarios = np.arange(len(self.samples[sample]))
+        if self.pool is None:
+            return _evaluations(sample, scenarios, plants_open, hubs_open, time_limit)[0]
+        chunks = [chunk for chunk in np.array_split(scenarios, self.workers) if len(chunk)]
+        futures = [self.pool.submit(_evaluations, sample, chunk, plants_open, hubs_open, time_limit)
+                   for chunk in chunks]
+        return [cost for future in futures for cost in future.result()[0]]
+
+    def _callback(self, model, where):
+        if where != GRB.Callback.MIPSOL:
+            return
+        plants = np.round(model.cbGetSolution(self.plant_vars))
+        hubs = np.round(model.cbGetSolution(self.hub_vars))
+        transport = np.asarray(model.cbGetSolution(self.transport_vars))
+        self.rounds += 1
+
+        cuts = self.cuts_for(plants, hubs)
+        for scenario, kind, constant, plant_coefs, hub_coefs, objective in cuts:
+            cut = gp.LinExpr(constant / COST_SCALE)
+            cut.addTerms((plant_coefs / COST_SCALE).tolist(), self.plant_vars)
+            cut.addTerms((hub_coefs / COST_SCALE).tolist(), self.hub_vars)
+            if kind == "feasibility":
+                model.cbLazy(cut >= 0)
+                self.cuts[kind] += 1
+            elif transport[scenario] * COST_SCALE < objective * (1 - 1e-6) - 1e-6:
+                model.cbLazy(self.transport_vars[scenario] >= cut)
+                self.cuts[kind] += 1
+
+        if all(kind == "optimality" for _, kind, *_ in cuts):
+            cost = self.plant_cost * plants.sum() + self.hub_cost * hubs.sum() + np.mean([c[-1] for c in cuts])
+            if cost < self.incumbent[0]:
+                self.incumbent = (cost, plants > 0, hubs > 0)
+
+    #solve the sample average problem, returns a dict with the bound, the best sites and the times. cost is the
+    #mean cost of the best sites with integer trips, relaxed_cost the one of the master
+    def solve(self, time_limit=None, **params):
+        master = self.master
+        for name, value in params.items():
+            master.setParam(name, value)
+        if time_limit is not None:
+            master.Params.TimeLimit = time_limit
+        master.Params.LazyConstraints = 1
+        master.update()
+        self.plant_vars, self.hub_vars = self.plant_select.tolist(), self.hub_select.tolist()
+        self.transport_vars = self.transport.tolist()
+
+        start = time.perf_counter()
+        master.optimize(self._callback)
+        seconds = time.perf_counter() - start
+        relaxed_cost, plants, hubs = self.incumbent
+        cost = None
+        start = time.perf_counter()
+        if plants is not None:
+            cost = expected_cost(self.evaluations(plants.astype(np.float64), hubs.astype(np.float64),
+                                                  time_limit=time_limit))[0]
+        return {"status": master.Status, "scenarios": len(self.samples["sample"]), "bound": master.ObjBound,
+                "cost": cost, "relaxed_cost": relaxed_cost if plants is not None else None, "rounds": self.rounds,
+                "cuts": dict(self.cuts), "seconds": seconds, "evaluate_s": time.perf_counter() - start,
+                "sub_seconds": self.sub_seconds, "sub_wall": self.sub_wall,
+                "plants": [] if plants is None else self.plants[plants].tolist(),
+                "hubs": [] if hubs is None else self.hubs[hubs].tolist()}
+
+    #expected_cost of the open sites (masks in the order of the plants and hubs) on the validation sample, with
+    #integer trips
+    def validate(self, plants_open, hubs_open, time_limit=None):
+        if "validation" not in self.samples:
+            raise ValueError("there is no validation sample, pass validation=N")
+        return expected_cost(self.evaluations(plants_open.astype(np.float64), hubs_open.astype(np.float64),
+                                              "validation", time_limit))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Two-stage stochastic sites against random supply (SAA)")
+    parser.add_argument("task", choices=["task2", "task3"])
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--size", type=synthetic.parse_size, help="use a synthetic instance of SUPPLIERSxHUBSxPLANTS "
+                        "instead (see synthetic.py)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the instance and the samples")
+    parser.add_argument("--goal-share", type=float, help="goal of a synthetic instance as a share of its total "
+                        "supply, synthetic.GOAL_SHARE by default. Less leaves room for the scenarios with low supply")
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[20], help="sample sizes to solve")
+    parser.add_argument("--validate", type=int, default=0, help="evaluate the sites on this many new scenarios")
+    parser.add_argument("--scenario-cv", type=float, default=SCENARIO_CV, help="variation of the common yield")
+    parser.add_argument("--supplier-cv", type=float, default=SUPPLIER_CV, help="variation of every supplier's yield")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes, 1 for none")
+    parser.add_argument("--threads", type=int, default=None, help="Gurobi threads per worker")
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit of every master, in seconds")
+    args = parser.parse_args()
+
+    params = {}
+    if args.size:
+        network, params = synthetic.instance(args.size, args.task, args.seed, args.goal_share)
+    else:
+        network = data.load_network(args.data)
+
+    print(f"{'scenarios':>9} {'bound':>16} {'relaxed cost':>16} {'cost':>16} {'rounds':>6} {'cuts':>6} "
+          f"{'total s':>8} {'sub s':>8} {'sub wall':>8} {'sites':>5}")
+    with gp.Env(params={"OutputFlag": 0}) as env:
+        for n in args.scenarios:
+            with StochasticBenders(network, args.task, n, args.seed, args.validate, args.workers, args.threads,
+                                   scenario_cv=args.scenario_cv, supplier_cv=args.supplier_cv, env=env,
+                                   **params) as saa:
+                result = saa.solve(args.time_limit)
+                relaxed = "-" if result["relaxed_cost"] is None else f"{result['relaxed_cost']:.0f}"
+                cost = "-" if result["cost"] is None else f"{result['cost']:.0f}"
+                print(f"{n:>9} {result['bound']:>16.0f} {relaxed:>16} {cost:>16} {result['rounds']:>6} "
+                      f"{sum(result['cuts'].values()):>6} {result['seconds'] + result['evaluate_s']:>8.2f} "
+                      f"{result['sub_seconds']:>8.2f} {result['sub_wall']:>8.2f} "
+                      f"{len(result['plants']) + len(result['hubs']):>5}")
+                if args.validate and result["cost"] is not None:
+                    try:
+                        mean, error, infeasible = saa.validate(np.isin(saa.plants, result["plants"]),
+                                                               np.isin(saa.hubs, result["hubs"]), args.time_limit)
+                    except ValueError as error:
+                        print(f"{'':>9} validation: {error}")
+                        continue
+                    print(f"{'':>9} validation: ${mean:.0f} +- {1.96 * error:.0f} over {args.validate} scenarios"
+                          + (f", {infeasible} can't meet the goal" if infeasible else ""))
@@ -0,0 +1,202 @@
+import argparse, csv, inspect, itertools, sys
+
+import numpy as np
+
+import array_models, backends, data
+
+"""
+Scenario sweeps that build the model once and change it in place between solves.
+
+    sweep = Sweep(network, "task3")
+    for row in sweep.run(grid(hub_capacity=[300000, 400000], third_party_price=[1500, 2000])):
+        print(row["cost"], row["plants"], row["hubs"])
+
+Every solve after the first starts from the previous solution (as a MIP start), which Gurobi repairs when
+it is no longer feasible for the new scenario. The trip-count formulation is used, since the per-trip
+expansion has to be rebuilt whenever the hub capacity changes.
+"""
+
+
+def _set_goal(built, goal):
+    built.constrs["production_goal"].RHS = goal
+
+
+def _set_plant_cost(built, plant_cost):
+    built.plant_select.Obj = plant_cost
+
+
+def _set_hub_cost(built, hub_cost):
+    built.hub_select.Obj = hub_cost
+
+
+def _set_hub_capacity(built, hub_capacity):
+    for constr, select in zip(built.constrs["hub_cap"].tolist(), built.hub_select.tolist()):
+        built.model.chgCoeff(constr, select, -hub_capacity)
+    max_flow = array_models.two_echelon_max_flow(built.supplier_ids, built.supply, hub_capacity)
+    for name, flow in built.flows.items():
+        flow.set_max_flow(max_flow[name])
+
+
+def _set_third_party_price(built, third_party_price):
+    built.flows["third_party_flow"].columns.Obj = third_party_price
+
+
+SETTERS = {
+    "goal": _set_goal,
+    "plant_cost": _set_plant_cost,
+    "hub_cost": _set_hub_cost,
+    "hub_capacity": _set_hub_capacity,
+    "third_party_price": _set_third_party_price,
+}
+
+
+#every combination of the given values, such that grid(a=[1,2], b=[3]) = [{a:1, b:3}, {a:2, b:3}]
+def grid(**values):
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*values.values())]
+
+
+class Sweep:
+    def __init__(self, network, task="task3", env=None, time_limit=None, **params):
+        #needs gurobipy, unlike the helpers for grids and rows that parallel.py also uses with other backends
+        import matrix_models
+
+        builder = matrix_models.BUILDERS[task]
+        self.task = task
+        self.built = builder(network, mode=array_models.TRIP_COUNT, env=env, **params)
+        if time_limit is not None:
+            self.built.model.Params.TimeLimit = time_limit
+
+        #the parameters of the built model, starting from the defaults of the builder
+        self.params = {name: p.default for name, p in inspect.signature(builder).parameters.items() if name in SETTERS}
+        self.params.update(params)
+        self.start = None
+
+    def set(self, **params):
+        for name, value in params.items():
+            if name not in self.params:
+                raise ValueError(f"{self.task} has no parameter '{name}', expected one of {list(self.params)}")
+            if value != self.params[name]:
+                SETTERS[name](self.built, value)
+                self.params[name] = value
+
+    def solve(self):
+        model = self.built.model
+        model.update()
+        variables = model.getVars()
+        if self.start is not None:
+            model.setAttr("Start", variables, self.start)
+        model.optimize()
+
+        row = dict(self.params)
+        row.update({"status": model.Status, "cost": None, "gap": None, "seconds": model.Runtime,
+                    "plants": [], "hubs": []})
+        if model.SolCount > 0:
+            self.start = model.getAttr("X", variables)
+            row["cost"] = model.ObjVal
+            row["gap"] = model.MIPGap
+            row["plants"] = self.built.plants[np.round(self.built.plant_select.X) > 0].tolist()
+            if self.built.hub_select is not None:
+                row["hubs"] = self.built.hubs[np.round(self.built.hub_select.X) > 0].tolist()
+        return row
+
+    #solve every scenario (a dict of parameters) in turn, yielding one result row per scenario
+    def run(self, scenarios):
+        for scenario in scenarios:
+            self.set(**scenario)
+            yield self.solve()
+
+
+#the same for the solvers of backends.py. They have no model that could be changed, so every scenario builds
+#the array model again
+class ArraySweep:
+    def __init__(self, network, task="task3", backend="highs", time_limit=None, threads=None, **params):
+        builder = array_models.BUILDERS[task]
+        self.network = network
+        self.task = task
+        self.backend = backend
+        self.time_limit, self.threads = time_limit, threads
+        self.params = {name: p.default for name, p in inspect.signature(builder).parameters.items() if name in SETTERS}
+        self.params.update(params)
+
+    def set(self, **params):
+        for name, value in params.items():
+            if name not in self.params:
+                raise ValueError(f"{self.task} has no parameter '{name}', expected one of {list(self.params)}")
+            self.params[name] = value
+
+    def solve(self):
+        model = array_models.BUILDERS[self.task](self.network, mode=array_models.TRIP_COUNT, **self.params)
+        result = backends.solve(model, self.backend, self.time_limit, threads=self.threads)
+        row = dict(self.params)
+        row.update({"status": result.status, "cost": result.objective, "gap": result.gap,
+                    "seconds": result.seconds, "plants": [], "hubs": []})
+        if result.x is not None:
+            row["plants"], row["hubs"] = model.open_sites(result.x)
+        return row
+
+    def run(self, scenarios):
+        for scenario in scenarios:
+            self.set(**scenario)
+            yield self.solve()
+
+
+def write_csv(rows, f):
+    writer = None
+    for row in rows:
+        row = dict(row, plants=" ".join(map(str, row["plants"])), hubs=" ".join(map(str, row["hubs"])))
+        if writer is None:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+
+
+#the command line options for the scenario parameters, shared with the parallel runner
+def add_scenario_arguments(parser):
+    parser.add_argument("--goal", type=float, nargs="+", help="production goals, in liters of ethanol")
+    parser.add_argument("--plant-cost", type=float, nargs="+")
+    parser.add_argument("--hub-cost", type=float, nargs="+")
+    parser.add_argument("--hub-capacity", type=float, nargs="+")
+    parser.add_argument("--third-party-price", type=float, nargs="+")
+
+
+def scenario_values(args):
+    values = {name: getattr(args, name) for name in SETTERS if getattr(args, name) is not None}
+    if "goal" in values:
+        values["goal"] = [data.ethanol_to_biomass(goal) for goal in values["goal"]]
+    return values
+
+
+def print_header(names):
+    print(" ".join(f"{name:>17}" for name in names) + f" {'cost':>16} {'gap':>7} {'plants':>6} {'hubs':>4} {'s':>7}")
+
+
+def print_row(row, names):
+    cost = "-" if row["cost"] is None else f"{row['cost']:.0f}"
+    gap = "-" if row["gap"] is None else f"{row['gap']:.2%}"
+    print(" ".join(f"{row[name]:>17.6g}" for name in names)
+          + f" {cost:>16} {gap:>7} {len(row['plants']):>6} {len(row['hubs']):>4} {row['seconds']:>7.2f}")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a grid of scenarios on a single model")
+    parser.add_argument("task", choices=list(array_models.BUILDERS))
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    add_scenario_arguments(parser)
+    parser.add_argument("--time-limit", type=float, default=None, help="time limit per scenario, in seconds")
+    parser.add_argument("--csv", help="also write the results to this file")
+    args = parser.parse_args()
+
+    values = scenario_values(args)
+    sweep = Sweep(data.load_network(args.data), args.task, time_limit=args.time_limit)
+    sweep.built.model.Params.OutputFlag = 0
+    rows = []
+    print_header(list(values))
+    for row in sweep.run(grid(**values)):
+        rows.append(row)
+        print_row(row, list(values))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            write_csv(rows, f)
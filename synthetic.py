@@ -0,0 +1,149 @@
+import argparse, csv, os
+
+import numpy as np
+
+import data
+
+"""
+Synthetic instances with the same CSV schemas as the shipped data, for testing how the models scale.
+
+Suppliers, hubs and plants are placed at random in a square region, distances are the straight line
+distances times a detour factor, and the cost per unit follows the distance the same way it does in the
+shipped files, with a linear fit per file.
+
+    python synthetic.py out_dir --suppliers 500 --hubs 64 --plants 300 --seed 1
+
+The --size option of the other scripts goes through instance(), which also sets the goal of the task.
+"""
+
+#unit cost = slope * distance + intercept, fitted on roads_s_p.csv, roads_s_h.csv and railroads_h_p.csv
+SUPPLIER_PLANT_COST = (0.11543, -0.78493)
+SUPPLIER_HUB_COST = (0.15680, 6.1460)
+RAIL_COST = (0.016029, 2.3166)
+#the supplier -> plant fit goes negative below 7 km, where the shipped file has no arcs
+MIN_UNIT_COST = 1.0
+
+#the production goal as a share of the total supply: about what the shipped data asks for (2.16M of 3.05M Mg),
+#and more than the suppliers have for task3, so that the third party is needed
+GOAL_SHARE = {"task1": 0.7, "task2": 0.7, "task3": 1.1}
+
+#the headers of the shipped files, extra spaces included
+HEADERS = {
+    "suppliers": ["supplier", "supply"],
+    "hubs": ["hub", "hub_cost", "hub_cap"],
+    "plants": ["plant", "plant_cost", "plant_cap", "yield_per_unit"],
+    "roads_s_p": ["supplier", "plant", "dist_s_p", "cost_per_unit_s_p", "truck_cost_s_p", "truck_cap_s_p"],
+    "roads_s_h": ["supplier", "hub", "dist_s_h", "cost_per_unit_s_h ", "truck_cost_s_h", "truck_cap_s_h"],
+    "railroads_h_p": ["hub", "plant", "dist_h_p ", "cost_per_unit_h_p ", "train_cost_h_p", "train_cap_h_p"],
+}
+
+#the first IDs of every kind of node, like in the shipped files
+FIRST_ID = {"suppliers": 48001, "hubs": 17201, "plants": 541}
+
+SUPPLY_DISTRIBUTIONS = ("lognormal", "uniform", "exponential")
+
+
+def supplies(rng, n, distribution="lognormal", mean=12000.0):
+    if distribution == "lognormal":
+        sigma = 1.0
+        return rng.lognormal(np.log(mean) - sigma**2 / 2, sigma, n)
+    if distribution == "uniform":
+        return rng.uniform(0, 2 * mean, n)
+    if distribution == "exponential":
+        return rng.exponential(mean, n)
+    raise ValueError(f"unknown supply distribution '{distribution}', expected one of {SUPPLY_DISTRIBUTIONS}")
+
+
+#all arcs between two sets of points as columns of the arc CSVs
+def _arcs(rng, src_ids, src_xy, dst_ids, dst_xy, cost, trip_cost, capacity, detour, noise):
+    distance = np.linalg.norm(src_xy[:, None, :] - dst_xy[None, :, :], axis=2) * detour + 1.0
+    unit_cost = np.maximum(cost[0] * distance + cost[1], MIN_UNIT_COST)
+    unit_cost = unit_cost * rng.uniform(1 - noise, 1 + noise, distance.shape)
+    src = np.repeat(src_ids, len(dst_ids))
+    dst = np.tile(dst_ids, len(src_ids))
+    n = len(src)
+    return np.column_stack([src, dst, distance.ravel(), unit_cost.ravel(), np.full(n, trip_cost), np.full(n, capacity)])
+
+
+#the rows of every CSV of a synthetic instance, such that tables[filename] = list of rows
+def generate(suppliers=254, hubs=32, plants=166, seed=0, region=1500.0, supply="lognormal", mean_supply=12000.0,
+             detour=1.3, noise=0.0):
+    rng = np.random.default_rng(seed)
+    ids = {kind: np.arange(FIRST_ID[kind], FIRST_ID[kind] + n)
+           for kind, n in (("suppliers", suppliers), ("hubs", hubs), ("plants", plants))}
+    xy = {kind: rng.uniform(0, region, (len(ids[kind]), 2)) for kind in ids}
+
+    supply = supplies(rng, suppliers, supply, mean_supply)
+    arcs = {
+        "roads_s_p": _arcs(rng, ids["suppliers"], xy["suppliers"], ids["plants"], xy["plants"], SUPPLIER_PLANT_COST,
+                           data.TRUCK_TRIP_COST, data.TRUCK_CAPACITY, detour, noise),
+        "roads_s_h": _arcs(rng, ids["suppliers"], xy["suppliers"], ids["hubs"], xy["hubs"], SUPPLIER_HUB_COST,
+                           data.TRUCK_TRIP_COST, data.TRUCK_CAPACITY, detour, noise),
+        "railroads_h_p": _arcs(rng, ids["hubs"], xy["hubs"], ids["plants"], xy["plants"], RAIL_COST,
+                               data.TRAIN_TRIP_COST, data.TRAIN_CAPACITY, detour, noise),
+    }
+
+    tables = {
+        "suppliers": [[int(s), float(q)] for s, q in zip(ids["suppliers"], supply)],
+        "hubs": [[int(h), data.HUB_COST, data.HUB_CAPACITY] for h in ids["hubs"]],
+        "plants": [[int(p), data.PLANT_COST, int(data.biomass_to_ethanol(data.PLANT_CAPACITY)), data.PLANT_YIELD]
+                   for p in ids["plants"]],
+    }
+    for name, columns in arcs.items():
+        tables[name] = [[int(row[0]), int(row[1]), *row[2:4].tolist(), int(row[4]), int(row[5])] for row in columns]
+    return tables
+
+
+def write(tables, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    for name, rows in tables.items():
+        with open(os.path.join(data_dir, f"{name}.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADERS[name])
+            writer.writerows(rows)
+
+
+#a data.Network straight from the generated tables, without going through CSV files
+def network(**options):
+    tables = generate(**options)
+    cost = lambda rows: {(row[0], row[1]): row[2] * row[3] for row in rows}
+    return data.Network(
+        {row[0]: row[1] for row in tables["suppliers"]},
+        [row[0] for row in tables["plants"]],
+        [row[0] for row in tables["hubs"]],
+        cost(tables["roads_s_p"]), cost(tables["roads_s_h"]), cost(tables["railroads_h_p"]),
+    )
+
+
+#"SUPPLIERSxHUBSxPLANTS" -> the options of network(), as the type of a --size argument
+def parse_size(text):
+    try:
+        suppliers, hubs, plants = (int(n) for n in text.split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected SUPPLIERSxHUBSxPLANTS, got '{text}'")
+    return {"suppliers": suppliers, "hubs": hubs, "plants": plants}
+
+
+#the network of a size from parse_size, with the model parameters of a task on it: the goal at goal_share of the
+#total supply (GOAL_SHARE of the task by default)
+def instance(size, task, seed=0, goal_share=None):
+    result = network(**size, seed=seed)
+    share = GOAL_SHARE[task] if goal_share is None else goal_share
+    return result, {"goal": share * sum(result.suppliers.values())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic instance with the CSV schemas of the shipped data")
+    parser.add_argument("data_dir")
+    parser.add_argument("--suppliers", type=int, default=254)
+    parser.add_argument("--hubs", type=int, default=32)
+    parser.add_argument("--plants", type=int, default=166)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--region", type=float, default=1500.0, help="side of the square region, in km")
+    parser.add_argument("--supply", default="lognormal", choices=SUPPLY_DISTRIBUTIONS)
+    parser.add_argument("--mean-supply", type=float, default=12000.0, help="mean supply per supplier, in Mg")
+    parser.add_argument("--noise", type=float, default=0.0, help="relative noise on the cost per unit")
+    args = parser.parse_args()
+
+    write(generate(args.suppliers, args.hubs, args.plants, args.seed, args.region, args.supply, args.mean_supply,
+                   noise=args.noise), args.data_dir)
@@ -0,0 +1,47 @@
+import pytest
+
+import array_models, backends, synthetic
+
+"""
+Every task built once as an array model and solved with every backend that is installed here, the objectives have
+to agree. gurobi goes through matrix_models.from_arrays as well, which is what cli.py and sweep.py solve.
+
+    python -m pytest -q test_backends.py
+"""
+
+MIP_GAP = 1e-6
+
+
+#small enough for the per-trip models to fit the size-limited Gurobi license
+@pytest.fixture(scope="module")
+def network():
+    return synthetic.network(suppliers=10, hubs=3, plants=4, seed=0)
+
+
+@pytest.mark.parametrize("mode", array_models.MODES)
+@pytest.mark.parametrize("task", list(array_models.BUILDERS))
+def test_objectives_agree(network, task, mode):
+    found = backends.available()
+    if len(found) < 2:
+        pytest.skip(f"needs two backends, only {found} installed")
+    goal = synthetic.GOAL_SHARE[task] * sum(network.suppliers.values())
+    model = array_models.BUILDERS[task](network, mode=mode, goal=goal)
+    arrays = model.arrays()
+
+    objectives = {}
+    for backend in found:
+        result = backends.solve(arrays, backend, mip_gap=MIP_GAP)
+        assert result.status == "optimal", backend
+        objectives[backend] = result.objective
+    if "gurobi" in found:
+        import matrix_models
+
+        built = matrix_models.from_arrays(model)
+        built.model.Params.OutputFlag = 0
+        built.model.Params.MIPGap = MIP_GAP
+        built.model.optimize()
+        objectives["matrix_models"] = built.model.ObjVal
+
+    expected = objectives[found[0]]
+    for backend, objective in objectives.items():
+        assert objective == pytest.approx(expected, rel=1e-5), f"{backend}: {objective}, {found[0]}: {expected}"
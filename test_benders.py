@@ -0,0 +1,26 @@
+import pytest
+
+import benders, synthetic
+
+"""
+Benders decomposition finds the optimum of the monolithic trip-count model, with a bound below it.
+
+    python -m pytest -q test_benders.py
+"""
+
+#the default MIPGap of the monolithic model and of the evaluation of the sites
+REL = 1e-4
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("task", ["task2", "task3"])
+def test_benders_matches_monolithic(task, seed):
+    network, params = synthetic.instance(synthetic.parse_size("15x4x5"), task, seed)
+    decomposition = benders.Benders(network, task, **params)
+    decomposition.master.Params.OutputFlag = 0
+    result = decomposition.solve()
+    full = benders.monolithic(network, task, **params)
+
+    assert full["objective"] is not None
+    assert result["objective"] == pytest.approx(full["objective"], rel=REL)
+    assert result["bound"] <= full["objective"] * (1 + REL)
@@ -0,0 +1,35 @@
+import pytest
+
+import arcs, matrix_models, models, synthetic
+
+"""
+The matrix builders give the same models as the loop builders of models.py: the same sizes and the same optimum.
+
+    python -m pytest -q test_builders.py
+"""
+
+MIP_GAP = 1e-9
+
+
+#small enough for the per-trip models to fit the size-limited Gurobi license
+@pytest.fixture(scope="module")
+def network():
+    return synthetic.network(suppliers=10, hubs=3, plants=4, seed=0)
+
+
+@pytest.mark.parametrize("mode", arcs.MODES)
+@pytest.mark.parametrize("task", list(models.BUILDERS))
+def test_matrix_matches_loop(network, task, mode):
+    goal = synthetic.GOAL_SHARE[task] * sum(network.suppliers.values())
+    sizes, objectives = [], []
+    for builders in (models.BUILDERS, matrix_models.BUILDERS):
+        built = builders[task](network, mode=mode, goal=goal)
+        model = built.model
+        model.update()
+        sizes.append((model.NumVars, model.NumIntVars, model.NumBinVars, model.NumConstrs))
+        objectives.append(models.solve(built, OutputFlag=0, MIPGap=MIP_GAP))
+        model.dispose()
+
+    assert sizes[0] == sizes[1]
+    assert objectives[0] is not None
+    assert objectives[1] == pytest.approx(objectives[0], rel=1e-6)
@@ -0,0 +1,61 @@
+import pytest
+
+import array_models, data, incremental, matrix_models, synthetic
+
+"""
+An update applied in place by incremental.Incremental gives the same model as building it from the new CSVs.
+
+    python -m pytest -q test_incremental.py
+"""
+
+MIP_GAP = 1e-9
+
+
+#the CSVs before and after the update, as two directories. The update changes a supply and an arc cost, and adds
+#a supplier without supply together with its arcs and two arcs that were missing. Nothing is removed, removed arcs
+#and suppliers stay in the model closed, so the sizes would differ from a new build
+@pytest.fixture(scope="module")
+def directories(tmp_path_factory):
+    tables = synthetic.generate(suppliers=10, hubs=3, plants=4, seed=0)
+    new = {name: [list(row) for row in rows] for name, rows in tables.items()}
+    new["suppliers"][0][1] *= 1.5
+    new["suppliers"][-1][1] = 0.0
+    new["roads_s_h"][3][3] *= 0.5
+
+    base = {name: [list(row) for row in rows] for name, rows in tables.items()}
+    last = base["suppliers"].pop()[0]
+    for name in ("roads_s_p", "roads_s_h"):
+        base[name] = [row for row in base[name] if row[0] != last][1:]
+
+    root = tmp_path_factory.mktemp("incremental")
+    synthetic.write(base, root / "base")
+    synthetic.write(new, root / "new")
+    return root / "base", root / "new"
+
+
+@pytest.mark.parametrize("task", list(array_models.BUILDERS))
+def test_update_matches_rebuild(directories, task):
+    base, new = (data.load_network(str(directory)) for directory in directories)
+    params = {"goal": synthetic.GOAL_SHARE[task] * sum(base.suppliers.values())}
+
+    updated = incremental.Incremental(base, task, **params)
+    updated.built.model.Params.OutputFlag = 0
+    updated.built.model.Params.MIPGap = MIP_GAP
+    updated.solve()
+    updated.update(new)
+    row = updated.solve()
+
+    fresh = matrix_models.from_arrays(array_models.BUILDERS[task](new, **params))
+    fresh.model.Params.OutputFlag = 0
+    fresh.model.Params.MIPGap = MIP_GAP
+    fresh.model.optimize()
+
+    model = updated.built.model
+    assert (model.NumVars, model.NumIntVars, model.NumConstrs) == \
+           (fresh.model.NumVars, fresh.model.NumIntVars, fresh.model.NumConstrs)
+    assert row["cost"] == pytest.approx(fresh.model.ObjVal, rel=1e-6)
+    #the same bounds, whichever order the arcs were added in
+    for name, flow in fresh.flows.items():
+        assert sorted(updated.built.flows[name].columns.UB) == pytest.approx(sorted(flow.columns.UB))
+        if flow.trips is not None:
+            assert sorted(updated.built.flows[name].trips.UB) == pytest.approx(sorted(flow.trips.UB))
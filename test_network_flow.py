@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import synthetic
+from benders import TransportLP
+from network_flow import TransportFlow, random_sites
+
+"""
+TransportFlow gives the transport cost of benders.TransportLP (trips relaxed) without a solver: the same cost, and
+no cost where the LP is infeasible.
+
+    python -m pytest -q test_network_flow.py
+"""
+
+SITE_SETS = 20
+
+
+#goal shares of the supply that the suppliers can meet, and one they can't (except through the third party)
+@pytest.mark.parametrize("goal_share", [None, 0.3, 1.5])
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("task", ["task1", "task2", "task3"])
+def test_flow_matches_lp(task, seed, goal_share):
+    rng = np.random.default_rng(seed)
+    size = {"suppliers": int(rng.integers(5, 16)), "hubs": int(rng.integers(2, 5)), "plants": int(rng.integers(2, 6))}
+    network, params = synthetic.instance(size, task, seed, goal_share)
+    third_party = max(network.suppliers)+1 if task == "task3" else None
+    engine = TransportFlow(network, task, params["goal"], third_party=third_party)
+    lp = TransportLP(network, task, params["goal"], third_party=third_party)
+
+    #random sites, then all of them and none
+    site_sets = list(random_sites(rng, engine, SITE_SETS))
+    site_sets += [(np.ones(len(engine.plants), dtype=bool), np.ones(len(engine.hubs), dtype=bool)),
+                  (np.zeros(len(engine.plants), dtype=bool), np.zeros(len(engine.hubs), dtype=bool))]
+    for plants_open, hubs_open in site_sets:
+        flow_cost = engine.solve(plants_open, hubs_open)
+        lp_cost = lp.solve(plants_open, hubs_open)
+        assert (flow_cost is None) == (lp_cost is None), (plants_open, hubs_open, flow_cost, lp_cost)
+        if lp_cost is not None:
+            assert flow_cost == pytest.approx(lp_cost, rel=1e-6)
+    lp.model.dispose()
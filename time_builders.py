@@ -0,0 +1,65 @@
+import argparse, multiprocessing, time
+
+import arcs, cli, data, models
+from benchmark import child_result
+from instrumentation import peak_rss_mb
+
+"""
+Times the loop builders (models.py) against the matrix builders (matrix_models.py).
+
+Every measurement runs in a fresh process, so the peak RSS of one build does not hide the next one.
+
+    python time_builders.py                      #all tasks, trip-count formulation
+    python time_builders.py task1 --mode per_trip
+"""
+
+
+def _measure(task, builder, mode, data_dir, results):
+    network = data.load_network(data_dir)
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    built = cli.builder_set(builder)[task](network, mode=mode)
+    built.model.update()
+    results.put({
+        "task": task,
+        "builder": builder,
+        "mode": mode,
+        "build_s": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+        "build_rss_mb": peak_rss_mb() - before,
+        "vars": built.model.NumVars,
+        "constrs": built.model.NumConstrs,
+    })
+
+
+def measure(task, builder, mode, data_dir="."):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(task, builder, mode, data_dir, results))
+    process.start()
+    row = child_result(process, results)
+    process.join()
+    if row is None:
+        row = {"task": task, "builder": builder, "mode": mode, "failed": f"exit code {process.exitcode}"}
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the loop and matrix model builders")
+    parser.add_argument("tasks", nargs="*", default=list(models.BUILDERS), help="any of task1, task2, task3")
+    parser.add_argument("--data", default=".", help="directory with the CSV files")
+    parser.add_argument("--mode", default=arcs.TRIP_COUNT, choices=arcs.MODES)
+    args = parser.parse_args()
+    for task in args.tasks:
+        if task not in models.BUILDERS:
+            parser.error(f"unknown task '{task}'")
+
+    print(f"{'task':<6} {'builder':<7} {'mode':<11} {'vars':>10} {'constrs':>9} {'build s':>8} "
+          f"{'peak MB':>8} {'build MB':>9}")
+    for task in args.tasks:
+        for builder in cli.BUILDER_SETS:
+            r = measure(task, builder, args.mode, args.data)
+            if "failed" in r:
+                print(f"{r['task']:<6} {r['builder']:<7} {r['mode']:<11} failed: {r['failed']}")
+                continue
+            print(f"{r['task']:<6} {r['builder']:<7} {r['mode']:<11} {r['vars']:>10} {r['constrs']:>9} "
+                  f"{r['build_s']:>8.2f} {r['peak_rss_mb']:>8.0f} {r['build_rss_mb']:>9.0f}")